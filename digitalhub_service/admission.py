@@ -0,0 +1,250 @@
+from __future__ import annotations
+import asyncio, heapq, itertools, math, os, time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import metrics
+
+# Priority classes, most urgent first. Restarts of crashed children are never
+# rejected; sessions already placed here (a VTuber that idled out, the next
+# round of a running interview) go before sessions that have not started yet.
+RESTART, RESUME, NEW = 0, 1, 2
+CLASS_NAMES = ("restart", "resume", "new")
+
+class Overloaded(Exception):
+    """Admission refused: the caller should come back after `retry_after` seconds (HTTP 429)."""
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class HostLoad:
+    """
+    CPU busy fraction (all cores, from /proc/stat deltas) and MemAvailable (from
+    /proc/meminfo), re-read at most every `min_interval` seconds. Both are None
+    where /proc is missing, which admission treats as plenty of headroom.
+    """
+    def __init__(self, proc_root: str = "/proc", min_interval: float = 0.5):
+        self.proc_root = proc_root
+        self.min_interval = min_interval
+        self.cpu_busy: Optional[float] = None
+        self.mem_available_mb: Optional[float] = None
+        self._cpu_prev: Optional[Tuple[int, int]] = None
+        self._read_at = 0.0
+
+    def _read_cpu(self) -> Optional[Tuple[int, int]]:
+        """(idle, total) jiffies of the aggregate `cpu` line."""
+        try:
+            with open(os.path.join(self.proc_root, "stat"), "r") as f:
+                fields = [int(x) for x in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        # user nice system idle iowait irq softirq steal (guest time is already in user/nice)
+        return fields[3] + fields[4], sum(fields[:8])
+
+    def _read_mem(self) -> Optional[float]:
+        try:
+            with open(os.path.join(self.proc_root, "meminfo"), "r") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def sample(self) -> "HostLoad":
+        now = time.monotonic()
+        if now - self._read_at < self.min_interval:
+            return self
+        self._read_at = now
+        cur = self._read_cpu()
+        if cur is not None and self._cpu_prev is not None and cur[1] > self._cpu_prev[1]:
+            idle, total = cur[0] - self._cpu_prev[0], cur[1] - self._cpu_prev[1]
+            self.cpu_busy = max(0.0, min(1.0, 1 - idle / total))
+        self._cpu_prev = cur
+        self.mem_available_mb = self._read_mem()
+        return self
+
+class Ticket:
+    """A caller's place in the spawn queue; `granted` once it holds a slot."""
+    __slots__ = ("priority", "seq", "queued_at", "granted", "_fut")
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.queued_at = time.monotonic()
+        self.granted = False
+        self._fut: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class SpawnScheduler:
+    """
+    Gate in front of every child process spawn: at most `max_concurrent` spawns
+    run from fork until ready, the rest wait in a bounded priority queue (class,
+    then arrival). A waiting ticket is only granted while the host has headroom:
+    CPU busy below `max_cpu` and MemAvailable, minus `mem_per_spawn_mb` for every
+    spawn still starting up, above `min_mem_mb`. Restarts skip the headroom check.
+
+    admit() decides at once: a full queue, an ETA past `max_wait`, or a new
+    session on a host already out of headroom raise Overloaded with a
+    Retry-After estimate, instead of letting the spawn time out much later.
+    The ETA is queue waves times the moving average of recent spawn durations.
+    """
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 32, max_wait: float = 120.0,
+                 max_cpu: float = 0.9, min_mem_mb: float = 512.0, mem_per_spawn_mb: float = 300.0,
+                 spawn_estimate: float = 15.0, host: Optional[HostLoad] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_cpu = max_cpu
+        self.min_mem_mb = min_mem_mb
+        self.mem_per_spawn_mb = mem_per_spawn_mb
+        self.avg_spawn_sec = spawn_estimate
+        self.host = host or HostLoad()
+        self.running = 0
+        self.rejected = 0
+        self._queue: List[Ticket] = []
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self) -> None:
+        # keeps the CPU sample fresh and grants tickets held back for headroom
+        while True:
+            await asyncio.sleep(1.0)
+            self.host.sample()
+            self._dispatch()
+
+    # ---- decisions ----
+    def headroom(self) -> Optional[str]:
+        """None if one more spawn fits the host right now, else why not."""
+        h = self.host.sample()
+        if h.cpu_busy is not None and h.cpu_busy >= self.max_cpu:
+            return f"cpu {h.cpu_busy:.0%} busy"
+        if h.mem_available_mb is not None:
+            free = h.mem_available_mb - self.running * self.mem_per_spawn_mb
+            if free < self.min_mem_mb:
+                return f"{max(free, 0):.0f} MB memory available"
+        return None
+
+    def _eta(self, ahead: int) -> float:
+        """Seconds until the ticket with `ahead` tickets before it gets a slot."""
+        free = self.max_concurrent - self.running
+        if ahead < free:
+            return 0.0
+        return (ahead - free) // self.max_concurrent * self.avg_spawn_sec + self.avg_spawn_sec
+
+    def has_room(self) -> bool:
+        """For background spawns (warm pool refill): a slot is free, nobody waits, and the host has headroom."""
+        return self.running < self.max_concurrent and not self.queue_length() and self.headroom() is None
+
+    def admit(self, priority: int) -> Ticket:
+        """Queue a spawn or raise Overloaded; pass the ticket to slot() to wait for the go."""
+        cls = CLASS_NAMES[priority]
+        if priority != RESTART:
+            ahead = sum(1 for t in self._queue if t.priority <= priority and not t._fut.done())
+            reason = None
+            if self.queue_length() >= self.max_queue:
+                reason = f"spawn queue full ({self.queue_length()} waiting)"
+            elif self._eta(ahead) > self.max_wait:
+                reason = f"spawn queue wait ~{self._eta(ahead):.0f}s exceeds {self.max_wait:.0f}s"
+            elif priority == NEW:
+                short = self.headroom()
+                if short is not None:
+                    reason = f"host has no headroom ({short})"
+            if reason is not None:
+                self.rejected += 1
+                metrics.ADMISSION.inc(cls, "rejected")
+                raise Overloaded(reason, max(1.0, math.ceil(self._eta(ahead) or self.avg_spawn_sec)))
+        ticket = Ticket(priority, next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        self._dispatch()
+        metrics.ADMISSION.inc(cls, "started" if ticket.granted else "queued")
+        return ticket
+
+    def _dispatch(self) -> None:
+        while self._queue and self.running < self.max_concurrent:
+            top = self._queue[0]
+            if top._fut.done():  # waiter went away
+                heapq.heappop(self._queue)
+                continue
+            if top.priority != RESTART and self.headroom() is not None:
+                break
+            heapq.heappop(self._queue)
+            self.running += 1
+            top.granted = True
+            top._fut.set_result(None)
+            metrics.SPAWN_QUEUE_SECONDS.observe(time.monotonic() - top.queued_at, CLASS_NAMES[top.priority])
+
+    def _release(self, ticket: Ticket, held: float) -> None:
+        self.running -= 1
+        ticket.granted = False
+        self.avg_spawn_sec += 0.2 * (held - self.avg_spawn_sec)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, ticket: Optional[Ticket]) -> AsyncIterator[None]:
+        """Hold a spawn slot for the block (None: nothing to wait for, e.g. a pooled worker)."""
+        if ticket is None:
+            yield
+            return
+        try:
+            await ticket._fut
+        except asyncio.CancelledError:
+            if ticket.granted:
+                self._release(ticket, 0.0)
+            else:
+                ticket._fut.cancel()
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+            raise
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(ticket, time.monotonic() - t0)
+
+    def cancel(self, ticket: Optional[Ticket]) -> None:
+        """Give back a ticket that will never be passed to slot()."""
+        if ticket is None:
+            return
+        if ticket.granted:
+            self._release(ticket, self.avg_spawn_sec)
+        elif not ticket._fut.done():
+            ticket._fut.cancel()
+            self._dispatch()
+
+    def position(self, ticket: Ticket) -> Optional[Dict[str, Any]]:
+        """Queue position (1 = next) and ETA of a waiting ticket; None once it runs."""
+        if ticket.granted or ticket._fut.done():
+            return None
+        ahead = sum(1 for t in self._queue if t < ticket and not t._fut.done())
+        return {"class": CLASS_NAMES[ticket.priority], "position": ahead + 1,
+                "eta_sec": round(self._eta(ahead), 1), "waited_sec": round(time.monotonic() - ticket.queued_at, 1)}
+
+    def stats(self) -> Dict[str, Any]:
+        waiting = [t for t in self._queue if not t._fut.done()]
+        h = self.host
+        return {
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "queued": {name: sum(1 for t in waiting if t.priority == p) for p, name in enumerate(CLASS_NAMES)},
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "avg_spawn_sec": round(self.avg_spawn_sec, 2),
+            "cpu_busy": round(h.cpu_busy, 3) if h.cpu_busy is not None else None,
+            "mem_available_mb": round(h.mem_available_mb) if h.mem_available_mb is not None else None,
+        }
+
+    def queue_length(self) -> int:
+        return sum(1 for t in self._queue if not t._fut.done())
@@ -0,0 +1,427 @@
+from __future__ import annotations
+import asyncio, bisect, hashlib, json, os, sqlite3, threading, time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import metrics
+
+try:
+    import redis
+except ImportError:  # optional: only for CLUSTER_REGISTRY=redis://...
+    redis = None
+
+# virtual points on the ring per unit of capacity (a node with capacity 4 gets 160)
+VNODES_PER_SLOT = 40
+MAX_VNODES = 4000
+
+@dataclass
+class NodeInfo:
+    node_id: str
+    url: str
+    capacity: int
+    load: int
+    heartbeat: float
+    started_at: float
+
+    def live(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now or time.time()) - self.heartbeat <= ttl
+
+@dataclass
+class Claim:
+    session_id: str
+    node_id: str
+    claimed_at: float
+
+class ClusterRegistry:
+    """
+    Shared state of the cluster: every node's heartbeat record, and which node
+    owns each session. claim() is the only write that can race, so backends make
+    it a compare-and-set. All methods block; call them from a worker thread.
+    """
+    def heartbeat(self, node: NodeInfo) -> None:
+        raise NotImplementedError
+
+    def nodes(self) -> List[NodeInfo]:
+        raise NotImplementedError
+
+    def drop_node(self, node_id: str) -> None:
+        raise NotImplementedError
+
+    def owner(self, session_id: str) -> Optional[Claim]:
+        raise NotImplementedError
+
+    def claim(self, session_id: str, node_id: str, expect: Optional[str] = None) -> Tuple[Claim, bool]:
+        """
+        Own the session if it has no owner (or, with `expect`, if that node still
+        owns it). Returns the winning claim and whether this call wrote it.
+        """
+        raise NotImplementedError
+
+    def release(self, session_id: str, node_id: str) -> bool:
+        raise NotImplementedError
+
+    def sessions_of(self, node_id: str) -> List[Claim]:
+        raise NotImplementedError
+
+    def claim_counts(self, node_ids: Iterable[str]) -> Dict[str, int]:
+        """Sessions owned per node right now (fresher than the load in the heartbeats)."""
+        raise NotImplementedError
+
+class SqliteRegistry(ClusterRegistry):
+    """
+    One SQLite file; its file locks serialize the nodes, so it fits several
+    orchestrators on one host or a shared volume (tests, small setups).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._tx() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, url TEXT, capacity INTEGER, "
+                       "load INTEGER, heartbeat REAL, started_at REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, node_id TEXT, "
+                       "claimed_at REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_node ON sessions (node_id)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    class _Tx:
+        def __init__(self, db: sqlite3.Connection):
+            self.db = db
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.db.execute("BEGIN IMMEDIATE")
+            return self.db
+
+        def __exit__(self, exc_type, exc, tb) -> None:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _tx(self) -> "SqliteRegistry._Tx":
+        return self._Tx(self._db())
+
+    def heartbeat(self, node: NodeInfo) -> None:
+        with self._tx() as db:
+            db.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?)",
+                       (node.node_id, node.url, node.capacity, node.load, node.heartbeat, node.started_at))
+
+    def nodes(self) -> List[NodeInfo]:
+        return [NodeInfo(*row) for row in self._db().execute(
+            "SELECT node_id, url, capacity, load, heartbeat, started_at FROM nodes")]
+
+    def drop_node(self, node_id: str) -> None:
+        with self._tx() as db:
+            db.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def owner(self, session_id: str) -> Optional[Claim]:
+        row = self._db().execute("SELECT session_id, node_id, claimed_at FROM sessions WHERE session_id = ?",
+                                 (session_id,)).fetchone()
+        return Claim(*row) if row else None
+
+    def claim(self, session_id: str, node_id: str, expect: Optional[str] = None) -> Tuple[Claim, bool]:
+        with self._tx() as db:
+            row = db.execute("SELECT session_id, node_id, claimed_at FROM sessions WHERE session_id = ?",
+                             (session_id,)).fetchone()
+            if row is not None and row[1] != expect:
+                return Claim(*row), False
+            claim = Claim(session_id, node_id, time.time())
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                       (claim.session_id, claim.node_id, claim.claimed_at))
+            return claim, True
+
+    def release(self, session_id: str, node_id: str) -> bool:
+        with self._tx() as db:
+            return db.execute("DELETE FROM sessions WHERE session_id = ? AND node_id = ?",
+                              (session_id, node_id)).rowcount > 0
+
+    def sessions_of(self, node_id: str) -> List[Claim]:
+        return [Claim(*row) for row in self._db().execute(
+            "SELECT session_id, node_id, claimed_at FROM sessions WHERE node_id = ?", (node_id,))]
+
+    def claim_counts(self, node_ids: Iterable[str]) -> Dict[str, int]:
+        counts = dict(self._db().execute("SELECT node_id, COUNT(*) FROM sessions GROUP BY node_id"))
+        return {n: counts.get(n, 0) for n in node_ids}
+
+class RedisRegistry(ClusterRegistry):
+    """
+    Redis (or any server speaking its protocol) for production: nodes in one
+    hash, each claim in its own key, plus a set of session ids per node so
+    failover reads only the dead node's sessions. claim() is WATCH/MULTI.
+    """
+    def __init__(self, url: str, prefix: str = "dh:cluster:"):
+        if redis is None:
+            raise RuntimeError("CLUSTER_REGISTRY=redis://... needs the redis package (pip install redis)")
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def _k(self, *parts: str) -> str:
+        return self.prefix + ":".join(parts)
+
+    def heartbeat(self, node: NodeInfo) -> None:
+        self.r.hset(self._k("nodes"), node.node_id, json.dumps(asdict(node)))
+
+    def nodes(self) -> List[NodeInfo]:
+        return [NodeInfo(**json.loads(v)) for v in self.r.hgetall(self._k("nodes")).values()]
+
+    def drop_node(self, node_id: str) -> None:
+        self.r.hdel(self._k("nodes"), node_id)
+
+    def owner(self, session_id: str) -> Optional[Claim]:
+        v = self.r.get(self._k("session", session_id))
+        return Claim(**json.loads(v)) if v else None
+
+    def claim(self, session_id: str, node_id: str, expect: Optional[str] = None) -> Tuple[Claim, bool]:
+        key = self._k("session", session_id)
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    v = pipe.get(key)
+                    cur = Claim(**json.loads(v)) if v else None
+                    if cur is not None and cur.node_id != expect:
+                        pipe.unwatch()
+                        return cur, False
+                    claim = Claim(session_id, node_id, time.time())
+                    pipe.multi()
+                    pipe.set(key, json.dumps(asdict(claim)))
+                    if cur is not None:
+                        pipe.srem(self._k("node", cur.node_id), session_id)
+                    pipe.sadd(self._k("node", node_id), session_id)
+                    pipe.execute()
+                    return claim, True
+                except redis.WatchError:
+                    continue
+
+    def release(self, session_id: str, node_id: str) -> bool:
+        key = self._k("session", session_id)
+        with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    v = pipe.get(key)
+                    if not v or json.loads(v)["node_id"] != node_id:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.delete(key)
+                    pipe.srem(self._k("node", node_id), session_id)
+                    pipe.execute()
+                    return True
+                except redis.WatchError:
+                    continue
+
+    def sessions_of(self, node_id: str) -> List[Claim]:
+        sids = sorted(self.r.smembers(self._k("node", node_id)))
+        if not sids:
+            return []
+        values = self.r.mget([self._k("session", s) for s in sids])
+        claims = [Claim(**json.loads(v)) for v in values if v]
+        return [c for c in claims if c.node_id == node_id]
+
+    def claim_counts(self, node_ids: Iterable[str]) -> Dict[str, int]:
+        node_ids = list(node_ids)
+        with self.r.pipeline(transaction=False) as pipe:
+            for n in node_ids:
+                pipe.scard(self._k("node", n))
+            return dict(zip(node_ids, pipe.execute()))
+
+def open_registry(url: str) -> ClusterRegistry:
+    """sqlite:///abs/path.db, sqlite://rel/path.db or redis://host:port/db (rediss:// too)."""
+    u = urlparse(url)
+    if u.scheme == "sqlite":
+        return SqliteRegistry(u.netloc + u.path)
+    if u.scheme in ("redis", "rediss"):
+        return RedisRegistry(url)
+    raise ValueError(f"unsupported CLUSTER_REGISTRY: {url}")
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class HashRing:
+    """
+    Consistent hashing with capacity weighting: a node gets points on the ring
+    in proportion to its capacity, so adding or losing a node only moves the
+    sessions that hashed to its points. place() walks clockwise past nodes that
+    are at capacity (bounded load), falling back to the first owner if all are.
+    """
+    def __init__(self, nodes: Iterable[NodeInfo]):
+        self.nodes = {n.node_id: n for n in nodes}
+        points = []
+        for n in self.nodes.values():
+            for v in range(min(MAX_VNODES, max(1, n.capacity) * VNODES_PER_SLOT)):
+                points.append((_point(f"{n.node_id}#{v}"), n.node_id))
+        points.sort()
+        self._keys = [p for p, _ in points]
+        self._owners = [o for _, o in points]
+
+    def place(self, session_id: str, load: Optional[Dict[str, int]] = None) -> Optional[NodeInfo]:
+        if not self._keys:
+            return None
+        start = bisect.bisect(self._keys, _point(session_id)) % len(self._keys)
+        first = None
+        seen: Set[str] = set()
+        for i in range(len(self._keys)):
+            node_id = self._owners[(start + i) % len(self._keys)]
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            node = self.nodes[node_id]
+            first = first or node
+            used = (load or {}).get(node_id, node.load)
+            if node.capacity <= 0 or used < node.capacity:
+                return node
+            if len(seen) == len(self.nodes):
+                break
+        return first
+
+class Cluster:
+    """
+    This orchestrator as one node of a cluster. A background loop heartbeats
+    the node (capacity + current load) into the registry, keeps a snapshot of
+    the live nodes and their ring, and repairs ownership:
+
+      - sessions of a node that missed heartbeats for `node_ttl` are moved to
+        their place on the ring of the live nodes (compare-and-set, so nodes
+        doing this at the same time agree);
+      - sessions this node still runs but that now belong elsewhere are
+        released locally (e.g. after a network partition healed);
+      - claims of this node with no local session for `claim_grace` are dropped
+        (the pool's idle/session TTL released them).
+
+    owner_for() answers which node serves a session, claiming it for its ring
+    position the first time it is seen.
+    """
+    def __init__(self, registry: ClusterRegistry, node_id: str, url: str, capacity: int,
+                 local_sessions: Callable[[], Set[str]], release_local: Callable[[str], Any],
+                 heartbeat_interval: float = 2.0, node_ttl: float = 10.0, claim_grace: float = 300.0):
+        self.registry = registry
+        self.node_id = node_id
+        self.url = url.rstrip("/")
+        self.capacity = capacity
+        self.local_sessions = local_sessions
+        self.release_local = release_local
+        self.heartbeat_interval = heartbeat_interval
+        self.node_ttl = node_ttl
+        self.claim_grace = claim_grace
+        self.started_at = time.time()
+        self.live: Dict[str, NodeInfo] = {}
+        self.ring = HashRing([])
+        self.moved = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def info(self) -> NodeInfo:
+        return NodeInfo(self.node_id, self.url, self.capacity, len(self.local_sessions()), time.time(),
+                        self.started_at)
+
+    async def start(self) -> None:
+        await self.tick()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Leave the cluster: the other nodes take over this node's sessions on their next tick."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.registry.drop_node, self.node_id)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"[cluster] tick failed: {e!r}", flush=True)
+
+    async def tick(self) -> None:
+        local = set(self.local_sessions())
+        for sid in await asyncio.to_thread(self._tick, local):
+            # owned by another node now: free the slot here
+            self.release_local(sid)
+
+    def _tick(self, local: Set[str]) -> List[str]:
+        reg = self.registry
+        me = self.info()
+        reg.heartbeat(me)
+        now = time.time()
+        nodes = reg.nodes()
+        live = {n.node_id: n for n in nodes if n.live(self.node_ttl, now)}
+        live[self.node_id] = me
+        if set(live) != set(self.live) or any(live[k].capacity != self.live[k].capacity for k in live):
+            self.ring = HashRing(live.values())
+        self.live = live
+
+        # failover: hand the sessions of dead nodes to their ring position among the live ones
+        for node in nodes:
+            if node.node_id in live:
+                continue
+            orphans = reg.sessions_of(node.node_id)
+            loads = self._loads() if orphans else {}
+            for claim in orphans:
+                target = self.ring.place(claim.session_id, loads)
+                _, wrote = reg.claim(claim.session_id, target.node_id, expect=node.node_id)
+                if wrote:  # our write, not another node's
+                    loads[target.node_id] = loads.get(target.node_id, 0) + 1
+                    self.moved += 1
+                    metrics.CLUSTER_SESSIONS_MOVED.inc("failover")
+                    print(f"[cluster] session {claim.session_id}: {node.node_id} stopped heartbeating, "
+                          f"moved to {target.node_id}", flush=True)
+            if not reg.sessions_of(node.node_id):
+                reg.drop_node(node.node_id)
+
+        # reconcile this node's claims with what it actually runs
+        owned = {c.session_id: c for c in reg.sessions_of(self.node_id)}
+        for sid, claim in owned.items():
+            if sid not in local and now - claim.claimed_at > self.claim_grace:
+                reg.release(sid, self.node_id)
+        lost = []
+        for sid in local - set(owned):
+            cur, _ = reg.claim(sid, self.node_id)
+            if cur.node_id != self.node_id:
+                lost.append(sid)
+        return lost
+
+    def _loads(self) -> Dict[str, int]:
+        return self.registry.claim_counts(self.live)
+
+    async def owner_for(self, session_id: str, claim: bool = True) -> Optional[NodeInfo]:
+        """
+        The node serving `session_id`: its live owner, else the ring's pick (claimed
+        now). With claim=False only an existing live owner is returned, else None.
+        """
+        return await asyncio.to_thread(self._owner_for, session_id, claim)
+
+    def _owner_for(self, session_id: str, claim: bool) -> Optional[NodeInfo]:
+        current = self.registry.owner(session_id)
+        expect = None
+        if current is not None:
+            node = self.live.get(current.node_id)
+            if node is not None:
+                return node
+            expect = current.node_id  # owner stopped heartbeating: take over now instead of at its failover
+        if not claim:
+            return None
+        target = self.ring.place(session_id, self._loads()) or self.info()
+        won, wrote = self.registry.claim(session_id, target.node_id, expect=expect)
+        if expect is not None and wrote:
+            metrics.CLUSTER_SESSIONS_MOVED.inc("takeover")
+        node = self.live.get(won.node_id)
+        if node is None:
+            # claimed by a node that joined after the last tick
+            node = next((n for n in self.registry.nodes() if n.node_id == won.node_id), None)
+        return node or NodeInfo(won.node_id, "", 0, 0, 0.0, 0.0)
+
+    async def release(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self.registry.release, session_id, self.node_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"node_id": self.node_id, "url": self.url, "capacity": self.capacity,
+                "live_nodes": {k: {"url": n.url, "capacity": n.capacity, "load": n.load,
+                                   "heartbeat_age_sec": round(time.time() - n.heartbeat, 1)}
+                               for k, n in self.live.items()},
+                "sessions_moved": self.moved}
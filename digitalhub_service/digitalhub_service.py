@@ -1,23 +1,99 @@
 from __future__ import annotations
-import os, re, time, socket, threading, subprocess, io, itertools
-from dataclasses import dataclass, field
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Query
+import os, re, time, json, asyncio, tempfile
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlparse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import requests
+
+import metrics
+from logsink import SINKS
+from logstore import RECORDS
+from question_cache import QuestionCache, QUESTIONS_OBJECT_TPL, minio_client
+from supervisor import Child, JobRegistry, spawn, wait_port
+from vtuber_pool import VtuberPool, PoolFull
+from health import HealthMonitor, Target
+from cluster import Cluster, open_registry
+from admission import SpawnScheduler, Overloaded, RESTART, RESUME, NEW
+from profiler import StackSampler, Busy, MAX_HZ, MAX_SECONDS, authorized, collapsed
 
 VTUBER_ROOT = os.getenv("VTUBER_ROOT", os.path.expanduser("~/work/3rdparty/Open-LLM-VTuber"))
 LLM_SERVER_ROOT = os.getenv("LLM_SERVER_ROOT", os.path.expanduser("~/work/digitalhuman_round_server"))
 PUBLIC_HOST = os.getenv("PUBLIC_HOST", "localhost")
 LOG_DIR = os.getenv("DH_LOG_DIR", os.path.expanduser("~/work/digitalhub_service/logs"))
+# "process": one round server per round (default); "shared": one multi-round server, rounds via POST /rounds
+LLM_MODE = os.getenv("LLM_MODE", "process").lower()
+LLM_SHARED_PORT = int(os.getenv("LLM_SHARED_PORT", "8011"))
+# Pre-forked round server workers kept warm for process mode (0 disables the pool)
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "0"))
+# Question banks fetched once here and handed to round servers as local files
+QUESTION_CACHE_MB = int(os.getenv("QUESTION_CACHE_MB", "64"))
+QUESTION_HANDOFF_DIR = os.getenv("QUESTION_HANDOFF_DIR", os.path.join(tempfile.gettempdir(), "digitalhub_handoff"))
+
+WORKER_READY_MARKER = "[round-worker] ready"
+# VTuber instances: instance i listens on VTUBER_BASE_PORT+i and uses the round server on VTUBER_LLM_BASE_PORT+i
+VTUBER_POOL_SIZE = int(os.getenv("VTUBER_POOL_SIZE", "1"))
+VTUBER_BASE_PORT = int(os.getenv("VTUBER_BASE_PORT", "12393"))
+VTUBER_LLM_BASE_PORT = int(os.getenv("VTUBER_LLM_BASE_PORT", "8011"))
+# sessions per instance before /boot answers 503 (0: no cap, the least-loaded instance is shared)
+VTUBER_MAX_SESSIONS = int(os.getenv("VTUBER_MAX_SESSIONS", "0"))
+VTUBER_IDLE_TTL_SEC = float(os.getenv("VTUBER_IDLE_TTL_SEC", "600"))
+VTUBER_SESSION_TTL_SEC = float(os.getenv("VTUBER_SESSION_TTL_SEC", "7200"))
+# conf.yaml the instances are generated from (default: VTUBER_ROOT/conf.yaml)
+VTUBER_CONF_TEMPLATE = os.getenv("VTUBER_CONF_TEMPLATE") or None
+VTUBER_INSTANCE_DIR = os.getenv("VTUBER_INSTANCE_DIR", os.path.join(tempfile.gettempdir(), "digitalhub_vtubers"))
+# Background health monitor (0 disables probing and automatic restarts)
+HEALTH_INTERVAL_SEC = float(os.getenv("HEALTH_INTERVAL_SEC", "5"))
+HEALTH_FAIL_THRESHOLD = int(os.getenv("HEALTH_FAIL_THRESHOLD", "3"))
+RESTART_BACKOFF_BASE_SEC = float(os.getenv("RESTART_BACKOFF_BASE_SEC", "1"))
+RESTART_BACKOFF_MAX_SEC = float(os.getenv("RESTART_BACKOFF_MAX_SEC", "60"))
+VTUBER_BOOT_TIMEOUT_SEC = int(os.getenv("VTUBER_BOOT_TIMEOUT_SEC", "90"))
+
+# Spawn admission (admission.py): concurrent spawns from fork until ready, waiting room, host headroom
+SPAWN_MAX_CONCURRENT = int(os.getenv("SPAWN_MAX_CONCURRENT", "2"))
+SPAWN_QUEUE_MAX = int(os.getenv("SPAWN_QUEUE_MAX", "32"))
+SPAWN_MAX_WAIT_SEC = float(os.getenv("SPAWN_MAX_WAIT_SEC", "120"))
+SPAWN_ESTIMATE_SEC = float(os.getenv("SPAWN_ESTIMATE_SEC", "15"))  # ETA until real spawn times are measured
+ADMIT_MAX_CPU = float(os.getenv("ADMIT_MAX_CPU", "0.9"))
+ADMIT_MIN_MEM_MB = float(os.getenv("ADMIT_MIN_MEM_MB", "512"))
+ADMIT_MEM_PER_SPAWN_MB = float(os.getenv("ADMIT_MEM_PER_SPAWN_MB", "300"))
+# Child logs: batched writes, rotated to <name>.log.1.gz … at LOG_MAX_MB
+LOG_MAX_MB = int(os.getenv("LOG_MAX_MB", "20"))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_FLUSH_MS = int(os.getenv("LOG_FLUSH_MS", "100"))
+LOG_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
 
-UVICORN_READY_RE = re.compile(r"Uvicorn running on (https?://[^\s]+)")
-VTUBER_PORT_LINE_RE = re.compile(r"Starting server on (?:localhost|127\.0\.0\.1):(\d+)")
+# Cluster mode: orchestrators share a session registry (sqlite:///path.db or redis://host:6379/0)
+# and each session is served by one node; unset = this host only, as before
+CLUSTER_REGISTRY = os.getenv("CLUSTER_REGISTRY", "")
+CLUSTER_NODE_URL = os.getenv("CLUSTER_NODE_URL", "")  # how the other nodes reach this one, e.g. http://10.0.0.5:9009
+CLUSTER_NODE_ID = os.getenv("CLUSTER_NODE_ID", "") or urlparse(CLUSTER_NODE_URL).netloc
+# weight on the hash ring and sessions before placement spills over; 0: pool size x max sessions per instance
+CLUSTER_CAPACITY = int(os.getenv("CLUSTER_CAPACITY", "0")) or VTUBER_POOL_SIZE * max(VTUBER_MAX_SESSIONS, 1)
+CLUSTER_HEARTBEAT_SEC = float(os.getenv("CLUSTER_HEARTBEAT_SEC", "2"))
+CLUSTER_NODE_TTL_SEC = float(os.getenv("CLUSTER_NODE_TTL_SEC", "10"))
+CLUSTER_CLAIM_GRACE_SEC = float(os.getenv("CLUSTER_CLAIM_GRACE_SEC", "300"))
+# true: proxy a request for another node's session there; false: answer 307 with the owner's URL
+CLUSTER_FORWARD = os.getenv("CLUSTER_FORWARD", "true").lower() in ("1", "true", "yes")
+CLUSTER_FORWARD_TIMEOUT_SEC = float(os.getenv("CLUSTER_FORWARD_TIMEOUT_SEC", "150"))
+FORWARDED_HEADER = "X-DH-Forwarded-By"
+# Bearer token of /api/v1/dh/admin/* ("" disables them); round servers inherit it from this environment
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+SINKS.configure(max_bytes=LOG_MAX_MB * 1024 * 1024, backups=LOG_BACKUPS, flush_interval=LOG_FLUSH_MS / 1000)
+# Session-tagged JSON records for /api/v1/dh/sessions/{session_id}/logs
+RECORDS.configure(root=os.path.join(LOG_DIR, "records"),
+                  enabled=os.getenv("LOG_RECORDS", "true").lower() in ("1", "true", "yes"),
+                  segment_bytes=int(os.getenv("LOG_SEGMENT_MB", "64")) * 1024 * 1024,
+                  max_segments=int(os.getenv("LOG_SEGMENTS_MAX", "32")))
 
 class BootRequest(BaseModel):
     room_id: Optional[str] = None
     session_id: Optional[str] = None
     timeout_sec: int = 90
     public_host: Optional[str] = None
+    # False: return the boot job id at once and poll GET /api/v1/dh/jobs/{job_id}
+    wait: bool = True
 
 class BootResponse(BaseModel):
     code: int
@@ -37,28 +113,116 @@ class SimpleResponse(BaseModel):
     code: int
     data: Dict[str, Any]
 
-@dataclass
-class ProcInfo:
-    name: str
-    popen: subprocess.Popen
-    url: Optional[str] = None
-    started_at: float = field(default_factory=time.time)
-    extra: Dict[str, Any] = field(default_factory=dict)
+class WarmPool:
+    """
+    Pre-forked round server workers (`ROUND_SERVER_WORKER=1 ./run.sh`).
+    Each worker has already imported uvicorn/FastAPI/minio and waits on stdin
+    for its round parameters; a background task keeps `size` idle workers,
+    spawning only while the scheduler has room (user requests go first).
+    """
+    def __init__(self, size: int, spawns: Optional[SpawnScheduler] = None):
+        self.size = size
+        self.spawns = spawns
+        self.idle: List[Child] = []
+        self.hits = 0
+        self.misses = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
 
-class ProcManager:
-    def __init__(self):
-        self.lock = threading.Lock()
-        self.vtuber: Optional[ProcInfo] = None
-        self.llm: Optional[ProcInfo] = None
+    def start(self) -> None:
+        if self.size > 0 and self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._refill_loop())
+
+    async def _spawn(self) -> Child:
+        env = os.environ.copy()
+        env["ROUND_SERVER_WORKER"] = "1"
+        child = await spawn("llm", ["bash", "./run.sh"], LLM_SERVER_ROOT, f"{LOG_DIR}/llm.log", env=env, stdin=True)
+        child.extra["warm"] = False
+        def on_line(line: str):
+            if WORKER_READY_MARKER in line:
+                child.extra["warm"] = True
+        child.watch(on_line)
+        return child
+
+    async def _refill_loop(self):
+        while True:
+            self.idle = [p for p in self.idle if p.alive]
+            for _ in range(max(0, self.size - len(self.idle))):
+                if self.spawns is not None and not self.spawns.has_room():
+                    break
+                try:
+                    self.idle.append(await self._spawn())
+                except Exception as e:
+                    print(f"[digitalhub] pool spawn failed: {e!r}", flush=True)
+                    break
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def take(self) -> Optional[Child]:
+        """Pop an idle worker (warm ones first); None counts as a miss."""
+        live = [p for p in self.idle if p.alive]
+        live.sort(key=lambda p: not p.extra.get("warm"))
+        proc = live.pop(0) if live else None
+        self.idle = live
+        if proc is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        if self._wake is not None:
+            self._wake.set()
+        return proc
 
     @staticmethod
-    def _port_open(host: str, port: int, timeout: float = 0.25) -> bool:
-        try:
-            import socket
-            with socket.create_connection((host, port), timeout=timeout):
-                return True
-        except Exception:
-            return False
+    async def assign(proc: Child, params: Dict[str, str]) -> None:
+        await proc.send_line(json.dumps(params))
+
+    def stats(self) -> Dict[str, Any]:
+        live = [p for p in self.idle if p.alive]
+        return {
+            "target": self.size,
+            "idle": len(live),
+            "warm": sum(1 for p in live if p.extra.get("warm")),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        procs, self.idle = self.idle, []
+        await asyncio.gather(*(p.terminate() for p in procs), return_exceptions=True)
+
+class ProcManager:
+    """
+    Child processes of the orchestrator, supervised on the event loop: every
+    child has one stdout reader (see supervisor.Child) and waiting for readiness
+    never holds a thread. Blocking MinIO/HTTP calls run in worker threads.
+    """
+    def __init__(self):
+        # VTuber instances lock individually: a 90 s boot must not hold up start_llm
+        self.llm_lock = asyncio.Lock()
+        self.spawns = SpawnScheduler(SPAWN_MAX_CONCURRENT, SPAWN_QUEUE_MAX, SPAWN_MAX_WAIT_SEC, ADMIT_MAX_CPU,
+                                     ADMIT_MIN_MEM_MB, ADMIT_MEM_PER_SPAWN_MB, SPAWN_ESTIMATE_SEC)
+        self.vtubers = VtuberPool(
+            VTUBER_POOL_SIZE, VTUBER_ROOT, VTUBER_INSTANCE_DIR, VTUBER_BASE_PORT, VTUBER_LLM_BASE_PORT, LOG_DIR,
+            template_path=VTUBER_CONF_TEMPLATE, max_sessions=VTUBER_MAX_SESSIONS,
+            idle_ttl=VTUBER_IDLE_TTL_SEC, session_ttl=VTUBER_SESSION_TTL_SEC,
+            shared_llm_root=f"http://127.0.0.1:{LLM_SHARED_PORT}" if LLM_MODE == "shared" else None,
+        )
+        # round servers by port (process mode: one per VTuber instance; shared mode: just LLM_SHARED_PORT)
+        self.llms: Dict[int, Child] = {}
+        self.last_llm_port: Optional[int] = None
+        self.pool = WarmPool(LLM_POOL_SIZE if LLM_MODE == "process" else 0, self.spawns)
+        self.questions = QuestionCache(QUESTION_CACHE_MB * 1024 * 1024, QUESTION_HANDOFF_DIR)
+        self.jobs = JobRegistry()
+        self.health = HealthMonitor(self.health_targets, HEALTH_INTERVAL_SEC, HEALTH_FAIL_THRESHOLD,
+                                    RESTART_BACKOFF_BASE_SEC, RESTART_BACKOFF_MAX_SEC)
+        self._minio_clients: Dict[tuple, Any] = {}
 
     @staticmethod
     def _replace_host(url: str, new_host: str) -> str:
@@ -72,69 +236,101 @@ class ProcManager:
         host = m.group(1); port = int(m.group(2) or 80)
         return host, port
 
-    def _drain_to_file(self, popen: subprocess.Popen, filepath: str):
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        def _run():
-            with open(filepath, "a", buffering=1, encoding="utf-8", errors="ignore") as f:
-                for line in iter(popen.stdout.readline, ""):
-                    f.write(line)
-        threading.Thread(target=_run, daemon=True).start()
+    # ---- Question banks ----
+    def _minio(self, endpoint: str, access_key: str, secret_key: str, secure: bool):
+        key = (endpoint, access_key, secret_key, secure)
+        client = self._minio_clients.get(key)
+        if client is None:
+            client = self._minio_clients[key] = minio_client(endpoint, access_key, secret_key, secure)
+        return client
+
+    def prefetch_questions(self, session_id: str, round_index: int, creds: Optional[Dict[str, Any]] = None) -> bool:
+        """Warm the cache for a round; uses the orchestrator's MINIO_* env when no creds are given."""
+        creds = creds or {
+            "endpoint": os.getenv("MINIO_ENDPOINT"), "access_key": os.getenv("MINIO_ACCESS_KEY"),
+            "secret_key": os.getenv("MINIO_SECRET_KEY"), "bucket": os.getenv("MINIO_BUCKET"),
+            "secure": os.getenv("MINIO_SECURE", "true").lower() in ("1", "true", "yes"),
+        }
+        if not (session_id and creds["endpoint"] and creds["access_key"] and creds["secret_key"] and creds["bucket"]):
+            return False
+        client = self._minio(creds["endpoint"], creds["access_key"], creds["secret_key"], creds["secure"])
+        return self.questions.prefetch(client, creds["bucket"],
+                                       QUESTIONS_OBJECT_TPL.format(round=round_index, session=session_id))
+
+    def _handoff_questions(self, req: LLMStartRequest) -> Optional[str]:
+        """
+        Local copy of this round's questions for the round server (None: let it fetch itself),
+        then prefetch the next round in the background. Blocking: call it in a thread.
+        """
+        creds = {"endpoint": req.minio_endpoint, "access_key": req.minio_access_key,
+                 "secret_key": req.minio_secret_key, "bucket": req.minio_bucket, "secure": req.minio_secure}
+        path = None
+        try:
+            client = self._minio(req.minio_endpoint, req.minio_access_key, req.minio_secret_key, req.minio_secure)
+            path = self.questions.handoff(client, req.minio_bucket,
+                                          QUESTIONS_OBJECT_TPL.format(round=req.round_index, session=req.session_id))
+        except Exception as e:
+            print(f"[digitalhub] question handoff skipped for {req.session_id}/{req.round_index}: {e!r}", flush=True)
+        self.prefetch_questions(req.session_id, req.round_index + 1, creds)
+        return path
 
     # ---- VTuber ----
-    def ping_vtuber(self) -> Dict[str, Any]:
-        with self.lock:
-            if self.vtuber and self.vtuber.url:
-                url = self.vtuber.url
-                try:
-                    host, port = self._host_port_from_url(url)
-                    alive = self._port_open(host, port)
-                except Exception:
-                    alive = False
-                return {"running": alive, "connect_url": url}
-            return {"running": False}
-
-    def boot_vtuber(self, timeout_sec: int = 90, public_host: Optional[str] = None) -> str:
-        with self.lock:
-            if self.vtuber and self.vtuber.url:
-                return self.vtuber.url
-            popen = subprocess.Popen(
-                ["uv", "run", "run_server.py"],
-                cwd=VTUBER_ROOT,
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                text=True, bufsize=1,
-            )
-            proc = ProcInfo(name="vtuber", popen=popen)
-            self.vtuber = proc
-            self._drain_to_file(popen, f"{LOG_DIR}/vtuber.log")
-
-        ready_url, detected_port = None, None
-        start = time.time()
-        while time.time() - start < timeout_sec:
-            line = proc.popen.stdout.readline()
-            if not line:
-                if proc.popen.poll() is not None:
-                    break
-                time.sleep(0.05); continue
-            m1 = UVICORN_READY_RE.search(line)
-            if m1: ready_url = m1.group(1); break
-            m2 = VTUBER_PORT_LINE_RE.search(line)
-            if m2: detected_port = int(m2.group(1))
-        if not ready_url and detected_port and self._port_open("127.0.0.1", detected_port):
-            ready_url = f"http://localhost:{detected_port}"
-        if not ready_url:
-            with self.lock:
-                try: proc.popen.terminate()
-                except Exception: pass
-                self.vtuber = None
-            raise RuntimeError("VTuber server boot timeout or failed to detect ready URL")
-        url = self._replace_host(ready_url, public_host or PUBLIC_HOST)
-        with self.lock: proc.url = url
-        return url
+    def ping_vtuber(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """From the health snapshot: no probe, no lock. Until the monitor has seen this pid, trust the process."""
+        inst = self.vtubers.instance_for(session_id) or next((i for i in self.vtubers.instances if i.url), None)
+        if inst and inst.url:
+            h = self.health.get(inst.name)
+            if h is not None and inst.child is not None and h["pid"] == inst.child.pid:
+                return {"running": h["up"], "connect_url": inst.url, "instance": inst.name,
+                        "last_seen": h["last_seen"], "consecutive_failures": h["consecutive_failures"]}
+            return {"running": inst.alive, "connect_url": inst.url, "instance": inst.name}
+        return {"running": False}
+
+    def submit_boot(self, session_id: Optional[str], timeout_sec: int = 90, public_host: Optional[str] = None):
+        """
+        Place the session on an instance and boot it as a job; concurrent requests
+        for the same instance share the boot already in flight. A boot that has to
+        spawn queues in the spawn scheduler first (sessions already placed here
+        ahead of new ones). Raises PoolFull or Overloaded.
+        """
+        known = self.vtubers.instance_for(session_id) is not None
+        inst = self.vtubers.place(session_id)
+        key = f"boot:{inst.name}"
+        ticket = None
+        if not (inst.alive and inst.url) and self.jobs.running(key) is None:
+            try:
+                ticket = self.spawns.admit(RESUME if known else NEW)
+            except Overloaded:
+                if session_id and not known:
+                    self.vtubers.release(session_id)
+                raise
+        job = self.jobs.submit("boot_vtuber", lambda: self._boot_vtuber(
+            inst, ticket, timeout_sec, public_host or PUBLIC_HOST), key=key)
+        if ticket is not None:
+            job.progress = lambda: self.spawns.position(ticket)
+        return job, inst
+
+    async def _boot_vtuber(self, inst, ticket, timeout_sec: int, public_host: str) -> str:
+        async with self.spawns.slot(ticket):
+            return await self.vtubers.ensure_running(inst, timeout_sec, public_host, self._replace_host)
+
+    async def _restart_vtuber(self, inst) -> None:
+        if inst.child is None:
+            return  # stopped on purpose (idle reaper, /stop) since the probe
+        # same job key as /boot, so a client booting meanwhile joins the restart
+        job = self.jobs.submit("restart_vtuber", lambda: self._boot_vtuber(
+            inst, self.spawns.admit(RESTART), VTUBER_BOOT_TIMEOUT_SEC, inst.public_host or PUBLIC_HOST),
+            key=f"boot:{inst.name}")
+        await job.task
 
     # ---- LLM Round Server ----
-    def start_llm(self, req: LLMStartRequest) -> Dict[str, Any]:
-        env = os.environ.copy()
-        env.update({
+    async def start_llm(self, req: LLMStartRequest) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        if LLM_MODE == "shared":
+            res = await self._start_llm_shared(req)
+            metrics.LLM_START_SECONDS.observe(time.perf_counter() - t0, "shared", "ok" if res["running"] else "failed")
+            return res
+        params = {
             "SESSION_ID": req.session_id,
             "ROUND_INDEX": str(req.round_index),
             "MINIO_ENDPOINT": req.minio_endpoint,
@@ -143,99 +339,464 @@ class ProcManager:
             "MINIO_BUCKET": req.minio_bucket,
             "MINIO_SECURE": "true" if req.minio_secure else "false",
             "PORT": str(req.port),
-        })
-        with self.lock:
-            if self.llm:
-                try: self.llm.popen.terminate()
-                except Exception: pass
-                self.llm = None
-            popen = subprocess.Popen(
-                ["bash", "./run.sh"],
-                cwd=LLM_SERVER_ROOT,
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                text=True, bufsize=1, env=env,
-            )
-            proc = ProcInfo(name="llm", popen=popen, extra={"port": req.port})
-            self.llm = proc
-            self._drain_to_file(popen, f"{LOG_DIR}/llm.log")
-
-        start = time.time()
-        while time.time() - start < 25:
-            if self._port_open("127.0.0.1", req.port):
-                return {"running": True, "base_url": f"http://127.0.0.1:{req.port}/v1"}
-            time.sleep(0.25)
-        return {"running": False, "base_url": f"http://127.0.0.1:{req.port}/v1", "message": "port not open within 25s"}
+        }
+        # the session's VTuber instance is configured for its own round server port
+        inst = self.vtubers.instance_for(req.session_id)
+        port = inst.llm_port if inst is not None else req.port
+        params["PORT"] = str(port)
+        if inst is not None:
+            self.vtubers.touch(req.session_id)
+        worker = self.pool.take() if self.pool.size > 0 else None
+        # a cold spawn waits its turn (the next round of a session with a VTuber here goes first)
+        ticket = self.spawns.admit(RESUME if inst is not None else NEW) if worker is None else None
+        try:
+            questions_file = await asyncio.to_thread(self._handoff_questions, req)
+        except BaseException:
+            self.spawns.cancel(ticket)
+            raise
+        if questions_file:
+            params["QUESTIONS_FILE"] = questions_file
+        queued = time.time()
+        async with self.spawns.slot(ticket):
+            async with self.llm_lock:
+                old = self.llms.pop(port, None)
+                if old:
+                    await old.terminate()
+                if worker is not None:
+                    # Warm path: hand the round parameters to a pre-forked worker
+                    proc = worker
+                    proc.extra.update({"port": port, "pooled": True})
+                    proc.started_at = time.time()
+                    await self.pool.assign(proc, params)
+                else:
+                    env = os.environ.copy()
+                    env.update(params)
+                    proc = await spawn("llm", ["bash", "./run.sh"], LLM_SERVER_ROOT, f"{LOG_DIR}/llm.log", env=env)
+                    proc.extra["port"] = port
+                proc.extra.update({"session_id": req.session_id, "round_index": req.round_index, "params": params})
+                self.llms[port] = proc
+                self.last_llm_port = port
+
+            start = time.time()
+            path = "pooled" if worker is not None else "cold"
+            base_url = f"http://127.0.0.1:{port}/v1"
+            ready = await wait_port("127.0.0.1", port, 25, poll=0.02 if worker is not None else 0.1, child=proc)
+        if ready:
+            metrics.LLM_START_SECONDS.observe(time.perf_counter() - t0, path, "ok")
+            return {"running": True, "base_url": base_url, "pooled": worker is not None,
+                    "startup_ms": int((time.time() - start) * 1000), "queued_ms": int((start - queued) * 1000)}
+        if not proc.alive:
+            metrics.LLM_START_SECONDS.observe(time.perf_counter() - t0, path, "exited")
+            return {"running": False, "base_url": base_url,
+                    "message": f"round server exited with code {proc.returncode}, see llm.log"}
+        metrics.LLM_START_SECONDS.observe(time.perf_counter() - t0, path, "timeout")
+        return {"running": False, "base_url": base_url, "message": "port not open within 25s"}
+
+    async def _ensure_shared_llm(self) -> bool:
+        async with self.llm_lock:
+            proc = self.llms.get(LLM_SHARED_PORT)
+            if not (proc and proc.alive):
+                env = os.environ.copy()
+                env.update({"ROUND_SERVER_MODE": "multi", "PORT": str(LLM_SHARED_PORT)})
+                proc = await spawn("llm", ["bash", "./run.sh"], LLM_SERVER_ROOT, f"{LOG_DIR}/llm.log", env=env)
+                proc.extra.update({"port": LLM_SHARED_PORT, "mode": "shared"})
+                self.llms[LLM_SHARED_PORT] = proc
+                self.last_llm_port = LLM_SHARED_PORT
+        return await wait_port("127.0.0.1", LLM_SHARED_PORT, 25, child=proc)
+
+    async def _respawn_llm(self, port: int, dead: Child) -> None:
+        """
+        Cold-start a crashed round server in place of `dead`, with the same round
+        parameters (or multi mode for the shared one); rounds resume from their journals.
+        """
+        async with self.spawns.slot(self.spawns.admit(RESTART)):
+            async with self.llm_lock:
+                if self.llms.get(port) is not dead:
+                    return  # replaced by a newer start, or stopped
+                if dead.extra.get("mode") == "shared":
+                    params = {"ROUND_SERVER_MODE": "multi", "PORT": str(LLM_SHARED_PORT)}
+                else:
+                    params = dead.extra["params"]
+                env = os.environ.copy()
+                env.update(params)
+                proc = await spawn("llm", ["bash", "./run.sh"], LLM_SERVER_ROOT, f"{LOG_DIR}/llm.log", env=env)
+                proc.extra.update({k: v for k, v in dead.extra.items()
+                                   if k in ("port", "mode", "session_id", "round_index", "params")})
+                self.llms[port] = proc
+            await wait_port("127.0.0.1", port, 25, child=proc)
+
+    async def _start_llm_shared(self, req: LLMStartRequest) -> Dict[str, Any]:
+        """Register the round on the long-lived multi-round server instead of spawning a process."""
+        root = f"http://127.0.0.1:{LLM_SHARED_PORT}"
+        if not await self._ensure_shared_llm():
+            return {"running": False, "base_url": f"{root}/v1", "message": "shared round server not open within 25s"}
+        questions_file = await asyncio.to_thread(self._handoff_questions, req)
+        # the session's VTuber reaches the round through its instance binding (it can't send session headers)
+        inst = self.vtubers.instance_for(req.session_id)
+        if inst is not None:
+            self.vtubers.touch(req.session_id)
+        try:
+            r = await asyncio.to_thread(requests.post, f"{root}/rounds", timeout=30, json={
+                "session_id": req.session_id,
+                "round_index": req.round_index,
+                "minio_endpoint": req.minio_endpoint,
+                "minio_access_key": req.minio_access_key,
+                "minio_secret_key": req.minio_secret_key,
+                "minio_bucket": req.minio_bucket,
+                "minio_secure": req.minio_secure,
+                "questions_file": questions_file,
+                "binding": inst.name if inst is not None else None,
+            })
+        except requests.RequestException as e:
+            return {"running": False, "base_url": f"{root}/v1", "message": f"round create failed: {e}"}
+        if r.status_code != 200:
+            return {"running": False, "base_url": f"{root}/v1", "message": f"round create failed: {r.status_code} {r.text}"}
+        data = r.json()
+        return {"running": True, "base_url": f"{root}{data['base_path']}", "shared_base_url": f"{root}/v1",
+                "vtuber_base_url": f"{root}/bound/{inst.name}/v1" if inst is not None else None,
+                "total_questions": data.get("total_questions")}
+
+    async def evict_llm_round(self, session_id: str, round_index: int) -> Dict[str, Any]:
+        if LLM_MODE != "shared":
+            raise ValueError("round eviction is only available when LLM_MODE=shared")
+        r = await asyncio.to_thread(requests.delete, f"http://127.0.0.1:{LLM_SHARED_PORT}/rounds/{session_id}/{round_index}",
+                                    timeout=10)
+        return {"evicted": r.status_code == 200, "session_id": session_id, "round_index": round_index}
+
+    @staticmethod
+    def _describe_llm(proc: Child) -> Dict[str, Any]:
+        return {"pid": proc.pid, "port": proc.extra.get("port"), "alive": proc.alive, "mode": LLM_MODE,
+                "session_id": proc.extra.get("session_id")}
 
     def status(self) -> Dict[str, Any]:
-        with self.lock:
-            data = {"vtuber": None, "llm": None}
-            if self.vtuber:
-                data["vtuber"] = {"pid": self.vtuber.popen.pid, "url": self.vtuber.url, "alive": (self.vtuber.popen.poll() is None)}
-            if self.llm:
-                data["llm"] = {"pid": self.llm.popen.pid, "port": self.llm.extra.get("port"), "alive": (self.llm.popen.poll() is None)}
-            return data
-
-    def stop_all(self) -> Dict[str, Any]:
-        with self.lock:
-            for attr in ("vtuber", "llm"):
-                proc = getattr(self, attr)
-                if proc:
-                    try:
-                        proc.popen.terminate()
-                        try: proc.popen.wait(timeout=3)
-                        except Exception: proc.popen.kill()
-                    except Exception: pass
-                    setattr(self, attr, None)
+        data = {"vtuber": None, "llm": None}
+        # "vtuber"/"llm": the first running instance and the latest round server, as before the pools
+        first = next((i for i in self.vtubers.instances if i.child), None)
+        if first:
+            data["vtuber"] = {"pid": first.child.pid, "url": first.url, "alive": first.alive}
+        last = self.llms.get(self.last_llm_port) if self.last_llm_port is not None else None
+        if last:
+            data["llm"] = self._describe_llm(last)
+        data["vtuber_pool"] = self.vtubers.stats()
+        data["llm_servers"] = [self._describe_llm(p) for p in self.llms.values()]
+        data["llm_pool"] = self.pool.stats()
+        data["question_cache"] = self.questions.stats()
+        data["jobs"] = self.jobs.stats()
+        data["admission"] = self.spawns.stats()
+        data["health"] = self.health.snapshot
+        data["logs"] = SINKS.stats()
+        data["log_records"] = RECORDS.stats()
+        return data
+
+    def health_targets(self) -> List[Target]:
+        """
+        What the monitor watches and how each child comes back: VTuber instances that
+        were booted (stopped ones have no child); round servers, except single-round
+        ones that exited 0 (round uploaded, done on purpose).
+        """
+        out = [Target(inst.name, "vtuber", inst.child, inst.port,
+                      restart=lambda inst=inst: self._restart_vtuber(inst), starting=inst.lock.locked())
+               for inst in self.vtubers.instances if inst.child is not None]
+        for port, proc in list(self.llms.items()):
+            if proc.extra.get("mode") == "shared":
+                restart = lambda proc=proc: self._respawn_llm(LLM_SHARED_PORT, proc)
+            elif proc.returncode != 0 and "params" in proc.extra:
+                restart = lambda port=port, proc=proc: self._respawn_llm(port, proc)
+            else:
+                restart = None
+            out.append(Target(f"llm-{port}", "llm", proc, port, restart=restart,
+                              starting=self.llm_lock.locked() and proc.alive))
+        return out
+
+    def live_processes(self) -> Dict[tuple, int]:
+        """Child processes alive right now, for the metrics gauge."""
+        return {
+            ("vtuber",): self.vtubers.live(),
+            ("llm",): sum(1 for p in list(self.llms.values()) if p.alive),
+            ("llm_pool",): self.pool.stats()["idle"],
+        }
+
+    def release_session(self, session_id: str) -> Dict[str, Any]:
+        inst = self.vtubers.instance_for(session_id)
+        return {"released": self.vtubers.release(session_id), "session_id": session_id,
+                "instance": inst.name if inst else None}
+
+    async def stop_all(self) -> Dict[str, Any]:
+        # no locks: killing a booting VTuber makes its boot job fail right away
+        procs, self.llms, self.last_llm_port = list(self.llms.values()), {}, None
+        for sid in list(self.vtubers.session_map):
+            self.vtubers.release(sid)
+        await asyncio.gather(*(self.vtubers.stop_instance(i) for i in self.vtubers.instances),
+                             *(p.terminate() for p in procs), return_exceptions=True)
+        await self.pool.stop()
         return {"stopped": True}
 
 manager = ProcManager()
-app = FastAPI(title="digitalhub", version="0.3.0")
+cluster: Optional[Cluster] = None
+if CLUSTER_REGISTRY:
+    if not CLUSTER_NODE_URL:
+        raise RuntimeError("CLUSTER_REGISTRY is set but CLUSTER_NODE_URL is not")
+    cluster = Cluster(open_registry(CLUSTER_REGISTRY), CLUSTER_NODE_ID, CLUSTER_NODE_URL, CLUSTER_CAPACITY,
+                      local_sessions=lambda: set(manager.vtubers.session_map),
+                      release_local=manager.vtubers.release, heartbeat_interval=CLUSTER_HEARTBEAT_SEC,
+                      node_ttl=CLUSTER_NODE_TTL_SEC, claim_grace=CLUSTER_CLAIM_GRACE_SEC)
+app = FastAPI(title="digitalhub", version="0.4.0")
+app.add_middleware(metrics.HTTPMetricsMiddleware, histogram=metrics.HTTP_SECONDS)
+metrics.Gauge("dh_hub_processes_live", "Child processes alive (vtuber, llm round server, idle pool workers)",
+              manager.live_processes, ("proc",))
+metrics.Gauge("dh_hub_question_cache_bytes", "Bytes held by the question bank cache",
+              lambda: manager.questions.stats()["bytes"])
+metrics.Gauge("dh_hub_jobs_running", "Background jobs (boots) in flight", lambda: manager.jobs.stats()["running"])
+metrics.Gauge("dh_hub_spawn_queue_length", "Spawns waiting for an admission slot", manager.spawns.queue_length)
+metrics.Gauge("dh_hub_spawns_running", "Spawns holding an admission slot (fork until ready)",
+              lambda: manager.spawns.running)
+
+@app.on_event("startup")
+async def on_startup():
+    manager.spawns.start()
+    manager.pool.start()
+    manager.vtubers.start()
+    manager.health.start()
+    if cluster is not None:
+        await cluster.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if cluster is not None:
+        await cluster.stop()
+    await manager.health.stop()
+    await manager.stop_all()
+    await manager.vtubers.stop()
+    await manager.spawns.stop()
+    SINKS.close()
+    RECORDS.close()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+async def _owner_response(session_id: Optional[str], request: Request, claim: bool = True) -> Optional[Response]:
+    """
+    Cluster mode: None if this node serves the session, else the owning node's
+    answer (proxied) or a 307 to it. Requests already forwarded once are served here.
+    claim=False (reads, releases): a session nobody owns is answered locally, not placed.
+    """
+    if cluster is None or not session_id or request.headers.get(FORWARDED_HEADER):
+        return None
+    node = await cluster.owner_for(session_id, claim=claim)
+    if node is None or node.node_id == cluster.node_id:
+        return None
+    target = node.url + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    if not node.url:
+        metrics.CLUSTER_FORWARDS.inc("failed")
+        raise HTTPException(status_code=503, detail=f"session {session_id} is on node {node.node_id}, address unknown")
+    if not CLUSTER_FORWARD:
+        metrics.CLUSTER_FORWARDS.inc("redirected")
+        return JSONResponse(status_code=307, headers={"Location": target},
+                            content={"code": 307, "data": {"node_id": node.node_id, "node_url": node.url,
+                                                           "location": target}})
+    body = await request.body()
+    try:
+        r = await asyncio.to_thread(requests.request, request.method, target, data=body or None,
+                                    timeout=CLUSTER_FORWARD_TIMEOUT_SEC,
+                                    headers={"Content-Type": request.headers.get("content-type", "application/json"),
+                                             FORWARDED_HEADER: cluster.node_id})
+    except requests.RequestException as e:
+        metrics.CLUSTER_FORWARDS.inc("failed")
+        raise HTTPException(status_code=502, detail=f"node {node.node_id} owning session {session_id} "
+                                                    f"is unreachable: {e}")
+    metrics.CLUSTER_FORWARDS.inc("forwarded")
+    headers = {"X-DH-Node": node.node_id}
+    # the owner's backoff hint on a 429, its target on a redirect
+    for name in ("Retry-After", "Location"):
+        if name in r.headers:
+            headers[name] = r.headers[name]
+    return Response(r.content, status_code=r.status_code, headers=headers,
+                    media_type=r.headers.get("content-type"))
 
 @app.get("/api/v1/dh/ping", response_model=SimpleResponse)
-def ping_dh():
-    return {"code": 200, "data": manager.ping_vtuber()}
+async def ping_dh(request: Request, session_id: Optional[str] = None):
+    fwd = await _owner_response(session_id, request, claim=False)
+    if fwd is not None:
+        return fwd
+    return {"code": 200, "data": manager.ping_vtuber(session_id)}
+
+def _boot_data(job, inst, session_id: Optional[str]) -> Dict[str, Any]:
+    data = {"session_id": session_id, "job_id": job.id, "status": job.status, "instance": inst.name}
+    if cluster is not None:
+        # jobs live on this node: poll them here
+        data.update({"node_id": cluster.node_id, "node_url": cluster.url})
+    if job.status == "done":
+        url = job.task.result()
+        data.update({"connect_url": url, "status": "ready",
+                     "message": f"数字人已生成，生成面试题后可进入沉浸式面试：{url}"})
+    elif job.status == "failed":
+        data["error"] = job.describe().get("error")
+    elif job.progress is not None:
+        queue = job.progress()
+        if queue is not None:
+            data["queue"] = queue  # waiting for a spawn slot: position and ETA
+    return data
+
+def _too_busy(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after))})
 
 @app.post("/api/v1/dh/boot", response_model=BootResponse)
-def boot_dh(req: BootRequest):
+async def boot_dh(req: BootRequest, request: Request):
+    fwd = await _owner_response(req.session_id, request)
+    if fwd is not None:
+        return fwd
+    if req.session_id:
+        manager.prefetch_questions(req.session_id, 0)
     try:
-        url = manager.boot_vtuber(timeout_sec=req.timeout_sec, public_host=req.public_host)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    tip = f"数字人已生成，生成面试题后可进入沉浸式面试：{url}"
-    return {"code": 200, "data": {"session_id": req.session_id, "connect_url": url, "status": "ready", "message": tip}}
+        job, inst = manager.submit_boot(req.session_id, timeout_sec=req.timeout_sec, public_host=req.public_host)
+    except (PoolFull, Overloaded) as e:
+        if cluster is not None and req.session_id:
+            await cluster.release(req.session_id)  # placed here but no room: the next boot places it afresh
+        if isinstance(e, Overloaded):
+            raise _too_busy(e)
+        raise HTTPException(status_code=503, detail=str(e))
+    data = _boot_data(job, inst, req.session_id)
+    if not req.wait:
+        return {"code": 202, "data": data}
+    # Awaiting the job holds no thread; a client that disconnects leaves the boot running
+    await manager.jobs.wait(job, req.timeout_sec + data.get("queue", {}).get("eta_sec", 0) + 5)
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.describe().get("error"))
+    if job.status == "running":
+        raise HTTPException(status_code=504, detail=f"boot still running, poll /api/v1/dh/jobs/{job.id}")
+    return {"code": 200, "data": _boot_data(job, inst, req.session_id)}
+
+@app.get("/api/v1/dh/jobs/{job_id}", response_model=SimpleResponse)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=120, description="long-poll up to this many seconds")):
+    job = manager.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job not found: {job_id}")
+    await manager.jobs.wait(job, wait)
+    return {"code": 200, "data": job.describe()}
 
 @app.post("/api/v1/dh/llm/start", response_model=SimpleResponse)
-def start_llm(req: LLMStartRequest):
-    return {"code": 200, "data": manager.start_llm(req)}
+async def start_llm(req: LLMStartRequest, request: Request):
+    fwd = await _owner_response(req.session_id, request)
+    if fwd is not None:
+        return fwd
+    try:
+        return {"code": 200, "data": await manager.start_llm(req)}
+    except Overloaded as e:
+        raise _too_busy(e)
+
+@app.delete("/api/v1/dh/llm/rounds/{session_id}/{round_index}", response_model=SimpleResponse)
+async def evict_llm_round(session_id: str, round_index: int, request: Request):
+    fwd = await _owner_response(session_id, request, claim=False)
+    if fwd is not None:
+        return fwd
+    try:
+        return {"code": 200, "data": await manager.evict_llm_round(session_id, round_index)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/v1/dh/sessions/{session_id}", response_model=SimpleResponse)
+async def release_session(session_id: str, request: Request):
+    """Free the session's VTuber slot (otherwise it expires after VTUBER_SESSION_TTL_SEC)."""
+    fwd = await _owner_response(session_id, request, claim=False)
+    if fwd is not None:
+        return fwd
+    data = manager.release_session(session_id)
+    if cluster is not None:
+        await cluster.release(session_id)
+    return {"code": 200, "data": data}
+
+@app.get("/api/v1/dh/sessions/{session_id}/logs", response_model=SimpleResponse)
+async def session_logs(request: Request, session_id: str, since: Optional[float] = Query(None, description="unix seconds"),
+                       until: Optional[float] = Query(None, description="unix seconds"),
+                       round_index: Optional[int] = None, limit: int = Query(1000, ge=1, le=20000)):
+    """One interview's log records (round server, and its VTuber while it serves only this session)."""
+    fwd = await _owner_response(session_id, request, claim=False)
+    if fwd is not None:
+        return fwd
+    if not RECORDS.enabled:
+        raise HTTPException(status_code=404, detail="log records are disabled (LOG_RECORDS=false)")
+    return {"code": 200, "data": await RECORDS.query(session_id, since, until, round_index, limit)}
 
 @app.get("/api/v1/dh/status", response_model=SimpleResponse)
-def status():
-    return {"code": 200, "data": manager.status()}
+async def status():
+    data = manager.status()
+    data["cluster"] = cluster.stats() if cluster is not None else None
+    return {"code": 200, "data": data}
 
 @app.post("/api/v1/dh/stop", response_model=SimpleResponse)
-def stop_all():
-    return {"code": 200, "data": manager.stop_all()}
+async def stop_all():
+    return {"code": 200, "data": await manager.stop_all()}
 
-# ---- 新增：日志接口 ----
-def _tail_file(path: str, lines: int) -> str:
+# ---- admin: profiling the live process (ADMIN_TOKEN) ----
+SAMPLER = StackSampler()
+
+def _require_admin(request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(ADMIN_TOKEN, request.headers):
+        raise HTTPException(status_code=401, detail="admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/api/v1/dh/admin/profile")
+async def sample_profile(request: Request, seconds: float = Query(10, gt=0, le=MAX_SECONDS),
+                         hz: float = Query(100, ge=1, le=MAX_HZ),
+                         idle: bool = Query(False, description="keep stacks of threads blocked waiting")):
+    """
+    Stack samples of every thread of the orchestrator (event loop, executor
+    threads writing/compressing logs, to_thread workers …) for `seconds`, as collapsed stacks for
+    flamegraph.pl / speedscope. Round servers: POST /admin/profile on their port.
+    """
+    _require_admin(request)
+    if SAMPLER.running:
+        raise HTTPException(status_code=409, detail="a profile is already running")
     try:
-        with open(path, "rb") as f:
-            # 简单 tail 实现
-            f.seek(0, 2); size = f.tell()
-            block = 1024; data = b""
-            while size > 0 and lines >= 0:
-                step = min(block, size)
-                size -= step; f.seek(size)
-                chunk = f.read(step)
-                data = chunk + data
-                lines -= chunk.count(b"\n")
-                if lines <= 0: break
-            return data.decode("utf-8", errors="ignore")
-    except FileNotFoundError:
-        return "(no log yet)"
+        counts, info = await asyncio.to_thread(SAMPLER.run, seconds, hz, idle)
+    except Busy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(collapsed(counts), media_type="text/plain; charset=utf-8",
+                    headers={"X-Profile-Seconds": str(info["seconds"]), "X-Profile-Samples": str(info["samples"]),
+                             "X-Profile-Overhead": str(info["overhead"])})
+
+# ---- 新增：日志接口 ----
+def _log_sink(proc_name: str):
+    """proc_name is a bare log name (vtuber, vtuber-1, llm …), never a path."""
+    if not LOG_NAME_RE.match(proc_name):
+        raise HTTPException(status_code=400, detail=f"invalid log name: {proc_name}")
+    path = os.path.join(LOG_DIR, f"{proc_name}.log")
+    if not os.path.exists(path) and not os.path.exists(f"{path}.1.gz"):
+        raise HTTPException(status_code=404, detail=f"no log: {proc_name}")
+    return SINKS.get(path)
 
 @app.get("/api/v1/dh/logs/{proc_name}", response_model=SimpleResponse)
-def read_logs(proc_name: str, lines: int = Query(200, ge=1, le=5000)):
-    log_file = f"{LOG_DIR}/{proc_name}.log"
-    content = _tail_file(log_file, lines)
-    return {"code": 200, "data": {"file": log_file, "lines": lines, "content": content}}
+async def read_logs(proc_name: str, lines: int = Query(200, ge=1, le=5000)):
+    sink = _log_sink(proc_name)
+    content = await sink.tail(lines)
+    return {"code": 200, "data": {"file": sink.path, "lines": lines, "content": "\n".join(content)}}
+
+@app.get("/api/v1/dh/logs/{proc_name}/follow")
+async def follow_logs(proc_name: str, lines: int = Query(50, ge=0, le=5000)):
+    """SSE: the last `lines` lines, then every new line as it is written (`event: dropped` if the client lags)."""
+    sink = _log_sink(proc_name)
+    # span and subscription taken together on the loop: no line missed or sent twice
+    span = sink.tail_span(lines)
+    q = sink.follow()
+
+    async def events():
+        try:
+            for line in await asyncio.to_thread(sink.read_span, span, lines):
+                yield f"data: {line}\n\n"
+            while True:
+                if q.dropped and q.empty():
+                    yield "event: dropped\ndata: follower fell behind\n\n"
+                    return
+                try:
+                    batch = await asyncio.wait_for(q.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield "".join(f"data: {line}\n\n" for line in batch)
+        finally:
+            sink.unfollow(q)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import asyncio, time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import metrics
+from supervisor import Child, port_open
+
+@dataclass
+class Target:
+    """One child to watch. `restart` is None for children that must not come back (e.g. a finished round)."""
+    name: str
+    kind: str
+    child: Optional[Child]
+    port: Optional[int]
+    restart: Optional[Callable[[], Awaitable[Any]]] = None
+    # booting: the port is not expected to be open yet
+    starting: bool = False
+
+class HealthMonitor:
+    """
+    Probes every child on an interval (process alive + TCP connect to its port)
+    and publishes the result as an immutable snapshot: each round builds a new
+    dict and swaps the reference, so readers (/ping, /status, metrics) never
+    lock and never wait on the network.
+
+    A dead child, or one whose port stayed closed for `fail_threshold` probes,
+    is restarted with exponential backoff (base * 2^attempt, capped at
+    backoff_max); the attempt counter resets once it is healthy again.
+    """
+    def __init__(self, targets: Callable[[], List[Target]], interval: float = 5.0, fail_threshold: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, probe_timeout: float = 0.5):
+        self.targets = targets
+        self.interval = interval
+        self.fail_threshold = fail_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.probe_timeout = probe_timeout
+        self.snapshot: Dict[str, Dict[str, Any]] = {}
+        self._restarting: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for t in self._restarting.values():
+            t.cancel()
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot.get(name)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f"[digitalhub] health probe failed: {e!r}", flush=True)
+            await asyncio.sleep(self.interval)
+
+    async def _probe(self, t: Target) -> Dict[str, Any]:
+        alive = t.child is not None and t.child.alive
+        up = alive and t.port is not None and await port_open("127.0.0.1", t.port, self.probe_timeout)
+        return {"alive": alive, "up": up}
+
+    async def probe_all(self) -> None:
+        targets = self.targets()
+        results = await asyncio.gather(*(self._probe(t) for t in targets))
+        now = time.time()
+        prev = self.snapshot
+        snap: Dict[str, Dict[str, Any]] = {}
+        for t, r in zip(targets, results):
+            old = prev.get(t.name, {})
+            st = {
+                "kind": t.kind,
+                "pid": t.child.pid if t.child is not None else None,
+                "port": t.port,
+                "alive": r["alive"],
+                "up": r["up"],
+                "starting": t.starting,
+                "last_probe": now,
+                "last_seen": now if r["up"] else old.get("last_seen"),
+                "consecutive_failures": 0 if (r["up"] or t.starting) else old.get("consecutive_failures", 0) + 1,
+                "restarts": old.get("restarts", 0),
+                "attempt": 0 if r["up"] else old.get("attempt", 0),
+                "next_restart_at": old.get("next_restart_at"),
+                "exit_code": t.child.returncode if t.child is not None and not r["alive"] else None,
+            }
+            if r["up"]:
+                st["next_restart_at"] = None
+            elif t.restart is not None and not t.starting and t.name not in self._restarting:
+                due = not r["alive"] or st["consecutive_failures"] >= self.fail_threshold
+                if due and (st["next_restart_at"] is None or now >= st["next_restart_at"]):
+                    self._schedule_restart(t, st, now)
+            snap[t.name] = st
+        self.snapshot = snap
+
+    def _schedule_restart(self, t: Target, st: Dict[str, Any], now: float) -> None:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** st["attempt"]))
+        st["attempt"] += 1
+        st["restarts"] += 1
+        st["next_restart_at"] = now + delay
+        metrics.CHILD_RESTARTS.inc(t.kind)
+        print(f"[digitalhub] restarting {t.name} (exit={st['exit_code']}, failures={st['consecutive_failures']}, "
+              f"attempt {st['attempt']}, next in {delay:.0f}s)", flush=True)
+
+        async def _run():
+            try:
+                if t.child is not None and t.child.alive:
+                    await t.child.terminate()
+                await t.restart()
+            except Exception as e:
+                print(f"[digitalhub] restart of {t.name} failed: {e!r}", flush=True)
+            finally:
+                self._restarting.pop(t.name, None)
+        self._restarting[t.name] = asyncio.get_running_loop().create_task(_run())
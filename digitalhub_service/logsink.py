@@ -0,0 +1,202 @@
+from __future__ import annotations
+import asyncio, collections, gzip, os, shutil, threading, time
+from typing import Dict, List, Optional, Set, Tuple
+
+# one offset every INDEX_EVERY lines: a tail of N lines reads at most N + INDEX_EVERY lines
+INDEX_EVERY = 256
+FOLLOW_QUEUE = 10000
+
+class Follower(asyncio.Queue):
+    """Batches of new lines for one follow stream; `dropped` once it fell FOLLOW_QUEUE batches behind."""
+    def __init__(self):
+        super().__init__(FOLLOW_QUEUE)
+        self.dropped = False
+
+class LogSink:
+    """
+    Append-only log file fed by the child reader tasks (event loop only).
+
+    Lines are buffered and written in batches: when `batch_bytes` are pending,
+    else `flush_interval` after the first pending line. The file is rotated at
+    `max_bytes` into path.1.gz … path.<backups>.gz (compressed in a worker thread).
+    A sparse index keeps the byte offset of every INDEX_EVERY-th line of the
+    current file, so the last N lines are one seek + one read. Followers get
+    every flushed batch pushed to their queue.
+    """
+    _rotate_lock = threading.Lock()
+
+    def __init__(self, path: str, max_bytes: int = 20 * 1024 * 1024, backups: int = 5,
+                 flush_interval: float = 0.1, batch_bytes: int = 64 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.batch_bytes = batch_bytes
+        self._buf: List[bytes] = []
+        self._buf_bytes = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._f = None
+        self._followers: Set[Follower] = set()
+        self.lines = 0
+        self.size = 0
+        self.offsets: List[int] = []
+        self.rotations = 0
+        self._scan()
+
+    def _scan(self) -> None:
+        """Index a file left by a previous run (bounded by max_bytes thanks to rotation)."""
+        self.lines, self.size, self.offsets = 0, 0, []
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if self.lines % INDEX_EVERY == 0:
+                        self.offsets.append(self.size)
+                    self.size += len(line)
+                    self.lines += 1
+        except FileNotFoundError:
+            pass
+
+    # ---- writing (event loop) ----
+    def write(self, line: str) -> None:
+        if not line.endswith("\n"):
+            line += "\n"
+        b = line.encode("utf-8", errors="ignore")
+        self._buf.append(b)
+        self._buf_bytes += len(b)
+        if self._buf_bytes >= self.batch_bytes:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buf:
+            return
+        batch, self._buf, self._buf_bytes = self._buf, [], 0
+        if self._f is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._f = open(self.path, "ab")
+        for b in batch:
+            if self.lines % INDEX_EVERY == 0:
+                self.offsets.append(self.size)
+            self.size += len(b)
+            self.lines += 1
+        self._f.write(b"".join(batch))
+        self._f.flush()
+        if self._followers:
+            text = [b.decode("utf-8", errors="ignore").rstrip("\n") for b in batch]
+            for q in list(self._followers):
+                try:
+                    q.put_nowait(text)
+                except asyncio.QueueFull:
+                    # a reader that fell this far behind is cut off instead of buffering without bound
+                    self._followers.discard(q)
+                    q.dropped = True
+        if self.size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        self._f.close()
+        self._f = None
+        pending = f"{self.path}.{time.time_ns()}.pending"
+        os.replace(self.path, pending)
+        self.lines, self.size, self.offsets = 0, 0, []
+        self.rotations += 1
+        asyncio.get_running_loop().run_in_executor(None, self._compress, pending)
+
+    def _compress(self, pending: str) -> None:
+        with self._rotate_lock:
+            oldest = f"{self.path}.{self.backups}.gz"
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}.gz"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}.gz")
+            tmp = f"{self.path}.1.gz.tmp"
+            with open(pending, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp, f"{self.path}.1.gz")
+            os.remove(pending)
+
+    def close(self) -> None:
+        self.flush()
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    # ---- reading ----
+    def tail_span(self, n: int) -> Tuple[int, int, int]:
+        """
+        (start offset, lines to skip after it, end offset) covering the last n lines
+        of the current file. Flushes first; cheap, call it on the loop.
+        """
+        self.flush()
+        first = max(0, self.lines - n)
+        block = first // INDEX_EVERY
+        if block >= len(self.offsets):
+            return self.size, 0, self.size
+        return self.offsets[block], first - block * INDEX_EVERY, self.size
+
+    def read_span(self, span: Tuple[int, int, int], n: int) -> List[str]:
+        """Blocking: the lines of `span`, topped up from the newest rotated file when short."""
+        start, skip, end = span
+        lines: List[str] = []
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                data = f.read(end - start)
+            lines = data.decode("utf-8", errors="ignore").splitlines()[skip:]
+        except FileNotFoundError:
+            pass
+        if len(lines) < n:
+            try:
+                with gzip.open(f"{self.path}.1.gz", "rt", encoding="utf-8", errors="ignore") as f:
+                    older = collections.deque((l.rstrip("\n") for l in f), maxlen=n - len(lines))
+                lines = list(older) + lines
+            except (FileNotFoundError, OSError, EOFError):
+                pass
+        return lines[-n:] if n else []
+
+    async def tail(self, n: int) -> List[str]:
+        return await asyncio.to_thread(self.read_span, self.tail_span(n), n)
+
+    def follow(self) -> Follower:
+        """Queue receiving a list of lines per flushed batch; pair with unfollow()."""
+        q = Follower()
+        self._followers.add(q)
+        return q
+
+    def unfollow(self, q: Follower) -> None:
+        self._followers.discard(q)
+
+    def stats(self) -> Dict[str, int]:
+        return {"lines": self.lines, "bytes": self.size, "rotations": self.rotations,
+                "followers": len(self._followers)}
+
+class SinkRegistry:
+    """One sink per path: every round server writes llm.log through the same sink."""
+    def __init__(self, **opts):
+        self.opts = opts
+        self._sinks: Dict[str, LogSink] = {}
+
+    def configure(self, **opts) -> None:
+        self.opts.update(opts)
+
+    def get(self, path: str) -> LogSink:
+        path = os.path.abspath(path)
+        sink = self._sinks.get(path)
+        if sink is None:
+            sink = self._sinks[path] = LogSink(path, **self.opts)
+        return sink
+
+    def close(self) -> None:
+        for sink in self._sinks.values():
+            sink.close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {os.path.basename(p): s.stats() for p, s in self._sinks.items()}
+
+SINKS = SinkRegistry()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+import asyncio, bisect, json, os, time
+from typing import Any, Dict, List, Optional, Tuple
+
+# one (ts, offset) pair every INDEX_EVERY records of a segment
+INDEX_EVERY = 512
+
+class Segment:
+    """
+    One append-only JSONL file of log records plus its index: a sparse time index
+    and, per session, the byte range and time range it occupies. Sealed segments
+    keep the index next to them as <name>.idx.json.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.count = 0
+        self.first_ts: Optional[float] = None
+        self.last_ts: Optional[float] = None
+        self.times: List[float] = []
+        self.offsets: List[int] = []
+        # session_id -> [first offset, end offset, first ts, last ts, records]
+        self.sessions: Dict[str, List[Any]] = {}
+
+    @property
+    def idx_path(self) -> str:
+        return self.path[:-len(".jsonl")] + ".idx.json"
+
+    def add(self, ts: float, session_id: Optional[str], nbytes: int) -> None:
+        if self.count % INDEX_EVERY == 0:
+            self.times.append(ts)
+            self.offsets.append(self.size)
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        if session_id:
+            s = self.sessions.get(session_id)
+            if s is None:
+                self.sessions[session_id] = [self.size, self.size + nbytes, ts, ts, 1]
+            else:
+                s[1] = self.size + nbytes
+                s[3] = ts
+                s[4] += 1
+        self.size += nbytes
+        self.count += 1
+
+    def span(self, session_id: str, since: Optional[float], until: Optional[float]) -> Optional[Tuple[int, int]]:
+        """Byte range that can hold the session's records in [since, until]; None: nothing here."""
+        s = self.sessions.get(session_id)
+        if s is None or (since is not None and s[3] < since) or (until is not None and s[2] > until):
+            return None
+        start, end = s[0], s[1]
+        if since is not None:
+            i = bisect.bisect_right(self.times, since) - 1
+            if i > 0:
+                start = max(start, self.offsets[i])
+        if until is not None:
+            j = bisect.bisect_right(self.times, until)
+            if j < len(self.offsets):
+                end = min(end, self.offsets[j])
+        return (start, end) if start < end else None
+
+    def seal(self) -> None:
+        tmp = self.idx_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "count": self.count, "first_ts": self.first_ts, "last_ts": self.last_ts,
+                       "times": self.times, "offsets": self.offsets, "sessions": self.sessions}, f)
+        os.replace(tmp, self.idx_path)
+
+    @classmethod
+    def load(cls, path: str) -> "Segment":
+        """From the sidecar index, or by scanning a segment a crash left unsealed."""
+        seg = cls(path)
+        try:
+            with open(seg.idx_path, "r", encoding="utf-8") as f:
+                d = json.load(f)
+            if d["size"] == os.path.getsize(path):
+                for k in ("size", "count", "first_ts", "last_ts", "times", "offsets", "sessions"):
+                    setattr(seg, k, d[k])
+                return seg
+        except (OSError, ValueError, KeyError):
+            pass
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    rec = None
+                if not isinstance(rec, dict):
+                    seg.size += len(line)
+                    continue
+                seg.add(rec.get("ts") or 0.0, rec.get("session_id"), len(line))
+        seg.seal()
+        return seg
+
+class RecordStore:
+    """
+    Structured, session-tagged log records of the children, kept in size-bounded
+    segments under `root` (the newest `max_segments` are retained). A line becomes
+    a record when it is a JSON object (the round server logs that way) or when its
+    child can be tied to one session; plain untagged output stays only in the
+    .log files. query() reads just the byte ranges the segment indexes point at,
+    so finding one interview does not scan the store.
+    """
+    def __init__(self, root: str, segment_bytes: int = 64 * 1024 * 1024, max_segments: int = 32,
+                 flush_interval: float = 0.2):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.flush_interval = flush_interval
+        self.enabled = True
+        self.segments: List[Segment] = []
+        self._f = None
+        self._buf: List[bytes] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loaded = False
+
+    def configure(self, **opts) -> None:
+        for k, v in opts.items():
+            setattr(self, k, v)
+
+    def _load(self) -> None:
+        self._loaded = True
+        os.makedirs(self.root, exist_ok=True)
+        names = sorted(n for n in os.listdir(self.root) if n.startswith("seg-") and n.endswith(".jsonl"))
+        self.segments = [Segment.load(os.path.join(self.root, n)) for n in names]
+        self._new_segment()
+
+    def _new_segment(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self.segments[-1].seal()
+        seg = Segment(os.path.join(self.root, f"seg-{time.time_ns():020d}.jsonl"))
+        self.segments.append(seg)
+        self._f = open(seg.path, "ab")
+        for old in self.segments[:-self.max_segments]:
+            for p in (old.path, old.idx_path):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+        self.segments = self.segments[-self.max_segments:]
+
+    # ---- writing (event loop) ----
+    @staticmethod
+    def _tags(extra: Dict[str, Any]) -> Dict[str, Any]:
+        tags = {k: extra[k] for k in ("session_id", "round_index") if extra.get(k) is not None}
+        sessions = extra.get("sessions")
+        if "session_id" not in tags and sessions is not None and len(sessions) == 1:
+            tags["session_id"] = next(iter(sessions))
+        return tags
+
+    def ingest(self, proc: str, pid: int, line: str, extra: Dict[str, Any]) -> None:
+        """One output line of a child; extra is Child.extra (session_id / round_index / sessions)."""
+        if not self.enabled:
+            return
+        line = line.rstrip("\n")
+        rec: Optional[Dict[str, Any]] = None
+        if line.startswith("{"):
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                rec = None
+            if not isinstance(rec, dict):
+                rec = None
+        if rec is None:
+            tags = self._tags(extra)
+            if "session_id" not in tags:
+                return
+            rec = dict(tags, msg=line)
+        else:
+            for k, v in self._tags(extra).items():
+                rec.setdefault(k, v)
+        rec["ts"] = time.time()
+        rec["proc"] = proc
+        rec["pid"] = pid
+        self.append(rec)
+
+    def append(self, rec: Dict[str, Any]) -> None:
+        if not self._loaded:
+            self._load()
+        b = (json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        sid = rec.get("session_id")
+        self.segments[-1].add(rec["ts"], str(sid) if sid is not None else None, len(b))
+        self._buf.append(b)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._buf:
+            return
+        batch, self._buf = self._buf, []
+        self._f.write(b"".join(batch))
+        self._f.flush()
+        if self.segments[-1].size >= self.segment_bytes:
+            self._new_segment()
+
+    def close(self) -> None:
+        self.flush()
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            self.segments[-1].seal()
+
+    # ---- reading ----
+    async def query(self, session_id: str, since: Optional[float] = None, until: Optional[float] = None,
+                    round_index: Optional[int] = None, limit: int = 1000) -> Dict[str, Any]:
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+        self.flush()
+        spans = []
+        for seg in list(self.segments):
+            sp = seg.span(session_id, since, until)
+            if sp is not None:
+                spans.append((seg.path, sp))
+        records, scanned = await asyncio.to_thread(self._read, spans, session_id, since, until, round_index, limit)
+        return {"session_id": session_id, "records": records, "count": len(records),
+                "truncated": len(records) >= limit, "segments": len(spans), "bytes_scanned": scanned}
+
+    @staticmethod
+    def _read(spans, session_id, since, until, round_index, limit) -> Tuple[List[Dict[str, Any]], int]:
+        out: List[Dict[str, Any]] = []
+        scanned = 0
+        for path, (start, end) in spans:
+            try:
+                with open(path, "rb") as f:
+                    f.seek(start)
+                    data = f.read(end - start)
+            except FileNotFoundError:
+                continue  # dropped by retention meanwhile
+            scanned += len(data)
+            for line in data.splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if str(rec.get("session_id")) != session_id:
+                    continue
+                ts = rec.get("ts") or 0.0
+                if (since is not None and ts < since) or (until is not None and ts > until):
+                    continue
+                if round_index is not None and rec.get("round_index") is not None \
+                        and int(rec["round_index"]) != round_index:
+                    continue
+                out.append(rec)
+                if len(out) >= limit:
+                    return out, scanned
+        return out, scanned
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "segments": len(self.segments),
+                "bytes": sum(s.size for s in self.segments)}
+
+RECORDS = RecordStore(os.path.join("logs", "records"))
@@ -0,0 +1,113 @@
+"""
+On-demand profiling of the live process, no dependency.
+
+StackSampler: the calling (worker) thread snapshots the stack of every thread
+(sys._current_frames) `hz` times a second and counts identical stacks, output
+as collapsed stacks ("thread;outer;...;inner count" per line), the input of
+flamegraph.pl, speedscope and inferno. Nothing is hooked into the profiled
+threads: the cost is the sampler's own walk over the stacks, and only while a
+profile runs.
+
+The sampler half of the round server's app/profiler.py; the orchestrator has no
+per-route cProfile toggle.
+"""
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+
+# (file, function) of the innermost Python frame of a thread blocked waiting, not working;
+# under uvloop an idle event loop sits in C below asyncio.run / run_until_complete
+IDLE_LEAVES = frozenset({("selectors.py", "select"), ("threading.py", "wait"),
+                         ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+                         ("socket.py", "accept"), ("thread.py", "_worker"),
+                         ("runners.py", "run"), ("base_events.py", "run_until_complete")})
+MAX_SECONDS = 300.0
+MAX_HZ = 1000.0
+
+def authorized(token: str, headers) -> bool:
+    """`Authorization: Bearer <token>` or `X-Admin-Token: <token>`, compared in constant time."""
+    if not token:
+        return False
+    got = headers.get("x-admin-token") or ""
+    auth = headers.get("authorization") or ""
+    if auth[:7].lower() == "bearer ":
+        got = auth[7:].strip()
+    return hmac.compare_digest(got.encode("utf-8"), token.encode("utf-8"))
+
+class Busy(Exception):
+    """Another profile is already running (HTTP 409)."""
+
+def _thread_name(name: str) -> str:
+    # pool threads share one root: ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0_*
+    return re.sub(r"(?<=[_-])\d+$", "*", name).replace(";", ":")
+
+class StackSampler:
+    """One profile at a time per process; run() blocks for `seconds` (call it in a thread)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+            label = f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def run(self, seconds: float, hz: float = 100.0, idle: bool = False) -> Tuple[Dict[str, int], Dict[str, float]]:
+        """
+        Sample for `seconds`; returns ({collapsed stack: count}, info). Stacks of
+        blocked threads (innermost frame in IDLE_LEAVES) are dropped unless `idle`.
+        """
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        interval = 1.0 / min(max(hz, 1.0), MAX_HZ)
+        if not self._lock.acquire(blocking=False):
+            raise Busy("a profile is already running")
+        try:
+            me = threading.get_ident()
+            counts: Dict[str, int] = {}
+            samples = 0
+            overhead = 0.0
+            t0 = time.perf_counter()
+            deadline = t0 + seconds
+            next_at = t0
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    code = frame.f_code
+                    if not idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(_thread_name(names.get(ident, f"thread-{ident}")))
+                    key = ";".join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                samples += 1
+                overhead += time.perf_counter() - now
+                next_at += interval
+                time.sleep(max(0.0, min(next_at, deadline) - time.perf_counter()))
+            elapsed = time.perf_counter() - t0
+            return counts, {"seconds": round(elapsed, 3), "samples": samples,
+                            "overhead": round(overhead / elapsed, 4) if elapsed else 0.0}
+        finally:
+            self._lock.release()
+
+def collapsed(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
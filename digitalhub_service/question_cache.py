@@ -0,0 +1,147 @@
+from __future__ import annotations
+import os, re, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from minio import Minio
+from minio.error import S3Error
+
+from metrics import MINIO_ERRORS, MINIO_SECONDS
+
+QUESTIONS_OBJECT_TPL = "data/questions_round_{round}_{session}.json"
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+@dataclass
+class CacheEntry:
+    etag: str
+    data: bytes
+
+def minio_client(endpoint: str, access_key: str, secret_key: str, secure: bool) -> Minio:
+    # The SDK wants host[:port]; tolerate "http://minio:9000" style values from .env
+    m = re.match(r"(https?)://(.+?)/?$", endpoint)
+    if m:
+        secure = m.group(1) == "https"
+        endpoint = m.group(2)
+    return Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+
+class QuestionCache:
+    """
+    Question-bank objects keyed by object name, validated by ETag, LRU-evicted
+    once the cached bytes exceed `max_bytes`. Fetched banks are handed to round
+    servers as local files so they never download the same object again.
+    Prefetches share a few worker threads and skip banks cached or in flight.
+    """
+    def __init__(self, max_bytes: int, handoff_dir: str, prefetch_workers: int = 2):
+        self.max_bytes = max_bytes
+        self.handoff_dir = handoff_dir
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, str], CacheEntry]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._prefetching: Set[Tuple[str, str]] = set()
+        self._prefetch_pool = ThreadPoolExecutor(prefetch_workers, thread_name_prefix="question-prefetch")
+
+    def _get_cached(self, key: Tuple[str, str], etag: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.etag != etag:
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += len(entry.data)
+            return entry.data
+
+    def _put(self, key: Tuple[str, str], etag: str, data: bytes) -> None:
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old.data)
+            if len(data) > self.max_bytes:
+                return
+            self.entries[key] = CacheEntry(etag=etag, data=data)
+            self.size += len(data)
+            while self.size > self.max_bytes and self.entries:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.data)
+                self.evictions += 1
+
+    def fetch(self, client: Minio, bucket: str, object_name: str) -> bytes:
+        """Object bytes, from cache when the ETag still matches (one HEAD instead of a GET)."""
+        key = (bucket, object_name)
+        try:
+            with MINIO_SECONDS.time("stat"):
+                etag = client.stat_object(bucket, object_name).etag
+        except Exception:
+            MINIO_ERRORS.inc("stat")
+            raise
+        data = self._get_cached(key, etag)
+        if data is not None:
+            return data
+        with self.lock:
+            self.misses += 1
+        try:
+            with MINIO_SECONDS.time("get"):
+                resp = client.get_object(bucket, object_name)
+                try:
+                    data = resp.read()
+                finally:
+                    resp.close()
+                    resp.release_conn()
+        except Exception:
+            MINIO_ERRORS.inc("get")
+            raise
+        self._put(key, etag, data)
+        return data
+
+    def handoff(self, client: Minio, bucket: str, object_name: str) -> str:
+        """Write the (cached) object to a local file for the round server; returns its path."""
+        data = self.fetch(client, bucket, object_name)
+        os.makedirs(self.handoff_dir, exist_ok=True)
+        path = os.path.join(self.handoff_dir, _SAFE_RE.sub("_", object_name))
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def prefetch(self, client: Minio, bucket: str, object_name: str) -> bool:
+        """
+        Warm the cache in the background; a bank that doesn't exist yet is not an error.
+        False when the bank is cached already (fetch revalidates it) or being prefetched.
+        """
+        key = (bucket, object_name)
+        with self.lock:
+            if key in self.entries or key in self._prefetching:
+                return False
+            self._prefetching.add(key)
+
+        def _run():
+            try:
+                self.fetch(client, bucket, object_name)
+            except S3Error:
+                pass
+            except Exception as e:
+                print(f"[digitalhub] prefetch {object_name} failed: {e!r}", flush=True)
+            finally:
+                with self.lock:
+                    self._prefetching.discard(key)
+        self._prefetch_pool.submit(_run)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+            }
@@ -13,6 +13,7 @@ if command -v uv >/dev/null 2>&1; then
     --with 'uvicorn[standard]>=0.29' \
     --with pydantic>=2.6 \
     --with requests>=2.31 \
+    --with minio>=7.2 \
     uvicorn digitalhub_service:app --host 127.0.0.1 --port 9009 --reload
 elif command -v python3 >/dev/null 2>&1; then
   # 兜底：系统有 python3 就用 venv 跑
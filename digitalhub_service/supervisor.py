@@ -0,0 +1,221 @@
+from __future__ import annotations
+import asyncio, re, time, uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Pattern
+
+from logsink import SINKS
+from logstore import RECORDS
+
+LineWatcher = Callable[[str], None]
+
+# asyncio's default StreamReader limit is 64 KiB; a long child log line must not kill the reader
+STREAM_LIMIT = 1024 * 1024
+
+class Child:
+    """
+    One supervised child process. A single reader task owns stdout and fans every
+    line out to the log file and to the registered watchers (readiness matchers,
+    pool warm-up markers), so nothing else ever reads the pipe.
+    """
+    def __init__(self, name: str, proc: asyncio.subprocess.Process, log_path: str):
+        self.name = name
+        self.proc = proc
+        self.log_path = log_path
+        self.url: Optional[str] = None
+        self.started_at = time.time()
+        self.extra: Dict[str, Any] = {}
+        self._watchers: List[LineWatcher] = []
+        self.reader = asyncio.get_running_loop().create_task(self._read())
+
+    @property
+    def pid(self) -> int:
+        return self.proc.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.proc.returncode
+
+    def watch(self, fn: LineWatcher) -> Callable[[], None]:
+        """Call fn(line) for every output line from now on; returns the unsubscribe function."""
+        self._watchers.append(fn)
+        return lambda: self._watchers.remove(fn) if fn in self._watchers else None
+
+    async def _read(self) -> None:
+        sink = SINKS.get(self.log_path)
+        while True:
+            try:
+                raw = await self.proc.stdout.readline()
+            except ValueError:
+                # line longer than STREAM_LIMIT: take what is buffered
+                raw = await self.proc.stdout.read(STREAM_LIMIT)
+            if not raw:
+                break
+            line = raw.decode("utf-8", errors="ignore")
+            sink.write(line)
+            RECORDS.ingest(self.name, self.pid, line, self.extra)
+            for fn in list(self._watchers):
+                try:
+                    fn(line)
+                except Exception as e:
+                    print(f"[digitalhub] {self.name} line watcher failed: {e!r}", flush=True)
+        # the last lines of a dead child should be readable right away
+        sink.flush()
+        RECORDS.flush()
+        await self.proc.wait()
+
+    async def wait_for(self, patterns: List[Pattern[str]], timeout: float) -> Optional[re.Match]:
+        """
+        First match of any pattern in the output from now on. None on timeout or
+        when the child exits first.
+        """
+        fut = asyncio.get_running_loop().create_future()
+
+        def on_line(line: str) -> None:
+            for p in patterns:
+                m = p.search(line)
+                if m and not fut.done():
+                    fut.set_result(m)
+                    return
+        unwatch = self.watch(on_line)
+        try:
+            done, _ = await asyncio.wait({fut, self.reader}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            return fut.result() if fut in done else None
+        finally:
+            unwatch()
+            if not fut.done():
+                fut.cancel()
+
+    async def send_line(self, line: str) -> None:
+        self.proc.stdin.write(line.encode("utf-8") + b"\n")
+        await self.proc.stdin.drain()
+        self.proc.stdin.close()
+
+    async def terminate(self, timeout: float = 3.0) -> None:
+        if not self.alive:
+            return
+        try:
+            self.proc.terminate()
+            await asyncio.wait_for(self.proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+        except ProcessLookupError:
+            pass
+
+async def spawn(name: str, argv: List[str], cwd: str, log_path: str,
+                env: Optional[Dict[str, str]] = None, stdin: bool = False) -> Child:
+    proc = await asyncio.create_subprocess_exec(
+        *argv, cwd=cwd, env=env,
+        stdin=asyncio.subprocess.PIPE if stdin else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        limit=STREAM_LIMIT,
+    )
+    return Child(name, proc, log_path)
+
+async def port_open(host: str, port: int, timeout: float = 0.25) -> bool:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+async def wait_port(host: str, port: int, timeout: float, poll: float = 0.05,
+                    child: Optional[Child] = None) -> bool:
+    """Poll until the port accepts connections; gives up early if `child` exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if await port_open(host, port):
+            return True
+        if child is not None and not child.alive:
+            return False
+        await asyncio.sleep(poll)
+    return False
+
+class Job:
+    """A background operation (e.g. a VTuber boot) that clients can poll or await by id."""
+    def __init__(self, kind: str, task: asyncio.Task, key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.task = task
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # while running: queue position/ETA of a job that waits for its turn, None once it runs
+        self.progress: Optional[Callable[[], Optional[Dict[str, Any]]]] = None
+
+    @property
+    def status(self) -> str:
+        if not self.task.done():
+            return "running"
+        if self.task.cancelled() or self.task.exception() is not None:
+            return "failed"
+        return "done"
+
+    def describe(self) -> Dict[str, Any]:
+        out = {"job_id": self.id, "kind": self.kind, "status": self.status,
+               "created_at": self.created_at, "finished_at": self.finished_at}
+        if not self.task.done() and self.progress is not None:
+            queue = self.progress()
+            if queue is not None:
+                out["queue"] = queue
+        if self.task.done():
+            if self.task.cancelled():
+                out["error"] = "cancelled"
+            elif self.task.exception() is not None:
+                out["error"] = str(self.task.exception())
+            else:
+                out["result"] = self.task.result()
+        return out
+
+class JobRegistry:
+    """
+    Jobs by id. A job submitted with a `key` that already has one running joins
+    it instead of starting a second (e.g. many boot requests for the same VTuber).
+    Finished jobs are kept `keep_sec` so late pollers still see the outcome.
+    """
+    def __init__(self, keep_sec: float = 600.0):
+        self.keep_sec = keep_sec
+        self._jobs: Dict[str, Job] = {}
+
+    def _prune(self) -> None:
+        now = time.time()
+        for jid in [j.id for j in self._jobs.values()
+                    if j.finished_at is not None and now - j.finished_at > self.keep_sec]:
+            del self._jobs[jid]
+
+    def submit(self, kind: str, make: Callable[[], Awaitable[Any]], key: Optional[str] = None) -> Job:
+        self._prune()
+        if key is not None:
+            job = self.running(key)
+            if job is not None:
+                return job
+        job = Job(kind, asyncio.get_running_loop().create_task(make()), key)
+
+        def _finished(task: asyncio.Task) -> None:
+            job.finished_at = time.time()
+            if not task.cancelled() and task.exception() is not None:
+                print(f"[digitalhub] job {kind} {job.id} failed: {task.exception()!r}", flush=True)
+        job.task.add_done_callback(_finished)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def running(self, key: str) -> Optional[Job]:
+        """The unfinished job with this key, i.e. the one submit() would join."""
+        return next((j for j in self._jobs.values() if j.key == key and not j.task.done()), None)
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        """Wait up to `timeout` for the job; the job keeps running if the waiter goes away."""
+        if timeout > 0 and not job.task.done():
+            await asyncio.wait({job.task}, timeout=timeout)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        running = sum(1 for j in self._jobs.values() if not j.task.done())
+        return {"running": running, "kept": len(self._jobs) - running}
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import asyncio, os, re, time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import metrics
+from supervisor import Child, spawn, port_open
+
+UVICORN_READY_RE = re.compile(r"Uvicorn running on (https?://[^\s]+)")
+VTUBER_PORT_LINE_RE = re.compile(r"Starting server on (?:localhost|127\.0\.0\.1):(\d+)")
+
+class PoolFull(Exception):
+    pass
+
+def _replace_in_block(text: str, block: str, key: str, value: str) -> str:
+    """
+    Set the first `key:` line after the `block:` line, keeping indentation and the
+    trailing comment. Plain text substitution so the template's comments survive.
+    """
+    m = re.search(rf"(?m)^[ \t]*{re.escape(block)}:[ \t]*(#.*)?$", text)
+    if not m:
+        raise ValueError(f"conf template has no '{block}' section")
+    k = re.compile(rf"(?m)^([ \t]*{re.escape(key)}:[ \t]*)([^#\n]*?)([ \t]*#.*)?$")
+    km = k.search(text, m.end())
+    if not km:
+        raise ValueError(f"conf template has no '{key}' under '{block}'")
+    return text[:km.start()] + km.group(1) + value + (km.group(3) or "") + text[km.end():]
+
+def render_conf(template: str, port: int, llm_base_url: str) -> str:
+    """conf.yaml for one instance: its own listen port and its own round server."""
+    text = _replace_in_block(template, "system_config", "port", str(port))
+    return _replace_in_block(text, "openai_compatible_llm", "base_url", f"'{llm_base_url}'")
+
+@dataclass
+class VtuberInstance:
+    name: str
+    port: int
+    llm_port: int
+    workdir: str
+    child: Optional[Child] = None
+    url: Optional[str] = None
+    # host the connect URL was built for, reused when the health monitor restarts the instance
+    public_host: Optional[str] = None
+    sessions: Set[str] = field(default_factory=set)
+    last_used: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def alive(self) -> bool:
+        return self.child is not None and self.child.alive
+
+    def describe(self) -> Dict[str, Any]:
+        return {"name": self.name, "port": self.port, "llm_port": self.llm_port, "alive": self.alive,
+                "pid": self.child.pid if self.child else None, "url": self.url,
+                "sessions": sorted(self.sessions), "idle_sec": int(time.time() - self.last_used)}
+
+class VtuberPool:
+    """
+    N Open-LLM-VTuber instances, instance i listening on base_port+i and talking
+    to the round server on llm_base_port+i. Each runs in its own overlay dir
+    (symlinks to VTUBER_ROOT + a generated conf.yaml). Sessions go to the
+    least-loaded instance; instances without sessions are stopped after
+    `idle_ttl` and booted again on demand.
+    A pool of one without a template runs straight from VTUBER_ROOT with its own conf.yaml.
+    """
+    def __init__(self, size: int, root: str, instance_dir: str, base_port: int, llm_base_port: int,
+                 log_dir: str, template_path: Optional[str] = None, max_sessions: int = 0,
+                 idle_ttl: float = 600.0, session_ttl: float = 7200.0, shared_llm_root: Optional[str] = None):
+        self.root = root
+        self.instance_dir = instance_dir
+        self.log_dir = log_dir
+        self.template_path = template_path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.session_ttl = session_ttl
+        # shared mode: every instance talks to one multi-round server under its own
+        # /bound/{name} prefix, bound to the instance's current round by start_llm
+        self.shared_llm_root = shared_llm_root
+        legacy = size <= 1 and not template_path
+        self.instances: List[VtuberInstance] = [
+            VtuberInstance(name=f"vtuber-{i}", port=base_port + i, llm_port=llm_base_port + i,
+                           workdir=root if legacy else os.path.join(instance_dir, f"vtuber-{i}"))
+            for i in range(max(1, size))
+        ]
+        self.session_map: Dict[str, VtuberInstance] = {}
+        self.session_seen: Dict[str, float] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._reaper is None and (self.idle_ttl > 0 or self.session_ttl > 0):
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_loop())
+
+    # ---- placement ----
+    def place(self, session_id: Optional[str]) -> VtuberInstance:
+        """
+        The session's instance; new sessions go to the least-loaded one (running
+        ones first). Without a session id nothing is reserved. With max_sessions > 0
+        a full pool raises PoolFull, otherwise instances are shared past that point.
+        """
+        inst = self.session_map.get(session_id) if session_id else None
+        if inst is None:
+            free = [i for i in self.instances if not self.max_sessions or len(i.sessions) < self.max_sessions]
+            if not free:
+                raise PoolFull(f"all {len(self.instances)} VTuber instances are at {self.max_sessions} session(s)")
+            inst = min(free, key=lambda i: (len(i.sessions), not i.alive, i.port))
+            if session_id:
+                inst.sessions.add(session_id)
+                self.session_map[session_id] = inst
+        if session_id:
+            self.touch(session_id)
+        return inst
+
+    def touch(self, session_id: str) -> None:
+        inst = self.session_map.get(session_id)
+        if inst is not None:
+            now = time.time()
+            self.session_seen[session_id] = now
+            inst.last_used = now
+
+    def instance_for(self, session_id: Optional[str]) -> Optional[VtuberInstance]:
+        return self.session_map.get(session_id) if session_id else None
+
+    def release(self, session_id: str) -> bool:
+        inst = self.session_map.pop(session_id, None)
+        self.session_seen.pop(session_id, None)
+        if inst is None:
+            return False
+        inst.sessions.discard(session_id)
+        inst.last_used = time.time()
+        return True
+
+    # ---- instance lifecycle ----
+    def _prepare(self, inst: VtuberInstance) -> None:
+        """Overlay dir: every entry of VTUBER_ROOT symlinked, except conf.yaml which is generated."""
+        if inst.workdir == self.root:
+            return
+        os.makedirs(inst.workdir, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name == "conf.yaml":
+                continue
+            link = os.path.join(inst.workdir, name)
+            if not os.path.lexists(link):
+                os.symlink(os.path.join(self.root, name), link)
+        template_path = self.template_path or os.path.join(self.root, "conf.yaml")
+        with open(template_path, "r", encoding="utf-8") as f:
+            template = f.read()
+        llm_url = (f"{self.shared_llm_root}/bound/{inst.name}/v1" if self.shared_llm_root
+                   else f"http://127.0.0.1:{inst.llm_port}/v1")
+        conf = render_conf(template, inst.port, llm_url)
+        tmp = os.path.join(inst.workdir, "conf.yaml.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(conf)
+        os.replace(tmp, os.path.join(inst.workdir, "conf.yaml"))
+
+    async def ensure_running(self, inst: VtuberInstance, timeout_sec: int, public_host: str,
+                             replace_host) -> str:
+        async with inst.lock:
+            if inst.alive and inst.url:
+                return inst.url
+            if inst.child:
+                await inst.child.terminate()
+            inst.public_host = public_host
+            t0 = time.perf_counter()
+            await asyncio.to_thread(self._prepare, inst)
+            proc = await spawn(inst.name, ["uv", "run", "run_server.py"], inst.workdir,
+                               os.path.join(self.log_dir, f"{inst.name}.log" if len(self.instances) > 1 else "vtuber.log"))
+            inst.child, inst.url = proc, None
+            # log records of an instance serving exactly one session are tagged with it
+            proc.extra["sessions"] = inst.sessions
+
+            # the reader task owns stdout; the matchers only see the lines it fans out
+            detected_port: List[int] = []
+            def on_line(line: str):
+                m = VTUBER_PORT_LINE_RE.search(line)
+                if m:
+                    detected_port.append(int(m.group(1)))
+            unwatch = proc.watch(on_line)
+            try:
+                m = await proc.wait_for([UVICORN_READY_RE], timeout=timeout_sec)
+            finally:
+                unwatch()
+            ready_url = m.group(1) if m else None
+            if not ready_url and detected_port and await port_open("127.0.0.1", detected_port[-1]):
+                ready_url = f"http://localhost:{detected_port[-1]}"
+            if not ready_url:
+                await proc.terminate()
+                inst.child = None
+                metrics.VTUBER_BOOT_SECONDS.observe(time.perf_counter() - t0, "failed")
+                raise RuntimeError(f"{inst.name} boot timeout or failed to detect ready URL")
+            metrics.VTUBER_BOOT_SECONDS.observe(time.perf_counter() - t0, "ok")
+            inst.url = replace_host(ready_url, public_host)
+            inst.last_used = time.time()
+            return inst.url
+
+    async def stop_instance(self, inst: VtuberInstance) -> None:
+        child, inst.child, inst.url = inst.child, None, None
+        if child is not None:
+            await child.terminate()
+
+    async def _reap_loop(self) -> None:
+        while True:
+            await asyncio.sleep(10)
+            now = time.time()
+            if self.session_ttl > 0:
+                for sid in [s for s, seen in self.session_seen.items() if now - seen > self.session_ttl]:
+                    self.release(sid)
+            if self.idle_ttl > 0:
+                for inst in self.instances:
+                    if inst.alive and not inst.sessions and now - inst.last_used > self.idle_ttl \
+                            and not inst.lock.locked():
+                        print(f"[digitalhub] stopping idle {inst.name}", flush=True)
+                        await self.stop_instance(inst)
+
+    async def stop(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        await asyncio.gather(*(self.stop_instance(i) for i in self.instances), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self.instances),
+            "max_sessions": self.max_sessions,
+            "instances": [i.describe() for i in self.instances],
+            "sessions": {sid: inst.name for sid, inst in self.session_map.items()},
+        }
+
+    def live(self) -> int:
+        return sum(1 for i in self.instances if i.alive)
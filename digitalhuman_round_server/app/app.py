@@ -1,20 +1,26 @@
-from fastapi import FastAPI
-from typing import Any, Dict
+import asyncio
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
 from .config import settings
-from .minio_adapter import MinioAdapter
-from .loader import extract_questions
-from .state import RoundState
+from .registry import MinioParams, QUESTIONS_OBJECT_TPL, QA_COMPLETE_OBJECT_TPL  # noqa: F401
 from . import dh_gateway
+from . import metrics
+from .capture import CaptureMiddleware
+from .profiler import (MAX_HZ, MAX_SECONDS, Busy, RouteProfile, RouteProfileMiddleware, StackSampler,
+                       authorized, collapsed)
 
-QUESTIONS_OBJECT_TPL = "data/questions_round_{round}_{session}.json"
-QA_COMPLETE_OBJECT_TPL = "analysis/qa_complete_{round}_{session}.json"
+app = FastAPI(title="digitalhuman-round-server", version="0.2.0")
+app.add_middleware(metrics.HTTPMetricsMiddleware, histogram=metrics.HTTP_SECONDS)
+if dh_gateway.CAPTURE is not None:
+    app.add_middleware(CaptureMiddleware, recorder=dh_gateway.CAPTURE, default_round=dh_gateway.default_round_key,
+                       bound_round=dh_gateway.bound_round_key)
+SAMPLER = StackSampler()
+ROUTE_PROFILE = RouteProfile()
+if settings.ADMIN_TOKEN:
+    app.add_middleware(RouteProfileMiddleware, profile=ROUTE_PROFILE)
 
-app = FastAPI(title="digitalhuman-round-server", version="0.1.0")
-
-@app.on_event("startup")
-def on_startup():
-    # 1) Init MinIO
-    minio = MinioAdapter(
+def _env_minio_params() -> MinioParams:
+    return MinioParams(
         endpoint=settings.MINIO_ENDPOINT,
         access_key=settings.MINIO_ACCESS_KEY,
         secret_key=settings.MINIO_SECRET_KEY,
@@ -22,45 +28,97 @@ def on_startup():
         bucket=settings.MINIO_BUCKET,
     )
 
-    # 2) Load questions JSON from MinIO (strict; no local fallback)
-    questions_object = QUESTIONS_OBJECT_TPL.format(
-        round=settings.ROUND_INDEX, session=settings.SESSION_ID
-    )
-    payload: Dict[str, Any] = minio.get_json(questions_object)
-
-    # 3) Extract questions + categories
-    questions, categories = extract_questions(payload)
-    if not questions:
-        raise RuntimeError(f"No questions found in {questions_object}")
-
-    # 4) Round meta (prefer JSON, fallback to env)
-    round_id = payload.get("round_id") or settings.ROUND_ID
-    session_name = payload.get("session_name") or settings.SESSION_NAME
-    room_id = payload.get("room_id") or settings.ROOM_ID
-    round_type = payload.get("round_type") or settings.ROUND_TYPE
+@app.on_event("startup")
+async def on_startup():
+    await dh_gateway.UPLOADS.start()
+    if not settings.is_single and dh_gateway.EXPORT is not None:
+        asyncio.get_event_loop().create_task(dh_gateway.export_loop())
 
-    # 5) Build in-memory state
-    st = RoundState.create(
-        session_id=settings.SESSION_ID,
-        round_index=settings.ROUND_INDEX,
-        round_id=round_id,
-        round_type=round_type,
-        session_name=session_name,
-        room_id=room_id,
-        questions=questions,
-        categories=categories,
-    )
+    # Single mode: load the env-configured round right away (journal first, else MinIO).
+    # Multi mode: resume journaled rounds, new ones arrive through POST /rounds.
+    if settings.is_single:
+        await dh_gateway.open_round(
+            session_id=settings.SESSION_ID,
+            round_index=settings.ROUND_INDEX,
+            minio_params=_env_minio_params(),
+            round_id=settings.ROUND_ID,
+            session_name=settings.SESSION_NAME,
+            room_id=settings.ROOM_ID,
+            round_type=settings.ROUND_TYPE,
+            questions_file=settings.QUESTIONS_FILE,
+            question_offset=settings.QUESTION_OFFSET,
+            max_questions=settings.MAX_QUESTIONS,
+        )
+    elif dh_gateway.REGISTRY.journals is not None and settings.has_default_minio:
+        for session_id, round_index in dh_gateway.REGISTRY.journals.list_rounds():
+            await dh_gateway.open_round(session_id=session_id, round_index=round_index,
+                                        minio_params=_env_minio_params())
 
-    # 6) Bind into router singletons
-    dh_gateway.APP_STATE = st
-    dh_gateway.MINIO = minio
-    dh_gateway.UPLOAD_OBJECT_NAME = QA_COMPLETE_OBJECT_TPL.format(
-        round=settings.ROUND_INDEX, session=settings.SESSION_ID
-    )
+@app.on_event("shutdown")
+async def drain_uploads():
+    # Don't drop a queued qa_complete on a graceful stop
+    await dh_gateway.UPLOADS.drain()
+    if dh_gateway.CAPTURE is not None:
+        dh_gateway.CAPTURE.flush()
+    if not settings.is_single and dh_gateway.EXPORT is not None:
+        await asyncio.get_event_loop().run_in_executor(None, dh_gateway.flush_export)
 
-    # 7) Mount routes
-    app.include_router(dh_gateway.router)
+app.include_router(dh_gateway.router)
 
 @app.get("/")
 def root():
-    return {"service": "digitalhuman-round-server", "status": "ready"}
+    return {"service": "digitalhuman-round-server", "status": "ready", "mode": settings.MODE,
+            "rounds": len(dh_gateway.REGISTRY)}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# ---- admin: profiling the live process (ADMIN_TOKEN) ----
+def require_admin(request: Request) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not authorized(settings.ADMIN_TOKEN, request.headers):
+        raise HTTPException(status_code=401, detail="admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+@app.post("/admin/profile", dependencies=[Depends(require_admin)])
+async def sample_profile(seconds: float = Query(10, gt=0, le=MAX_SECONDS), hz: float = Query(100, ge=1, le=MAX_HZ),
+                         idle: bool = Query(False, description="keep stacks of threads blocked waiting")):
+    """Stack samples of every thread of this process for `seconds`, as collapsed stacks (flamegraph.pl, speedscope)."""
+    if SAMPLER.running:
+        raise HTTPException(status_code=409, detail="a profile is already running")
+    try:
+        counts, info = await asyncio.get_event_loop().run_in_executor(None, SAMPLER.run, seconds, hz, idle)
+    except Busy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(collapsed(counts), media_type="text/plain; charset=utf-8",
+                    headers={"X-Profile-Seconds": str(info["seconds"]), "X-Profile-Samples": str(info["samples"]),
+                             "X-Profile-Overhead": str(info["overhead"])})
+
+@app.post("/admin/cprofile", dependencies=[Depends(require_admin)])
+def arm_cprofile(route: str = Query(..., description="route template, e.g. /rounds/{session_id}/{round_index}/v1/chat/completions"),
+                 requests: int = Query(20, ge=1, le=10000)):
+    """cProfile the next `requests` requests to `route`; read the result with GET."""
+    if not route.startswith("/"):
+        raise HTTPException(status_code=400, detail=f"not a route template: {route}")
+    try:
+        ROUTE_PROFILE.arm(route, requests)
+    except Busy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return ROUTE_PROFILE.info()
+
+@app.get("/admin/cprofile", dependencies=[Depends(require_admin)])
+def read_cprofile(sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls|time)$"),
+                  limit: int = Query(40, ge=1, le=1000), format: str = Query("text", pattern="^(text|pstats)$")):
+    """The armed route's profile so far: pstats text, or the binary pstats dump (snakeviz)."""
+    if format == "pstats":
+        return Response(ROUTE_PROFILE.dump(), media_type="application/octet-stream",
+                        headers={"Content-Disposition": 'attachment; filename="route.prof"'})
+    info = ROUTE_PROFILE.info()
+    header = "".join(f"# {k}: {v}\n" for k, v in info.items())
+    return Response(header + ROUTE_PROFILE.report(sort, limit), media_type="text/plain; charset=utf-8")
+
+@app.delete("/admin/cprofile", dependencies=[Depends(require_admin)])
+def disarm_cprofile():
+    ROUTE_PROFILE.disarm()
+    return ROUTE_PROFILE.info()
@@ -0,0 +1,342 @@
+"""
+Opt-in traffic capture (CAPTURE_DIR) for timed replay, see bench/replay.py.
+
+One trace file per round, JSON lines:
+
+  {"t":"trace","v":1,"session_id":...,"round_index":...,"start":epoch_s,"redacted":true}
+  {"t":"round","questions":[{"question":...,"category":...}, ...]}      when the round opens
+  {"t":"req","i":seq,"at":ms,"m":"POST","p":"/v1/chat/completions","b":{...},"k":n,"ki":seq,
+   "h":{...},"c":1,"s":200,"rt":ms,"r":digest}
+
+`at` is the arrival time since the trace started and `rt` the time until the last
+response byte, so a replay can keep both the inter-arrival gaps and the client's
+think time. `c` marks a request that arrived while another one of the round was
+still in flight (a retry racing its original). Chat bodies store only the messages
+added since the last chat request recorded before them: the first `k` messages are
+those of request `ki`, followed by `b.messages`, so the resent history costs nothing. `r` is a digest of
+the response with `created` and the session id masked (chat and answer endpoints).
+
+With redaction (the default) every user message and answer_text is replaced by a
+keyed hash padded to the original length: payload sizes stay realistic, equal texts
+stay equal (retry detection replays the same way), the text itself is gone.
+MinIO credentials and handoff paths of POST /rounds are never written.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+import time
+from hashlib import blake2b
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+_PREFIX_RE = re.compile(r"^/rounds/([^/]+)/(-?\d+)(/.*)?$")
+_BOUND_RE = re.compile(r"^/bound/([^/]+)(/.*)$")
+_CREATED_RE = re.compile(rb'"created":\s*\d+')
+# routes whose responses are compared on replay; the others only by status
+COMPARED = ("/v1/chat/completions", "/dh/answer", "/dh/answer_simple")
+_UNPREFIXED = COMPARED + ("/healthz",)
+_HEADERS = ("idempotency-key", "x-dh-session-id", "x-dh-round-index", "accept")
+_DROPPED_FIELDS = ("minio_endpoint", "minio_access_key", "minio_secret_key", "minio_bucket", "minio_secure",
+                   "questions_file")
+SID_MARK = b"{sid}"
+
+RoundKey = Tuple[str, int]
+
+def response_digest(body: bytes, *session_ids: str) -> str:
+    """What replay compares: the response minus its timestamps and session id(s), masked in order."""
+    norm = _CREATED_RE.sub(b'"created":0', body)
+    for sid in session_ids:
+        norm = norm.replace(sid.encode("utf-8"), SID_MARK)
+    return blake2b(norm, digest_size=8).hexdigest()
+
+def _resume_point(path: str, block: int = 64 * 1024) -> Tuple[float, int]:
+    """
+    (start, next seq) of an existing trace, from its header line and its tail only
+    (it runs on the loop): records are written as requests end, so they come out of
+    order only among requests in flight together, all near the end of the file.
+    """
+    with open(path, "rb") as f:
+        start = json.loads(f.readline())["start"]
+        end = f.seek(0, os.SEEK_END)
+        pos, seq = end, None
+        while seq is None and pos > 0:
+            pos = max(0, pos - block)
+            f.seek(pos)
+            lines = f.read(end - pos).split(b"\n")
+            for line in lines[1 if pos else 0:]:  # the first one may start mid-line
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line, or the blank after the final newline
+                if rec.get("t") == "req":
+                    seq = max(seq or 0, rec["i"] + 1)
+            block *= 2
+    return start, seq or 0
+
+class _Trace:
+    __slots__ = ("path", "session_id", "start", "seq", "inflight", "messages", "messages_seq", "last_seen")
+
+    def __init__(self, path: str, session_id: str, start: float, seq: int):
+        self.path = path
+        self.session_id = session_id
+        self.start = start
+        self.seq = seq
+        self.inflight = 0
+        self.messages: List[Any] = []
+        self.messages_seq = -1
+        self.last_seen = time.monotonic()
+
+class TraceRecorder:
+    """
+    Trace files of every round seen by this process. Records are queued on the
+    loop and written by one thread every `flush_interval`; nothing is fsync'ed
+    (a capture is a diagnostic, not a journal).
+    """
+    def __init__(self, directory: str, redact: bool = True, flush_interval: float = 0.2, idle_sec: float = 600.0):
+        self.directory = directory
+        self.redact = redact
+        self.flush_interval = flush_interval
+        # traces (and their open files) of rounds without traffic for this long are let go
+        self.idle_sec = idle_sec
+        self._salt = os.urandom(16)
+        self._traces: Dict[RoundKey, _Trace] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[Tuple[str, str]] = []
+        self._files: Dict[str, Any] = {}
+        self._written: Dict[str, float] = {}
+        self._begun = 0
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._writer, name="capture-writer", daemon=True).start()
+
+    # ---- traces ----
+    def path_for(self, key: RoundKey) -> str:
+        return os.path.join(self.directory, f"{_SAFE_RE.sub('_', key[0])}_{int(key[1])}.trace.jsonl")
+
+    def _trace(self, key: RoundKey, now: Optional[float] = None) -> _Trace:
+        tr = self._traces.get(key)
+        if tr is not None:
+            return tr
+        path = self.path_for(key)
+        start, seq = now or time.time(), 0
+        try:
+            # a previous process captured this round already: keep its clock and numbering
+            start, seq = _resume_point(path)
+        except (OSError, ValueError, KeyError):
+            self._write(path, {"t": "trace", "v": 1, "session_id": key[0], "round_index": key[1],
+                               "start": round(start, 3), "redacted": self.redact})
+        tr = self._traces[key] = _Trace(path, key[0], start, seq)
+        return tr
+
+    def opened(self, st) -> None:
+        """The round's questions, so a replay can recreate it without MinIO."""
+        tr = self._trace((st.session_id, st.round_index))
+        self._write(tr.path, {"t": "round", "questions": [{"question": q, "category": c}
+                                                          for q, c in zip(st.questions, st.categories)]})
+
+    def closed(self, key: RoundKey) -> None:
+        tr = self._traces.pop(key, None)
+        if tr is not None:
+            with self._lock:
+                self._pending.append((tr.path, ""))  # close marker
+
+    # ---- requests ----
+    def begin(self, key: RoundKey, t0: Optional[float] = None) -> Tuple[_Trace, int, float, bool]:
+        """A request of the round arrived (at t0, default now); pass the result on to end()."""
+        self._begun += 1
+        if self._begun % 256 == 0:
+            self._prune()
+        t0 = t0 or time.time()
+        tr = self._trace(key, t0)
+        tr.last_seen = time.monotonic()
+        seq, tr.seq = tr.seq, tr.seq + 1
+        overlapped = tr.inflight > 0
+        tr.inflight += 1
+        return tr, seq, t0, overlapped
+
+    def end(self, tr: _Trace, seq: int, t0: float, overlapped: bool, method: str, suffix: str,
+            headers: Dict[str, str], body: bytes, status: int, resp: bytes) -> None:
+        tr.inflight -= 1
+        rec: Dict[str, Any] = {"t": "req", "i": seq, "at": round((t0 - tr.start) * 1000, 1), "m": method, "p": suffix}
+        h = {k: v for k, v in headers.items() if k in _HEADERS}
+        if h:
+            rec["h"] = h
+        if body:
+            self._encode_body(tr, seq, suffix, body, rec)
+        if overlapped:
+            rec["c"] = 1
+        rec.update(s=status, rt=round((time.time() - t0) * 1000, 1))
+        if suffix in COMPARED:
+            rec["r"] = response_digest(resp, tr.session_id)
+        self._write(tr.path, rec)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, tr in self._traces.items() if not tr.inflight and now - tr.last_seen > self.idle_sec]:
+            del self._traces[key]
+
+    def _redact(self, text: Any) -> Any:
+        if not self.redact or not isinstance(text, str) or not text:
+            return text
+        mark = f"<r:{blake2b(text.strip().encode('utf-8'), key=self._salt, digest_size=6).hexdigest()}>"
+        return mark + "_" * (len(text) - len(mark))
+
+    def _redact_message(self, m: Any) -> Any:
+        if not isinstance(m, dict) or str(m.get("role", "")).lower() != "user":
+            return m
+        c = m.get("content")
+        if isinstance(c, list):
+            c = [dict(p, text=self._redact(p.get("text"))) if isinstance(p, dict) and "text" in p else p for p in c]
+        else:
+            c = self._redact(c)
+        return dict(m, content=c)
+
+    def _encode_body(self, tr: _Trace, seq: int, suffix: str, body: bytes, rec: Dict[str, Any]) -> None:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            rec["bt"] = self._redact(body.decode("utf-8", errors="replace"))
+            return
+        if not isinstance(data, dict):
+            rec["b"] = data
+            return
+        if suffix == "/rounds":
+            data = {k: v for k, v in data.items() if k not in _DROPPED_FIELDS}
+        if "answer_text" in data:
+            data["answer_text"] = self._redact(data["answer_text"])
+        messages = data.get("messages")
+        if isinstance(messages, list):
+            messages = [self._redact_message(m) for m in messages]
+            prev, k = tr.messages, 0
+            while k < len(prev) and k < len(messages) and prev[k] == messages[k]:
+                k += 1
+            if k:
+                rec.update(k=k, ki=tr.messages_seq)
+            tr.messages, tr.messages_seq = messages, seq
+            data["messages"] = messages[k:]
+        rec["b"] = data
+
+    # ---- files ----
+    def _write(self, path: str, rec: Dict[str, Any]) -> None:
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._pending.append((path, line))
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        touched = {}
+        for path, line in batch:
+            f = self._files.get(path)
+            if not line:
+                if f is not None:
+                    f.close()
+                    del self._files[path]
+                touched.pop(path, None)
+                continue
+            if f is None:
+                f = self._files[path] = open(path, "a", encoding="utf-8")
+            f.write(line)
+            touched[path] = f
+        now = time.monotonic()
+        for path, f in touched.items():
+            f.flush()
+            self._written[path] = now
+        for path in [p for p, t in self._written.items() if now - t > self.idle_sec or p not in self._files]:
+            self._written.pop(path)
+            f = self._files.pop(path, None)
+            if f is not None:
+                f.close()
+
+    def _writer(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"[capture] write failed: {e!r}", flush=True)
+
+class CaptureMiddleware:
+    """
+    Pure ASGI middleware in front of the round routes: records each request of a
+    round to its trace (see TraceRecorder). `default_round` resolves un-prefixed
+    routes sent without routing headers and `bound_round` the /bound/{binding}
+    routes, like dh_gateway.get_round does.
+    """
+    def __init__(self, app, recorder: TraceRecorder, default_round: Callable[[], Optional[RoundKey]],
+                 bound_round: Callable[[str], Optional[RoundKey]] = lambda binding: None):
+        self.app = app
+        self.recorder = recorder
+        self.default_round = default_round
+        self.bound_round = bound_round
+
+    def _route(self, scope) -> Optional[Tuple[Optional[RoundKey], str]]:
+        path = scope["path"]
+        if path == "/rounds":
+            return (None, path) if scope["method"] == "POST" else None
+        m = _PREFIX_RE.match(path)
+        if m:
+            return (m.group(1), int(m.group(2))), m.group(3) or ""
+        m = _BOUND_RE.match(path)
+        if m:
+            key = self.bound_round(m.group(1)) if m.group(2) in _UNPREFIXED else None
+            return (key, m.group(2)) if key is not None else None
+        if path not in _UNPREFIXED:
+            return None
+        headers = dict(scope["headers"])
+        sid = headers.get(b"x-dh-session-id")
+        if sid is not None:
+            try:
+                return (sid.decode("utf-8"), int(headers.get(b"x-dh-round-index", b""))), path
+            except ValueError:
+                return None
+        key = self.default_round()
+        return (key, path) if key is not None else None
+
+    async def __call__(self, scope, receive, send):
+        route = self._route(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+        key, suffix = route
+        started = self.recorder.begin(key) if key is not None else None
+        t0 = time.time()
+        req_body: List[bytes] = []
+        resp_body: List[bytes] = []
+        status = [500]
+
+        async def _receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                req_body.append(message.get("body", b""))
+            return message
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                resp_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            body = b"".join(req_body)
+            if started is None:
+                # POST /rounds: the round is named in the body
+                try:
+                    data = json.loads(body)
+                    started = self.recorder.begin((str(data["session_id"]), int(data["round_index"])), t0)
+                except (ValueError, KeyError, TypeError):
+                    started = None
+            if started is not None:
+                headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+                self.recorder.end(*started, scope["method"], suffix, headers, body, status[0], b"".join(resp_body))
+                if scope["method"] == "DELETE" and suffix == "":
+                    self.recorder.closed(key)
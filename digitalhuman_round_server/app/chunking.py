@@ -0,0 +1,87 @@
+"""
+Split assistant text into speakable pieces for incremental SSE.
+
+Strategies (SSE_CHUNKING):
+  single   - the whole text as one delta (old behaviour)
+  sentence - break after 。！？!?；;… and newlines
+  clause   - also break after ，、,：:  (earliest possible TTS start)
+
+Pieces always concatenate back to the original text. A `【…】` label is never
+split and stays with the text after it, closing quotes/brackets stay with the
+punctuation before them, and
+fragments shorter than `min_chars` are merged into the next piece.
+"""
+import os
+import time
+from typing import Callable, Iterator, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+SENTENCE_ENDS = set("。！？!?；;…\n")
+CLAUSE_ENDS = SENTENCE_ENDS | set("，、,：:")
+CLOSERS = set("”’」』）)》】\"'")
+STRATEGIES = ("single", "sentence", "clause")
+
+SSE_CHUNKING = os.getenv("SSE_CHUNKING", "sentence").lower()
+SSE_MIN_CHARS = int(os.getenv("SSE_MIN_CHARS", "4"))
+# Pacing between pieces: fixed delay plus a per-character share of the previous piece
+SSE_PACING_MS = float(os.getenv("SSE_PACING_MS", "0"))
+SSE_PACING_MS_PER_CHAR = float(os.getenv("SSE_PACING_MS_PER_CHAR", "0"))
+
+def split_text(text: str, strategy: str = None, min_chars: int = None) -> List[str]:
+    strategy = (strategy or SSE_CHUNKING).lower()
+    min_chars = SSE_MIN_CHARS if min_chars is None else min_chars
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown SSE chunking strategy: {strategy}")
+    if strategy == "single" or not text:
+        return [text]
+    ends = SENTENCE_ENDS if strategy == "sentence" else CLAUSE_ENDS
+
+    pieces: List[str] = []
+    start, depth, i, n = 0, 0, 0, len(text)
+    while i < n:
+        ch = text[i]
+        i += 1
+        if ch == "【":
+            depth += 1
+        elif ch == "】" and depth:
+            depth -= 1
+        elif ch in ends and depth == 0:
+            while i < n and (text[i] in CLOSERS or text[i] in ends):
+                i += 1
+            while i < n and text[i] in " \t":
+                i += 1
+            pieces.append(text[start:i]); start = i
+    if start < n:
+        pieces.append(text[start:])
+
+    merged: List[str] = []
+    carry = ""
+    for p in pieces:
+        carry += p
+        if len(carry.strip()) >= min_chars:
+            merged.append(carry); carry = ""
+    if carry:
+        # a short tail rides on the previous piece
+        if merged:
+            merged[-1] += carry
+        else:
+            merged.append(carry)
+    return merged
+
+def paced(pieces: Sequence[T], pacing_ms: float = None, per_char_ms: float = None,
+          size: Callable[[T], int] = len) -> Iterator[T]:
+    """
+    Yield pieces, sleeping between them according to the pacing policy (never before the first).
+    `size` gives the character count of a piece for the per-character share.
+    """
+    pacing_ms = SSE_PACING_MS if pacing_ms is None else pacing_ms
+    per_char_ms = SSE_PACING_MS_PER_CHAR if per_char_ms is None else per_char_ms
+    prev = None
+    for p in pieces:
+        if prev is not None:
+            delay = pacing_ms + per_char_ms * size(prev)
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+        yield p
+        prev = p
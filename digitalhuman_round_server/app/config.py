@@ -8,15 +8,20 @@ def get_env_str(name: str, default: Optional[str]=None, required: bool=False) ->
     return v
 
 class Settings:
-    # --- Required for this one-shot run ---
-    SESSION_ID: str
-    ROUND_INDEX: int
-
-    # --- MinIO ---
-    MINIO_ENDPOINT: str
-    MINIO_ACCESS_KEY: str
-    MINIO_SECRET_KEY: str
-    MINIO_BUCKET: str
+    # --- Mode ---
+    # "single": one-shot run for SESSION_ID/ROUND_INDEX, exits when the round ends
+    # "multi":  long-lived server, rounds are created/evicted via /rounds
+    MODE: str
+
+    # --- Required for the one-shot run ---
+    SESSION_ID: Optional[str]
+    ROUND_INDEX: Optional[int]
+
+    # --- MinIO (defaults for rounds created without explicit credentials) ---
+    MINIO_ENDPOINT: Optional[str]
+    MINIO_ACCESS_KEY: Optional[str]
+    MINIO_SECRET_KEY: Optional[str]
+    MINIO_BUCKET: Optional[str]
     MINIO_SECURE: bool
 
     # --- Optional meta carried into qa_complete ---
@@ -25,18 +30,65 @@ class Settings:
     ROOM_ID: Optional[str]
     ROUND_TYPE: Optional[str] = "ai_generated"
 
+    # Multi mode: completed rounds stay answerable this long before eviction
+    COMPLETED_ROUND_TTL_SEC: float = 300.0
+    # Single mode: time left for the last response to flush after the upload is acknowledged
+    SHUTDOWN_GRACE_SEC: float = 0.2
+
+    # Questions JSON already fetched by the orchestrator (skips the MinIO download)
+    QUESTIONS_FILE: Optional[str] = None
+    # Slice of a shared question bank used by the round (MAX_QUESTIONS unset: to the end)
+    QUESTION_OFFSET: int = 0
+    MAX_QUESTIONS: Optional[int] = None
+
+    # Write-ahead answer journal ("" disables it)
+    JOURNAL_DIR: str = "journal"
+    JOURNAL_COMMIT_MS: float = 50.0
+
+    # Batch export of finished rounds ("" disables it), see app/export.py. The spool
+    # mixes every round of the host, so batches only go to the dedicated export
+    # bucket, never to a round's own MinIO (unset: batches stay local)
+    EXPORT_DIR: str = ""
+    EXPORT_FORMAT: str = "jsonl"
+    EXPORT_BATCH_MB: float = 8.0
+    EXPORT_MAX_AGE_SEC: float = 900.0
+    # Multi mode: how often the spool is checked for a due flush
+    EXPORT_CHECK_SEC: float = 30.0
+    EXPORT_MINIO_ENDPOINT: Optional[str] = None
+    EXPORT_MINIO_ACCESS_KEY: Optional[str] = None
+    EXPORT_MINIO_SECRET_KEY: Optional[str] = None
+    EXPORT_MINIO_BUCKET: Optional[str] = None
+    EXPORT_MINIO_SECURE: bool = True
+
+    # Retried answer requests replay their first result (per round: entries kept, seconds)
+    IDEMPOTENCY_TTL_SEC: float = 120.0
+    IDEMPOTENCY_MAX_KEYS: int = 64
+
+    # Per-round request traces for bench/replay.py ("" disables capture), user text redacted unless false
+    CAPTURE_DIR: str = ""
+    CAPTURE_REDACT: bool = True
+
+    # Bearer token of the /admin profiling endpoints ("" disables them)
+    ADMIN_TOKEN: str = ""
+
     # Server
     HOST: str = "0.0.0.0"
     PORT: int = int(os.getenv("PORT", "8011"))
 
     def __init__(self) -> None:
-        self.SESSION_ID   = get_env_str("SESSION_ID", required=True)
-        self.ROUND_INDEX  = int(get_env_str("ROUND_INDEX", required=True))
+        self.MODE = get_env_str("ROUND_SERVER_MODE", "single").lower()
+        if self.MODE not in ("single", "multi"):
+            raise RuntimeError(f"Invalid ROUND_SERVER_MODE: {self.MODE}")
+        single = self.MODE == "single"
+
+        self.SESSION_ID   = get_env_str("SESSION_ID", required=single)
+        round_index       = get_env_str("ROUND_INDEX", required=single)
+        self.ROUND_INDEX  = int(round_index) if round_index not in (None, "") else None
 
-        self.MINIO_ENDPOINT   = get_env_str("MINIO_ENDPOINT", required=True)  # e.g. test-minio.yeying.pub
-        self.MINIO_ACCESS_KEY = get_env_str("MINIO_ACCESS_KEY", required=True)
-        self.MINIO_SECRET_KEY = get_env_str("MINIO_SECRET_KEY", required=True)
-        self.MINIO_BUCKET     = get_env_str("MINIO_BUCKET", required=True)
+        self.MINIO_ENDPOINT   = get_env_str("MINIO_ENDPOINT", required=single)  # e.g. test-minio.yeying.pub
+        self.MINIO_ACCESS_KEY = get_env_str("MINIO_ACCESS_KEY", required=single)
+        self.MINIO_SECRET_KEY = get_env_str("MINIO_SECRET_KEY", required=single)
+        self.MINIO_BUCKET     = get_env_str("MINIO_BUCKET", required=single)
         self.MINIO_SECURE     = get_env_str("MINIO_SECURE", "true").lower() in ("1","true","yes")
 
         # Optional extras (if known at start)
@@ -45,4 +97,42 @@ class Settings:
         self.ROOM_ID      = get_env_str("ROOM_ID", None)
         self.ROUND_TYPE   = get_env_str("ROUND_TYPE", self.ROUND_TYPE)
 
+        self.QUESTIONS_FILE = get_env_str("QUESTIONS_FILE", None)
+        self.QUESTION_OFFSET = int(get_env_str("QUESTION_OFFSET", "0"))
+        max_questions = get_env_str("MAX_QUESTIONS", None)
+        self.MAX_QUESTIONS = int(max_questions) if max_questions not in (None, "") else None
+
+        self.COMPLETED_ROUND_TTL_SEC = float(get_env_str("COMPLETED_ROUND_TTL_SEC", "300"))
+        self.SHUTDOWN_GRACE_SEC = float(get_env_str("SHUTDOWN_GRACE_SEC", "0.2"))
+        self.JOURNAL_DIR       = get_env_str("JOURNAL_DIR", self.JOURNAL_DIR)
+        self.JOURNAL_COMMIT_MS = float(get_env_str("JOURNAL_COMMIT_MS", "50"))
+        self.EXPORT_DIR         = get_env_str("EXPORT_DIR", self.EXPORT_DIR)
+        self.EXPORT_FORMAT      = get_env_str("EXPORT_FORMAT", self.EXPORT_FORMAT).lower()
+        self.EXPORT_BATCH_MB    = float(get_env_str("EXPORT_BATCH_MB", "8"))
+        self.EXPORT_MAX_AGE_SEC = float(get_env_str("EXPORT_MAX_AGE_SEC", "900"))
+        self.EXPORT_CHECK_SEC   = float(get_env_str("EXPORT_CHECK_SEC", "30"))
+        self.EXPORT_MINIO_ENDPOINT   = get_env_str("EXPORT_MINIO_ENDPOINT", None)
+        self.EXPORT_MINIO_ACCESS_KEY = get_env_str("EXPORT_MINIO_ACCESS_KEY", None)
+        self.EXPORT_MINIO_SECRET_KEY = get_env_str("EXPORT_MINIO_SECRET_KEY", None)
+        self.EXPORT_MINIO_BUCKET     = get_env_str("EXPORT_MINIO_BUCKET", None)
+        self.EXPORT_MINIO_SECURE     = get_env_str("EXPORT_MINIO_SECURE", "true").lower() in ("1", "true", "yes")
+        self.IDEMPOTENCY_TTL_SEC  = float(get_env_str("IDEMPOTENCY_TTL_SEC", "120"))
+        self.IDEMPOTENCY_MAX_KEYS = int(get_env_str("IDEMPOTENCY_MAX_KEYS", "64"))
+        self.CAPTURE_DIR    = get_env_str("CAPTURE_DIR", self.CAPTURE_DIR)
+        self.CAPTURE_REDACT = get_env_str("CAPTURE_REDACT", "true").lower() in ("1", "true", "yes")
+        self.ADMIN_TOKEN    = get_env_str("ADMIN_TOKEN", self.ADMIN_TOKEN)
+
+    @property
+    def is_single(self) -> bool:
+        return self.MODE == "single"
+
+    @property
+    def has_default_minio(self) -> bool:
+        return bool(self.MINIO_ENDPOINT and self.MINIO_ACCESS_KEY and self.MINIO_SECRET_KEY and self.MINIO_BUCKET)
+
+    @property
+    def has_export_minio(self) -> bool:
+        return bool(self.EXPORT_MINIO_ENDPOINT and self.EXPORT_MINIO_ACCESS_KEY and self.EXPORT_MINIO_SECRET_KEY
+                    and self.EXPORT_MINIO_BUCKET)
+
 settings = Settings()
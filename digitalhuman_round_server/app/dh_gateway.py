@@ -1,28 +1,73 @@
-from typing import Any, Dict, Optional, List, Union, Generator
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional, List, Set, Tuple, Union
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
+import functools
 import json
 import time
 import sys
 import os
 import re
 
-from .state import RoundState
-from .minio_adapter import MinioAdapter
+from .config import settings
+from .registry import AmbiguousRound, RoundRegistry, RoundSession, MinioParams
+from .minio_adapter import UploadQueue
+from .journal import JournalStore
+from .render import RenderedRound
+from .fastparse import ChatTurn, parse_chat_body
+from .export import QAExporter, export_minio_params
+from .idempotency import IDEMPOTENCY_HEADER, text_digest
+from .capture import TraceRecorder
+from . import metrics
 
 router = APIRouter()
 
-# Injected at startup
-APP_STATE: Optional[RoundState] = None
-MINIO: Optional[MinioAdapter] = None
-UPLOAD_OBJECT_NAME: Optional[str] = None
-
-# Track which question we last served to the client
-LAST_SERVED_INDEX: int = -1  # -1 means we've never served any question yet
-
-def log(*args):
-    print("[round-server]", *args, file=sys.stdout, flush=True)
+# All rounds hosted by this process, keyed by (session_id, round_index)
+REGISTRY = RoundRegistry(
+    completed_ttl=settings.COMPLETED_ROUND_TTL_SEC,
+    replay_ttl=settings.IDEMPOTENCY_TTL_SEC,
+    replay_max_entries=settings.IDEMPOTENCY_MAX_KEYS,
+    journals=(JournalStore(settings.JOURNAL_DIR, settings.JOURNAL_COMMIT_MS / 1000.0)
+              if settings.JOURNAL_DIR else None),
+)
+# qa_complete uploads run off the request path; started by the app on startup
+UPLOADS = UploadQueue()
+# Finished rounds coalesced into date-partitioned batch files for analytics
+EXPORT = (QAExporter(settings.EXPORT_DIR, settings.EXPORT_FORMAT, int(settings.EXPORT_BATCH_MB * 1024 * 1024),
+                     settings.EXPORT_MAX_AGE_SEC) if settings.EXPORT_DIR else None)
+# Opt-in request capture for timed replay (app/capture.py); the app installs its middleware
+CAPTURE = TraceRecorder(settings.CAPTURE_DIR, settings.CAPTURE_REDACT) if settings.CAPTURE_DIR else None
+metrics.Gauge("dh_round_rounds", "Rounds hosted by this process by state",
+              lambda: {(k,): v for k, v in REGISTRY.counts().items()}, ("state",))
+metrics.Gauge("dh_round_uploads_pending", "qa_complete uploads queued or in flight",
+              lambda: UPLOADS.stats()["pending"])
+
+# Routing for the un-prefixed routes; without headers they go to the round in progress (409 if several)
+SESSION_HEADER = "X-DH-Session-Id"
+ROUND_HEADER = "X-DH-Round-Index"
+ROUND_PREFIX = "/rounds/{session_id}/{round_index}"
+# Clients that can't send the headers (a VTuber's conf.yaml holds one fixed base_url) use
+# a name bound to their current round by POST /rounds {"binding": ...}
+BOUND_PREFIX = "/bound/{binding}"
+
+# "json": one record per line, tagged with session_id / round_index / q so the
+# orchestrator can index it by session; "text": the plain "[round-server] ..." lines
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+def log(msg: str, sess: Optional[RoundSession] = None, level: str = "info", **fields):
+    if sess is not None:
+        st = sess.state
+        fields.setdefault("session_id", st.session_id)
+        fields.setdefault("round_index", st.round_index)
+        fields.setdefault("q", st.current_index)
+    if LOG_FORMAT == "text":
+        print("[round-server]", msg, file=sys.stdout, flush=True)
+        return
+    rec = {"ts": round(time.time(), 3), "level": level, "src": "round-server", "msg": msg}
+    rec.update((k, v) for k, v in fields.items() if v is not None)
+    print(json.dumps(rec, ensure_ascii=False, default=str), file=sys.stdout, flush=True)
 
 # === New: speak style switch ===
 PURE_QUESTION: bool = os.getenv("PURE_QUESTION", "true").lower() in ("1", "true", "yes")
@@ -39,19 +84,72 @@ class ChatCompletionsRequest(BaseModel):
     stream: Optional[bool] = False
     temperature: Optional[float] = None  # ignored
 
+def bound_round_key(binding: str) -> Optional[Tuple[str, int]]:
+    bound = REGISTRY.bound(binding)
+    return bound[0].key if len(bound) == 1 else None
+
+def default_round_key() -> Optional[Tuple[str, int]]:
+    try:
+        sess = REGISTRY.default()
+    except AmbiguousRound:
+        return None
+    return (sess.state.session_id, sess.state.round_index) if sess is not None else None
+
+def get_round(request: Request) -> RoundSession:
+    """
+    Resolve the target round: path params (/rounds/{sid}/{idx}/... or
+    /bound/{binding}/...) first, then the routing headers, then the only round
+    in progress (409 if there are several).
+    """
+    return _find_round(request.path_params, request.headers)
+
+def _find_round(path_params, headers) -> RoundSession:
+    binding = path_params.get("binding")
+    if binding is not None:
+        bound = REGISTRY.bound(binding)
+        if not bound:
+            raise HTTPException(status_code=404, detail=f"No round bound to {binding}")
+        if len(bound) > 1:
+            raise HTTPException(status_code=409, detail=f"{len(bound)} rounds in progress are bound to {binding}: "
+                                                        + ", ".join(f"{s.key[0]}/{s.key[1]}" for s in bound))
+        return bound[0]
+    sid = path_params.get("session_id") or headers.get(SESSION_HEADER)
+    if sid is None:
+        try:
+            sess = REGISTRY.default()
+        except AmbiguousRound as e:
+            raise HTTPException(status_code=409, detail=f"{e}; use /rounds/{{session_id}}/{{round_index}}/... "
+                                                        f"or the {SESSION_HEADER} / {ROUND_HEADER} headers")
+        if sess is None:
+            raise HTTPException(status_code=503, detail="Not initialized")
+        return sess
+    raw_idx = path_params.get("round_index") or headers.get(ROUND_HEADER)
+    try:
+        round_index = int(raw_idx)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid or missing round index for session {sid}")
+    sess = REGISTRY.get(sid, round_index)
+    if sess is None:
+        raise HTTPException(status_code=404, detail=f"Round not found: {sid}/{round_index}")
+    return sess
+
 @router.get("/healthz")
-def healthz():
-    if APP_STATE is None:
-        raise HTTPException(status_code=503, detail="Not initialized")
+@router.get(ROUND_PREFIX + "/healthz")
+@router.get(BOUND_PREFIX + "/healthz")
+async def healthz(sess: RoundSession = Depends(get_round)):
+    st = sess.state
     return {
         "status": "ok",
         "mode": "minio",
-        "session_id": APP_STATE.session_id,
-        "round_index": APP_STATE.round_index,
-        "current_index": APP_STATE.current_index,
-        "total_questions": APP_STATE.total_questions,
-        "last_served_index": LAST_SERVED_INDEX,
+        "session_id": st.session_id,
+        "round_index": st.round_index,
+        "current_index": st.current_index,
+        "total_questions": st.total_questions,
+        "last_served_index": sess.last_served_index,
         "pure_question": PURE_QUESTION,
+        "upload_error": sess.upload_error,
+        "uploads": UPLOADS.stats(),
+        "export": EXPORT.stats() if EXPORT is not None else None,
     }
 
 def _extract_user_text(req: ChatCompletionsRequest) -> str:
@@ -79,77 +177,30 @@ def _extract_user_text(req: ChatCompletionsRequest) -> str:
                 text = "".join(parts)
     return (text or "").strip()
 
-def _wrap_openai_like(answer_text: str, st: RoundState) -> Dict[str, Any]:
-    created_ts = int(time.time())
-    return {
-        "id": f"chatcmpl-{st.session_id}-{st.round_index}-{st.current_index}",
-        "object": "chat.completion",
-        "created": created_ts,
-        "model": "digitalhuman-round-server",
-        "choices": [{
-            "index": 0,
-            "message": {"role": "assistant", "content": answer_text},
-            "finish_reason": "stop"
-        }],
-        "usage": {"prompt_tokens": 0, "completion_tokens": len(answer_text), "total_tokens": len(answer_text)},
-        # Extra helpers
-        "answer": answer_text,
-        "question_number": (st.current_index + 1 if not st.is_completed() else st.total_questions),
-        "total_questions": st.total_questions,
-        "session_id": st.session_id,
-        "round_index": st.round_index,
-    }
-
-def _sse_pack(data: Dict[str, Any]) -> str:
-    return "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
-
-def _sse_done() -> str:
-    return "data: [DONE]\n\n"
-
-def _sse_stream_single(answer_text: str, st: RoundState) -> Generator[bytes, None, None]:
+async def _read_turn(request: Request) -> ChatTurn:
     """
-    Minimal SSE: send one delta chunk + final [DONE].
+    Tail-first fast path over the raw body (see fastparse); bodies it can't
+    handle go through ChatCompletionsRequest validation as before.
     """
+    body = await request.body()
+    turn = parse_chat_body(body)
+    if turn is not None:
+        return turn
+    try:
+        req = ChatCompletionsRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return ChatTurn(bool(req.stream), _extract_user_text(req), len(req.messages or []))
+
+def _reply(sess: RoundSession, index: int, stream: bool) -> Response:
+    """Send the pre-rendered reply for question `index` (completion message past the end)."""
+    if sess.rendered is None:
+        sess.rendered = RenderedRound.build(sess.state, _build_question_text)
+    reply = sess.rendered.reply(index)
     created_ts = int(time.time())
-    chunk_role = {
-        "id": f"chatcmpl-{st.session_id}-{st.round_index}-{st.current_index}",
-        "object": "chat.completion.chunk",
-        "created": created_ts,
-        "model": "digitalhuman-round-server",
-        "choices": [{
-            "index": 0,
-            "delta": {"role": "assistant"},
-            "finish_reason": None
-        }]
-    }
-    yield _sse_pack(chunk_role).encode("utf-8")
-
-    chunk_content = {
-        "id": f"chatcmpl-{st.session_id}-{st.round_index}-{st.current_index}",
-        "object": "chat.completion.chunk",
-        "created": created_ts,
-        "model": "digitalhuman-round-server",
-        "choices": [{
-            "index": 0,
-            "delta": {"content": answer_text},
-            "finish_reason": None
-        }]
-    }
-    yield _sse_pack(chunk_content).encode("utf-8")
-
-    done_chunk = {
-        "id": f"chatcmpl-{st.session_id}-{st.round_index}-{st.current_index}",
-        "object": "chat.completion.chunk",
-        "created": created_ts,
-        "model": "digitalhuman-round-server",
-        "choices": [{
-            "index": 0,
-            "delta": {},
-            "finish_reason": "stop"
-        }]
-    }
-    yield _sse_pack(done_chunk).encode("utf-8")
-    yield _sse_done().encode("utf-8")
+    if stream:
+        return StreamingResponse(reply.sse(created_ts), media_type="text/event-stream")
+    return Response(content=reply.json_bytes(created_ts), media_type="application/json")
 
 def _build_question_text(q: Dict[str, Any]) -> str:
     """
@@ -169,64 +220,173 @@ def _build_question_text(q: Dict[str, Any]) -> str:
     header = f"【{cat}】问题 {i}/{n}\n" if cat else f"问题 {i}/{n}\n"
     return header + raw_q
 
-@router.post("/v1/chat/completions")
-def chat_completions(req: ChatCompletionsRequest, bg: BackgroundTasks):
-    global LAST_SERVED_INDEX
-    if APP_STATE is None:
-        raise HTTPException(status_code=503, detail="Not initialized")
+def _finish_round(sess: RoundSession, bg: Optional[BackgroundTasks] = None, tag: str = "") -> None:
+    """
+    Queue the qa_complete upload and reply right away. Single mode exits once
+    MinIO acknowledged the object; multi mode just retires the round.
+    """
+    qa_complete = sess.state.build_qa_complete()
+    fut = UPLOADS.submit(sess.minio, sess.upload_object_name, qa_complete)
+    REGISTRY.mark_completed(sess)
+    log(f"{tag}Queued upload {sess.upload_object_name}", sess)
+    if settings.is_single:
+        if bg is not None:
+            bg.add_task(_shutdown_after_upload, sess, fut, qa_complete)
+        else:
+            asyncio.ensure_future(_shutdown_after_upload(sess, fut, qa_complete))
+    else:
+        fut.add_done_callback(lambda f: _retire_after_upload(sess, f, qa_complete))
+
+def _on_uploaded(sess: RoundSession, fut) -> bool:
+    err = fut.exception()
+    if err is not None:
+        sess.upload_error = repr(err)
+        log(f"Upload {sess.upload_object_name} failed: {err!r}", sess, level="error")
+        sess.notify()
+        return False
+    log(f"Uploaded {sess.upload_object_name}" + (", shutting down soon..." if settings.is_single else ", round retired"),
+        sess)
+    sess.uploaded_at = time.time()
+    sess.notify()
+    return True
+
+def _retire(sess: RoundSession, qa_complete: Dict[str, Any]) -> None:
+    """Blocking (spool flock + append): hand the uploaded round to the export, drop its journal."""
+    if EXPORT is not None:
+        try:
+            EXPORT.add(qa_complete)
+        except OSError as e:
+            # the per-round object is the source of truth; the batch export is best effort
+            log(f"Export spool append failed: {e!r}", sess, level="error")
+    if sess.journal is not None:
+        sess.journal.discard()
+
+def _retire_after_upload(sess: RoundSession, fut, qa_complete: Dict[str, Any]) -> None:
+    # multi mode upload callback: runs on the event loop (inline when the queue isn't started)
+    if not _on_uploaded(sess, fut):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _retire(sess, qa_complete)
+        return
+    loop.run_in_executor(None, _retire, sess, qa_complete)
+
+def flush_export(force: bool = False) -> None:
+    """Blocking: flush the export spool if due, uploading batches with the EXPORT_MINIO_* credentials."""
+    if EXPORT is None:
+        return
+    upload = None
+    if settings.has_export_minio:
+        upload = REGISTRY.minio_for(export_minio_params(settings)).put_bytes
+    try:
+        EXPORT.flush(upload, force=force)
+    except Exception as e:
+        log(f"Export flush failed: {e!r}", level="error")
+
+async def export_loop() -> None:
+    """Multi mode: check the spool every settings.EXPORT_CHECK_SEC."""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(settings.EXPORT_CHECK_SEC)
+        await loop.run_in_executor(None, flush_export)
+
+async def _shutdown_after_upload(sess: RoundSession, fut, qa_complete: Dict[str, Any]) -> None:
+    try:
+        await asyncio.wrap_future(fut)
+    except Exception:
+        pass
+    if not _on_uploaded(sess, fut):
+        # Keep the process (and the answers) alive rather than exit with data lost
+        return
+    await asyncio.get_event_loop().run_in_executor(None, _retire, sess, qa_complete)
+    if EXPORT is not None:
+        # the spool outlives this process: flush it here if due, a later round does it otherwise
+        try:
+            await asyncio.wait_for(asyncio.get_event_loop().run_in_executor(None, flush_export), 10)
+        except asyncio.TimeoutError:
+            log("Export flush still running at exit; its claim is picked up by the next flush", sess)
+    await asyncio.sleep(settings.SHUTDOWN_GRACE_SEC)
+    if CAPTURE is not None:
+        CAPTURE.flush()
+    os._exit(0)
+
+def _replay_keys(request: Request, derived: Optional[tuple]) -> List[tuple]:
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    return ([("key", key)] if key else []) + ([derived] if derived is not None else [])
 
-    user_text = _extract_user_text(req)
-    log(f"/v1/chat/completions stream={req.stream} user_text='{user_text[:50]+'...' if len(user_text)>50 else user_text}' "
-        f"cur={APP_STATE.current_index} last_served={LAST_SERVED_INDEX} pure={PURE_QUESTION}")
+def _replayed(sess: RoundSession, keys: List[tuple], endpoint: str) -> Any:
+    """The result cached for a retry of this request, or None."""
+    for key in keys:
+        result = sess.replays.get(key)
+        if result is not None:
+            metrics.REPLAYS.inc(endpoint)
+            log(f"Replayed {endpoint} retry ({key[0]}) without saving again", sess)
+            return result
+    return None
 
+def _remember(sess: RoundSession, keys: List[tuple], result: Any) -> None:
+    for key in keys:
+        sess.replays.put(key, result)
+
+@router.post("/v1/chat/completions")
+@router.post(ROUND_PREFIX + "/v1/chat/completions")
+@router.post(BOUND_PREFIX + "/v1/chat/completions")
+async def chat_completions(request: Request, bg: BackgroundTasks,
+                           sess: RoundSession = Depends(get_round)):
+    turn = await _read_turn(request)
+    async with sess.lock:
+        return _chat_turn(sess, turn, request, bg)
+
+def _chat_turn(sess: RoundSession, turn: ChatTurn, request: Request, bg: BackgroundTasks) -> Response:
+    """One chat turn: check, save, advance. Runs under the round's lock."""
+    st = sess.state
+    user_text = turn.user_text
+    log(f"/v1/chat/completions [{st.session_id}/{st.round_index}] stream={turn.stream} "
+        f"user_text='{user_text[:50]+'...' if len(user_text)>50 else user_text}' "
+        f"cur={st.current_index} last_served={sess.last_served_index} pure={PURE_QUESTION}", sess)
+
+    # 0) A retry of a turn we already handled replays the reply it got (keyed by the
+    #    Idempotency-Key header, else by the answer text + history length it was sent with)
+    keys = _replay_keys(request, ("chat", turn.n_messages, text_digest(user_text)) if user_text else None)
+    index = _replayed(sess, keys, "chat")
+    if index is None:
+        index = _advance(sess, user_text, keys, bg)
+    return _reply(sess, index, turn.stream)
+
+def _advance(sess: RoundSession, user_text: str, keys: List[tuple], bg: Optional[BackgroundTasks] = None) -> int:
+    """
+    The chat transitions, shared by /v1/chat/completions and the WebSocket turn
+    channel: returns the index of the reply to send (total_questions: the
+    completion message). Runs under the round's lock.
+    """
+    st = sess.state
     # 1) Already finished?
-    if APP_STATE.is_completed():
-        answer_text = "本轮问答已完成，感谢配合。"
-        if req.stream:
-            return StreamingResponse(_sse_stream_single(answer_text, APP_STATE),
-                                     media_type="text/event-stream")
-        return _wrap_openai_like(answer_text, APP_STATE)
+    if st.is_completed():
+        return st.total_questions
 
     # 2) If we had served a question and user sent text, treat it as the answer to that question
-    if user_text and LAST_SERVED_INDEX == APP_STATE.current_index:
+    if user_text and sess.last_served_index == st.current_index:
         try:
-            APP_STATE.save_answer(APP_STATE.current_index, user_text)
-            log(f"Saved answer for q_index={APP_STATE.current_index}")
+            answered = st.current_index
+            sess.save_answer(answered, user_text)
+            log(f"Saved answer for q_index={answered}", sess, q=answered)
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
 
-        if APP_STATE.is_completed():
-            qa_complete = APP_STATE.build_qa_complete()
-            if MINIO is None or UPLOAD_OBJECT_NAME is None:
-                raise HTTPException(status_code=503, detail="MinIO not ready")
-            MINIO.put_json(UPLOAD_OBJECT_NAME, qa_complete)
-            log(f"Uploaded {UPLOAD_OBJECT_NAME}, shutting down soon...")
-            final_text = "本轮问答已完成，感谢配合。"
-            if req.stream:
-                bg.add_task(_shutdown_after)
-                return StreamingResponse(_sse_stream_single(final_text, APP_STATE),
-                                         media_type="text/event-stream")
-            bg.add_task(_shutdown_after)
-            return _wrap_openai_like(final_text, APP_STATE)
+        if st.is_completed():
+            _finish_round(sess, bg)
+            _remember(sess, keys, st.total_questions)
+            return st.total_questions
 
         # fallthrough to serve next question
 
     # 3) Serve the current question
-    q = APP_STATE.current_question_payload()
-    if q is None:
+    if st.current_question_payload() is None:
         raise HTTPException(status_code=500, detail="No current question")
-    answer_text = _build_question_text(q)
-
-    LAST_SERVED_INDEX = APP_STATE.current_index  # mark served
-    if req.stream:
-        return StreamingResponse(_sse_stream_single(answer_text, APP_STATE),
-                                 media_type="text/event-stream")
-    return _wrap_openai_like(answer_text, APP_STATE)
-
-def _shutdown_after():
-    time.sleep(0.8)
-    import os
-    os._exit(0)
+    sess.mark_served(st.current_index)
+    _remember(sess, keys, st.current_index)
+    return st.current_index
 
 # ---- Manual endpoints kept for debugging ------------------------------------
 
@@ -235,53 +395,338 @@ class AnswerIn(BaseModel):
     answer_text: str
 
 @router.post("/dh/answer")
-def submit_answer(body: AnswerIn, bg: BackgroundTasks):
-    global LAST_SERVED_INDEX
-    if APP_STATE is None or MINIO is None or UPLOAD_OBJECT_NAME is None:
-        raise HTTPException(status_code=503, detail="Not initialized")
-
-    expected_idx = APP_STATE.current_index
+@router.post(ROUND_PREFIX + "/dh/answer")
+@router.post(BOUND_PREFIX + "/dh/answer")
+async def submit_answer(body: AnswerIn, request: Request, bg: BackgroundTasks,
+                        sess: RoundSession = Depends(get_round)):
+    async with sess.lock:
+        return _submit_answer(sess, body, request, bg)
+
+def _submit_answer(sess: RoundSession, body: AnswerIn, request: Request, bg: BackgroundTasks) -> Dict[str, Any]:
+    st = sess.state
+    expected_idx = st.current_index
     use_idx = expected_idx if body.question_index is None else body.question_index
+    # without a header only an explicit question_index marks a retry: the same
+    # text sent again with no index is just as likely the answer to the next question
+    digest = text_digest((body.answer_text or "").strip())
+    derived = None if body.question_index is None else ("answer", use_idx, digest)
+    cached = _replayed(sess, _replay_keys(request, derived), "answer")
+    if cached is not None:
+        return cached
     if use_idx != expected_idx:
         raise HTTPException(status_code=400, detail=f"Out-of-order answer: expected {expected_idx}, got {use_idx}")
 
     try:
-        APP_STATE.save_answer(use_idx, body.answer_text)
-        log(f"[manual] Saved answer for q_index={use_idx}")
+        sess.save_answer(use_idx, body.answer_text)
+        log(f"[manual] Saved answer for q_index={use_idx}", sess, q=use_idx)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    if APP_STATE.is_completed():
-        qa_complete = APP_STATE.build_qa_complete()
-        MINIO.put_json(UPLOAD_OBJECT_NAME, qa_complete)
-        log(f"Uploaded {UPLOAD_OBJECT_NAME}, shutting down soon...")
-        bg.add_task(_shutdown_after)
-        return {"success": True, "is_round_completed": True, "uploaded": UPLOAD_OBJECT_NAME}
-
-    LAST_SERVED_INDEX = APP_STATE.current_index
-    return {"success": True, "is_round_completed": False, "next_question_number": APP_STATE.current_index + 1}
+    if st.is_completed():
+        _finish_round(sess, bg, tag="[manual] ")
+        res = {"success": True, "is_round_completed": True, "uploaded": sess.upload_object_name, "upload": "queued"}
+    else:
+        sess.mark_served(st.current_index)
+        res = {"success": True, "is_round_completed": False, "next_question_number": st.current_index + 1}
+    _remember(sess, _replay_keys(request, ("answer", use_idx, digest)), res)
+    return res
 
 class SimpleAnswerIn(BaseModel):
     answer_text: str
 
 @router.post("/dh/answer_simple")
-def submit_answer_simple(body: SimpleAnswerIn, bg: BackgroundTasks):
-    global LAST_SERVED_INDEX
-    if APP_STATE is None or MINIO is None or UPLOAD_OBJECT_NAME is None:
-        raise HTTPException(status_code=503, detail="Not initialized")
-
+@router.post(ROUND_PREFIX + "/dh/answer_simple")
+@router.post(BOUND_PREFIX + "/dh/answer_simple")
+async def submit_answer_simple(body: SimpleAnswerIn, request: Request, bg: BackgroundTasks,
+                               sess: RoundSession = Depends(get_round)):
+    async with sess.lock:
+        return _submit_answer_simple(sess, body, request, bg)
+
+def _submit_answer_simple(sess: RoundSession, body: SimpleAnswerIn, request: Request,
+                          bg: BackgroundTasks) -> Dict[str, Any]:
+    st = sess.state
+    # no question index here: only an Idempotency-Key tells a retry from a repeated answer
+    cached = _replayed(sess, _replay_keys(request, None), "answer_simple")
+    if cached is not None:
+        return cached
+    answered = st.current_index
     try:
-        APP_STATE.save_answer(APP_STATE.current_index, body.answer_text)
-        log(f"[simple] Saved answer for q_index={APP_STATE.current_index-1}")
+        sess.save_answer(answered, body.answer_text)
+        log(f"[simple] Saved answer for q_index={answered}", sess, q=answered)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    if APP_STATE.is_completed():
-        qa_complete = APP_STATE.build_qa_complete()
-        MINIO.put_json(UPLOAD_OBJECT_NAME, qa_complete)
-        log(f"Uploaded {UPLOAD_OBJECT_NAME}, shutting down soon...")
-        bg.add_task(_shutdown_after)
-        return {"success": True, "is_round_completed": True, "uploaded": UPLOAD_OBJECT_NAME}
-
-    LAST_SERVED_INDEX = APP_STATE.current_index
-    return {"success": True, "is_round_completed": False, "next_question_number": APP_STATE.current_index + 1}
+    if st.is_completed():
+        _finish_round(sess, bg, tag="[simple] ")
+        res = {"success": True, "is_round_completed": True, "uploaded": sess.upload_object_name, "upload": "queued"}
+    else:
+        sess.mark_served(st.current_index)
+        res = {"success": True, "is_round_completed": False, "next_question_number": st.current_index + 1}
+    _remember(sess, _replay_keys(request, None), res)
+    return res
+
+# ---- WebSocket turn channel -------------------------------------------------
+
+# open channels, for the gauge
+_CHANNELS: Set["TurnChannel"] = set()
+metrics.Gauge("dh_round_ws_channels", "Open WebSocket turn channels", lambda: len(_CHANNELS))
+
+def _upload_status(sess: RoundSession) -> Optional[str]:
+    if sess.completed_at is None:
+        return None
+    if sess.uploaded_at is not None:
+        return "done"
+    return "failed" if sess.upload_error is not None else "queued"
+
+class TurnChannel:
+    """
+    One WebSocket bound to one round. Frames out: the pre-rendered
+    question/completed frames (render.ws_frame), "state" and "error".
+    `shown` is the reply last sent, `seen` the round as of the last frame
+    (a reply frame carries no upload status), so changes this channel made
+    itself are not echoed back.
+    """
+    def __init__(self, ws: WebSocket, sess: RoundSession):
+        self.ws = ws
+        self.sess = sess
+        self.shown = -1
+        self.seen: Optional[tuple] = None
+
+    def _snapshot(self, upload: bool = True) -> tuple:
+        sess = self.sess
+        return (sess.state.current_index, sess.last_served_index, _upload_status(sess) if upload else None)
+
+    async def send_reply(self, index: int) -> None:
+        self.shown = index
+        self.seen = self._snapshot(upload=False)
+        await self.ws.send_text(self.sess.rendered.reply(index).frame)
+
+    async def send_state(self) -> None:
+        st = self.sess.state
+        self.seen = self._snapshot()
+        await self.ws.send_text(json.dumps({
+            "type": "state", "question_number": min(st.current_index + 1, st.total_questions),
+            "total_questions": st.total_questions, "answered": st.current_index,
+            "completed": st.is_completed(), "upload": _upload_status(self.sess),
+        }, separators=(",", ":")))
+
+    async def send_error(self, status: int, detail: Any) -> None:
+        await self.ws.send_text(json.dumps({"type": "error", "status": status, "detail": detail},
+                                           ensure_ascii=False, separators=(",", ":")))
+
+    async def turn(self, text: str, key: Optional[str] = None, q: Optional[int] = None) -> None:
+        """
+        A chat turn with only the new utterance. `q` is the question_number the
+        text answers: a resend of an answer that was already saved replays its
+        reply, any other stale `q` is refused instead of answering the next question.
+        """
+        sess, st = self.sess, self.sess.state
+        t0 = time.perf_counter()
+        async with sess.lock:
+            log(f"ws [{st.session_id}/{st.round_index}] "
+                f"user_text='{text[:50]+'...' if len(text)>50 else text}' q={q} "
+                f"cur={st.current_index} last_served={sess.last_served_index}", sess)
+            keys = ([("key", key)] if key else []) + ([("ws", q, text_digest(text))] if text and q else [])
+            index = _replayed(sess, keys, "ws")
+            if index is None:
+                if text and q is not None and not st.is_completed() and q != st.current_index + 1:
+                    raise HTTPException(status_code=409,
+                                        detail=f"question {q} is not the current one ({st.current_index + 1})")
+                index = _advance(sess, text, keys)
+        await self.send_reply(index)
+        metrics.WS_TURN_SECONDS.observe(time.perf_counter() - t0)
+
+    async def receive(self, message: Dict[str, Any]) -> None:
+        """A client frame: the utterance as plain text, or a JSON object (text/key/q, or type=state)."""
+        data = message.get("text")
+        if data is None:
+            raise HTTPException(status_code=400, detail="text frames only")
+        if not data.startswith("{"):
+            await self.turn(data.strip())
+            return
+        try:
+            msg = json.loads(data)
+            if msg.get("type") == "state":
+                await self.send_state()
+                return
+            text, key, q = msg.get("text") or "", msg.get("key"), msg.get("q")
+            if not isinstance(text, str) or not isinstance(key, (str, type(None))) \
+                    or not isinstance(q, (int, type(None))):
+                raise ValueError
+        except (ValueError, AttributeError):
+            raise HTTPException(status_code=400, detail='expected {"text": str, "key": str, "q": int}')
+        await self.turn(text.strip(), key, q)
+
+    async def sync(self) -> None:
+        """The round changed elsewhere (HTTP, another channel, the upload): push what's new."""
+        st = self.sess.state
+        target = st.total_questions if st.is_completed() else self.sess.last_served_index
+        if target >= 0 and target != self.shown:
+            await self.send_reply(target)
+        if self._snapshot() != self.seen:
+            await self.send_state()
+
+@router.websocket("/ws")
+@router.websocket(ROUND_PREFIX + "/ws")
+@router.websocket(BOUND_PREFIX + "/ws")
+async def turn_channel(ws: WebSocket):
+    """
+    The chat turns of one round over one connection: the client sends only each
+    new utterance (a text frame, or {"text", "key", "q"}), the server answers
+    with the next question or the completion (the same transitions and texts as
+    /v1/chat/completions) and pushes the round's changes made elsewhere.
+    Greeted with the current question, like a first chat turn. A round that is
+    not found closes with 4000 + the HTTP status; an evicted one with 1001.
+    """
+    await ws.accept()
+    try:
+        sess = _find_round(ws.path_params, ws.headers)
+    except HTTPException as e:
+        await ws.close(code=4000 + e.status_code, reason=str(e.detail))
+        return
+    ch = TurnChannel(ws, sess)
+    loop = asyncio.get_event_loop()
+    changed = asyncio.Event()
+    watcher = functools.partial(loop.call_soon_threadsafe, changed.set)  # notified from any thread
+    sess.watchers.add(watcher)
+    _CHANNELS.add(ch)
+    recv = asyncio.ensure_future(ws.receive())
+    wake = asyncio.ensure_future(changed.wait())
+    try:
+        await ch.turn("")
+        while True:
+            done, _ = await asyncio.wait((recv, wake), return_when=asyncio.FIRST_COMPLETED)
+            if wake in done:
+                changed.clear()
+                if REGISTRY.get(*sess.key) is not sess:
+                    await ch.send_state()
+                    await ws.close(code=1001, reason="round evicted")
+                    return
+                await ch.sync()
+                wake = asyncio.ensure_future(changed.wait())
+            if recv in done:
+                message = recv.result()
+                if message["type"] == "websocket.disconnect":
+                    return
+                try:
+                    await ch.receive(message)
+                except HTTPException as e:
+                    await ch.send_error(e.status_code, e.detail)
+                recv = asyncio.ensure_future(ws.receive())
+    except WebSocketDisconnect:
+        pass  # client gone mid-send
+    finally:
+        recv.cancel()
+        wake.cancel()
+        sess.watchers.discard(watcher)
+        _CHANNELS.discard(ch)
+
+# ---- Round management (multi mode) ------------------------------------------
+
+# POST /rounds in flight per round, so concurrent creates of one round open it once
+_OPENING: Dict[Tuple[str, int], "asyncio.Future[RoundSession]"] = {}
+
+async def open_round(**kwargs) -> RoundSession:
+    """
+    REGISTRY.load (journal / file / MinIO reads) in the default executor, then on
+    the loop: the round's lock and its rendered replies, publishing it only then
+    (no request sees a round without its lock), and finishing a resumed round
+    that crashed between its last answer and the upload.
+    """
+    loop = asyncio.get_event_loop()
+    sess = await loop.run_in_executor(None, functools.partial(REGISTRY.load, **kwargs))
+    sess.lock = asyncio.Lock()
+    sess.rendered = RenderedRound.build(sess.state, _build_question_text)
+    REGISTRY.publish(sess, kwargs.get("binding"))
+    if CAPTURE is not None:
+        CAPTURE.opened(sess.state)
+    if sess.resumed:
+        st = sess.state
+        log(f"Resumed {st.session_id}/{st.round_index} from journal: cur={st.current_index} "
+            f"last_served={sess.last_served_index}", sess)
+        if st.is_completed() and sess.completed_at is None:
+            _finish_round(sess, tag="[resume] ")
+    return sess
+
+class RoundCreateIn(BaseModel):
+    session_id: str
+    round_index: int
+    # Per-round MinIO credentials; omitted fields fall back to the server env
+    minio_endpoint: Optional[str] = None
+    minio_access_key: Optional[str] = None
+    minio_secret_key: Optional[str] = None
+    minio_bucket: Optional[str] = None
+    minio_secure: Optional[bool] = None
+    round_id: Optional[str] = None
+    session_name: Optional[str] = None
+    room_id: Optional[str] = None
+    round_type: Optional[str] = None
+    # Local copy of the questions JSON prepared by the orchestrator
+    questions_file: Optional[str] = None
+    # Use questions [question_offset, question_offset + max_questions) of a shared bank
+    question_offset: int = Field(default=0, ge=0)
+    max_questions: Optional[int] = Field(default=None, ge=1)
+    # Route /bound/{binding}/... to this round from now on (e.g. the VTuber instance asking for it)
+    binding: Optional[str] = Field(default=None, pattern=r"^[A-Za-z0-9_.-]{1,64}$")
+
+@router.get("/rounds")
+async def list_rounds():
+    return {"mode": settings.MODE, "rounds": [s.describe() for s in REGISTRY.list()]}
+
+@router.post("/rounds")
+async def create_round(body: RoundCreateIn):
+    existing = REGISTRY.get(body.session_id, body.round_index)
+    if existing is not None:
+        if body.binding and existing.binding != body.binding:
+            REGISTRY.bind(existing, body.binding)
+        data = existing.describe()
+        data["base_path"] = ROUND_PREFIX.format(session_id=body.session_id, round_index=body.round_index) + "/v1"
+        return data
+    params = MinioParams(
+        endpoint=body.minio_endpoint or settings.MINIO_ENDPOINT,
+        access_key=body.minio_access_key or settings.MINIO_ACCESS_KEY,
+        secret_key=body.minio_secret_key or settings.MINIO_SECRET_KEY,
+        bucket=body.minio_bucket or settings.MINIO_BUCKET,
+        secure=settings.MINIO_SECURE if body.minio_secure is None else body.minio_secure,
+    )
+    if not (params.endpoint and params.access_key and params.secret_key and params.bucket):
+        raise HTTPException(status_code=400, detail="MinIO credentials missing")
+    key = (body.session_id, body.round_index)
+    opening = _OPENING.get(key)
+    if opening is None:
+        opening = asyncio.ensure_future(open_round(
+            session_id=body.session_id,
+            round_index=body.round_index,
+            minio_params=params,
+            round_id=body.round_id,
+            session_name=body.session_name,
+            room_id=body.room_id,
+            round_type=body.round_type or settings.ROUND_TYPE,
+            questions_file=body.questions_file,
+            question_offset=body.question_offset,
+            max_questions=body.max_questions,
+            binding=body.binding,
+        ))
+        _OPENING[key] = opening
+        opening.add_done_callback(lambda _: _OPENING.pop(key, None))
+    try:
+        # shielded: a client that disconnects doesn't abort the open for the others
+        sess = await asyncio.shield(opening)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if body.binding and sess.binding != body.binding:
+        REGISTRY.bind(sess, body.binding)  # joined an open started without it
+    log(f"Round {'resumed' if sess.resumed else 'created'} {body.session_id}/{body.round_index} "
+        f"total={sess.state.total_questions}", sess)
+    data = sess.describe()
+    data["base_path"] = ROUND_PREFIX.format(session_id=body.session_id, round_index=body.round_index) + "/v1"
+    return data
+
+@router.delete(ROUND_PREFIX)
+async def evict_round(session_id: str, round_index: int):
+    if not REGISTRY.evict(session_id, round_index):
+        raise HTTPException(status_code=404, detail=f"Round not found: {session_id}/{round_index}")
+    log(f"Round evicted {session_id}/{round_index}", session_id=session_id, round_index=round_index)
+    return {"evicted": True, "session_id": session_id, "round_index": round_index}
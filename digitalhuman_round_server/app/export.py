@@ -0,0 +1,264 @@
+"""
+Batch export of finished rounds for analytics.
+
+Every round whose qa_complete object reached MinIO is also appended to a spool
+file shared by all round server processes of the host (a single-mode server
+exits after its one round, so batching cannot live in memory). A flush claims
+the spool by renaming it and writes one batch per completion date:
+
+    <EXPORT_DIR>/out/date=YYYY-MM-DD/qa_complete-<stamp>-<pid>-<n>.jsonl.gz    one qa_complete per line
+                                     qa_complete-<stamp>-<pid>-<n>.parquet     one row per QA pair (pyarrow)
+                                     qa_complete-<stamp>-<pid>-<n>.manifest.json
+
+and uploads both to analysis/export/date=YYYY-MM-DD/ of the export bucket
+(EXPORT_MINIO_*). The spool holds rounds of every tenant on the host, so it is
+never uploaded with a round's own credentials; without an export bucket the
+batches stay local.
+The spool is flushed once it holds EXPORT_BATCH_MB or its oldest round is
+EXPORT_MAX_AGE_SEC old; `python -m app.export [--force]` flushes from cron.
+"""
+from __future__ import annotations
+import argparse
+import datetime as _dt
+import fcntl
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: JSONL.gz only
+    pa = pq = None
+
+EXPORT_PREFIX = "analysis/export"
+SPOOL_NAME = "spool.jsonl"
+
+QA_COLUMNS = ("session_id", "round_index", "round_id", "round_type", "completed_at", "session_name", "room_id",
+              "total_questions", "question_index", "category", "question", "answer", "answered_at",
+              "answer_length", "qa_id")
+
+def _log(*args):
+    print("[export]", *args, file=sys.stdout, flush=True)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def qa_rows(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten one qa_complete into one row per QA pair (the Parquet layout)."""
+    ri = payload.get("round_info") or {}
+    si = payload.get("session_info") or {}
+    base = {
+        "session_id": ri.get("session_id"), "round_index": ri.get("round_index"), "round_id": ri.get("round_id"),
+        "round_type": ri.get("round_type"), "completed_at": ri.get("completed_at"),
+        "session_name": si.get("session_name"), "room_id": si.get("room_id"),
+        "total_questions": ri.get("total_questions"),
+    }
+    return [dict(base, **{k: qa.get(k) for k in QA_COLUMNS[8:]}) for qa in payload.get("qa_pairs") or []]
+
+class QAExporter:
+    def __init__(self, directory: str, fmt: str = "jsonl", batch_bytes: int = 8 * 1024 * 1024,
+                 max_age_sec: float = 900.0):
+        self.directory = directory
+        self.fmt = fmt
+        if fmt == "parquet" and pq is None:
+            _log("EXPORT_FORMAT=parquet needs pyarrow; writing jsonl.gz")
+            self.fmt = "jsonl"
+        self.batch_bytes = batch_bytes
+        self.max_age_sec = max_age_sec
+        self.spool = os.path.join(directory, SPOOL_NAME)
+        self.out_dir = os.path.join(directory, "out")
+        self._lock = threading.Lock()
+        self._batches = 0
+        os.makedirs(self.out_dir, exist_ok=True)
+
+    # ---- spool ----
+    def _open_spool_locked(self) -> int:
+        """fd of the current spool under an exclusive flock (re-opened if a flush renamed it meanwhile)."""
+        while True:
+            fd = os.open(self.spool, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.spool).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def add(self, payload: Dict[str, Any]) -> None:
+        """Append one acknowledged qa_complete; safe across processes."""
+        line = json.dumps({"ts": time.time(), "qa": payload}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        fd = self._open_spool_locked()
+        try:
+            os.write(fd, line.encode("utf-8"))
+        finally:
+            os.close(fd)
+
+    def due(self) -> bool:
+        try:
+            size = os.path.getsize(self.spool)
+            with open(self.spool, "r", encoding="utf-8") as f:
+                first = json.loads(f.readline())
+        except (OSError, ValueError):
+            return False
+        return size >= self.batch_bytes or time.time() - first.get("ts", 0) >= self.max_age_sec
+
+    # ---- flush ----
+    def flush(self, upload: Optional[Callable[[str, bytes, str], None]] = None, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Claim the spool (plus claims a dead process left behind), write the batches,
+        then upload everything in out/ not uploaded yet. Returns the new manifests.
+        """
+        with self._lock:
+            manifests: List[Dict[str, Any]] = []
+            if force or self.due():
+                claim = os.path.join(self.directory, f"claim-{os.getpid()}-{time.time_ns()}.jsonl")
+                fd = self._open_spool_locked()
+                try:
+                    # under the lock: every add() either landed before the rename or goes to a new spool
+                    os.replace(self.spool, claim)
+                finally:
+                    os.close(fd)
+            for name in sorted(os.listdir(self.directory)):
+                if not name.startswith("claim-"):
+                    continue
+                pid = int(name.split("-")[1])
+                if pid != os.getpid() and _pid_alive(pid):
+                    continue  # another process is flushing it
+                path = os.path.join(self.directory, name)
+                manifests += self._write_batches(path)
+                os.remove(path)
+            if upload is not None:
+                self._upload_pending(upload)
+            return manifests
+
+    def _write_batches(self, claim: str) -> List[Dict[str, Any]]:
+        by_date: Dict[str, List[Dict[str, Any]]] = {}
+        with open(claim, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    qa = json.loads(line)["qa"]
+                except (ValueError, KeyError):
+                    continue  # torn line
+                completed = (qa.get("round_info") or {}).get("completed_at") or ""
+                date = completed[:10] if len(completed) >= 10 else _dt.date.today().isoformat()
+                by_date.setdefault(date, []).append(qa)
+        stamp = _dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        out = []
+        for date, rounds in sorted(by_date.items()):
+            self._batches += 1
+            out.append(self._write_batch(date, f"qa_complete-{stamp}-{os.getpid()}-{self._batches}", rounds))
+        return out
+
+    def _write_batch(self, date: str, batch: str, rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+        part = os.path.join(self.out_dir, f"date={date}")
+        os.makedirs(part, exist_ok=True)
+        rows = [r for qa in rounds for r in qa_rows(qa)]
+        if self.fmt == "parquet":
+            file_name = batch + ".parquet"
+            buf = io.BytesIO()
+            table = pa.Table.from_pylist(rows, schema=pa.schema([
+                (c, pa.int64() if c in ("round_index", "total_questions", "question_index", "answer_length")
+                 else pa.string()) for c in QA_COLUMNS]))
+            pq.write_table(table, buf, compression="zstd")
+            data = buf.getvalue()
+        else:
+            file_name = batch + ".jsonl.gz"
+            body = "".join(json.dumps(qa, ensure_ascii=False, separators=(",", ":")) + "\n" for qa in rounds)
+            data = gzip.compress(body.encode("utf-8"), compresslevel=6)
+        tmp = os.path.join(part, file_name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(part, file_name))
+        completed = sorted((qa.get("round_info") or {}).get("completed_at") or "" for qa in rounds)
+        manifest = {
+            "batch": batch, "file": file_name, "format": self.fmt, "date": date,
+            "rounds": len(rounds), "qa_rows": len(rows), "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "min_completed_at": completed[0], "max_completed_at": completed[-1],
+            "round_keys": [[(qa.get("round_info") or {}).get("session_id"),
+                            (qa.get("round_info") or {}).get("round_index")] for qa in rounds],
+            "created_at": time.time(), "uploaded_at": None,
+        }
+        self._save_manifest(os.path.join(part, batch + ".manifest.json"), manifest)
+        _log(f"batch {date}/{file_name}: {len(rounds)} rounds, {len(data)} bytes")
+        return manifest
+
+    @staticmethod
+    def _save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _upload_pending(self, upload: Callable[[str, bytes, str], None]) -> None:
+        """Data file first, manifest last: a manifest in MinIO means its batch is complete."""
+        for part in sorted(os.listdir(self.out_dir)):
+            pdir = os.path.join(self.out_dir, part)
+            for name in sorted(n for n in os.listdir(pdir) if n.endswith(".manifest.json")):
+                mpath = os.path.join(pdir, name)
+                with open(mpath, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+                if manifest.get("uploaded_at"):
+                    continue
+                prefix = f"{EXPORT_PREFIX}/{part}"
+                try:
+                    with open(os.path.join(pdir, manifest["file"]), "rb") as f:
+                        upload(f"{prefix}/{manifest['file']}", f.read(),
+                               "application/vnd.apache.parquet" if manifest["format"] == "parquet" else "application/gzip")
+                    manifest["uploaded_at"] = time.time()
+                    upload(f"{prefix}/{name}", json.dumps(manifest, ensure_ascii=False).encode("utf-8"),
+                           "application/json")
+                except Exception as e:
+                    _log(f"upload of {part}/{manifest['file']} failed, retried on the next flush: {e!r}")
+                    return
+                self._save_manifest(mpath, manifest)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            spooled = os.path.getsize(self.spool)
+        except OSError:
+            spooled = 0
+        return {"format": self.fmt, "spool_bytes": spooled}
+
+def export_minio_params(settings) -> "MinioParams":
+    """The dedicated export bucket of the Settings (has_export_minio must hold)."""
+    from .registry import MinioParams
+    return MinioParams(endpoint=settings.EXPORT_MINIO_ENDPOINT, access_key=settings.EXPORT_MINIO_ACCESS_KEY,
+                       secret_key=settings.EXPORT_MINIO_SECRET_KEY, bucket=settings.EXPORT_MINIO_BUCKET,
+                       secure=settings.EXPORT_MINIO_SECURE)
+
+def main() -> None:
+    # the CLI is not a round: don't require the single-mode SESSION_ID / ROUND_INDEX
+    os.environ.setdefault("ROUND_SERVER_MODE", "multi")
+    from .config import settings
+    from .registry import RoundRegistry
+    ap = argparse.ArgumentParser(description="Flush the qa_complete export spool")
+    ap.add_argument("--force", action="store_true", help="flush even if below EXPORT_BATCH_MB / EXPORT_MAX_AGE_SEC")
+    args = ap.parse_args()
+    if not settings.EXPORT_DIR:
+        sys.exit("EXPORT_DIR is empty: export disabled")
+    exporter = QAExporter(settings.EXPORT_DIR, settings.EXPORT_FORMAT,
+                          int(settings.EXPORT_BATCH_MB * 1024 * 1024), settings.EXPORT_MAX_AGE_SEC)
+    upload = None
+    if settings.has_export_minio:
+        upload = RoundRegistry().minio_for(export_minio_params(settings)).put_bytes
+    for m in exporter.flush(upload, force=args.force):
+        print(json.dumps({k: m[k] for k in ("date", "file", "rounds", "qa_rows", "bytes")}))
+
+if __name__ == "__main__":
+    main()
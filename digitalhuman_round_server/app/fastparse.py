@@ -0,0 +1,61 @@
+"""
+Fast path for /v1/chat/completions request bodies.
+
+The VTuber resends the whole history every turn, but a turn only needs the
+`stream` flag and the last user message. Instead of validating every message
+with pydantic and walking the list front to back, the raw body is decoded by
+the C JSON scanner and the history is searched from the tail; only the
+matching message's content (string or content-part array) is inspected.
+Bodies that don't have the expected shape return None so the caller can fall
+back to the validated model and its usual 422 errors.
+"""
+import json
+from typing import Any, List, NamedTuple, Optional
+
+class ChatTurn(NamedTuple):
+    stream: bool
+    user_text: str
+    n_messages: int
+
+def _content_text(content: Any) -> Optional[str]:
+    """Text of one message, or None when it carries no text (matches the validated path)."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = [p["text"] for p in content
+                 if isinstance(p, dict) and p.get("type") == "text" and isinstance(p.get("text"), str)]
+        if parts:
+            return "".join(parts)
+    return None
+
+def last_user_text(messages: List[Any]) -> str:
+    for m in reversed(messages):
+        if not isinstance(m, dict):
+            continue
+        role = m.get("role")
+        if not isinstance(role, str) or role.lower() != "user":
+            continue
+        text = _content_text(m.get("content"))
+        if text is not None:
+            return text.strip()
+    return ""
+
+def parse_chat_body(body: bytes) -> Optional[ChatTurn]:
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    stream = data.get("stream")
+    if stream is None:
+        stream = False
+    elif not isinstance(stream, bool):
+        return None
+    messages = data.get("messages")
+    if messages is None:
+        return ChatTurn(stream, "", 0)
+    if not isinstance(messages, list):
+        return None
+    # Only the tail is looked at; a malformed entry earlier in the history is ignored
+    return ChatTurn(stream, last_user_text(messages), len(messages))
@@ -0,0 +1,49 @@
+from __future__ import annotations
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Hashable, Optional, Tuple
+import threading
+import time
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+def text_digest(text: str) -> bytes:
+    return blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+class ReplayCache:
+    """
+    Recent results of answer-saving requests of one round, so a retried request
+    replays its first result instead of saving the same text as the next answer.
+
+    Keys are ("key", <Idempotency-Key header>) when the client sends one, else
+    derived from the request itself (see dh_gateway: the answer text plus the
+    chat history length, or plus the question it answered). At most `max_entries`
+    are kept, each for `ttl` seconds.
+    """
+    __slots__ = ("ttl", "max_entries", "_entries", "_lock")
+
+    def __init__(self, ttl: float = 120.0, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            if time.monotonic() - hit[0] > self.ttl:
+                del self._entries[key]
+                return None
+            return hit[1]
+
+    def put(self, key: Hashable, result: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import json
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_SAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+def _log(*args):
+    print("[journal]", *args, file=sys.stdout, flush=True)
+
+class RoundJournal:
+    """
+    Append-only JSONL write-ahead log of one round.
+    Records: {"t":"open",...round meta + questions}, {"t":"served","i":k},
+             {"t":"answer","i":k,"a":text,"ts":epoch_us}
+    append() only enqueues; the store's writer thread commits in batches.
+    """
+    def __init__(self, store: "JournalStore", path: str):
+        self.store = store
+        self.path = path
+        self.closed = False
+
+    def append(self, record: Dict[str, Any]) -> None:
+        if not self.closed:
+            self.store._enqueue(self, json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def sync(self, timeout: float = 5.0) -> bool:
+        return self.store.sync(timeout)
+
+    def discard(self) -> None:
+        """
+        The round is safely in MinIO; drop the journal file. Does not block: the
+        writer thread closes and removes the file in its next batch.
+        """
+        if not self.closed:
+            self.closed = True
+            self.store._enqueue(self, None)
+
+class JournalStore:
+    """
+    Journals for every round in this process, committed by one writer thread:
+    pending lines are written together and each touched file is fsync'ed once
+    per batch (group commit), so save_answer never waits on the disk.
+    """
+    def __init__(self, directory: str, commit_interval: float = 0.05):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[RoundJournal, Optional[str]]] = []
+        self._files: Dict[str, Any] = {}
+        self._seq = 0        # lines enqueued
+        self._committed = 0  # lines durable
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._writer, name="journal-writer", daemon=True).start()
+
+    def path_for(self, session_id: str, round_index: int) -> str:
+        return os.path.join(self.directory, f"{_SAFE_RE.sub('_', session_id)}_{int(round_index)}.jsonl")
+
+    def open(self, session_id: str, round_index: int) -> RoundJournal:
+        return RoundJournal(self, self.path_for(session_id, round_index))
+
+    def read(self, session_id: str, round_index: int) -> List[Dict[str, Any]]:
+        """All intact records of a round; a torn last line (crash mid-write) is ignored."""
+        path = self.path_for(session_id, round_index)
+        records: List[Dict[str, Any]] = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def list_rounds(self) -> List[Tuple[str, int]]:
+        """(session_id, round_index) of every journal with an intact header."""
+        out = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".jsonl"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    head = json.loads(f.readline())
+            except (OSError, ValueError):
+                continue
+            if head.get("t") == "open":
+                out.append((head["session_id"], int(head["round_index"])))
+        return out
+
+    def _enqueue(self, journal: RoundJournal, line: Optional[str]) -> None:
+        # line None: the journal was discarded
+        with self._cond:
+            self._pending.append((journal, line))
+            self._seq += 1
+            self._cond.notify_all()
+
+    def sync(self, timeout: float = 5.0) -> bool:
+        """Block until everything enqueued so far is on disk."""
+        with self._cond:
+            target = self._seq
+            return self._cond.wait_for(lambda: self._committed >= target, timeout=timeout)
+
+    def _remove(self, path: str) -> None:
+        with self._cond:
+            f = self._files.pop(path, None)
+        try:
+            if f is not None:
+                f.close()
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _log(f"removing {path} failed: {e!r}")
+
+    def _writer(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: bool(self._pending))
+            # let concurrent appends join this batch
+            threading.Event().wait(self.commit_interval)
+            with self._cond:
+                batch, self._pending = self._pending, []
+                files = self._files
+            try:
+                touched = {}
+                for journal, line in batch:
+                    if line is None:
+                        # in order: a round reopened under the same path later appends to a new file
+                        touched.pop(journal.path, None)
+                        self._remove(journal.path)
+                        continue
+                    if journal.closed:
+                        continue
+                    try:
+                        f = files.get(journal.path)
+                        if f is None:
+                            f = open(journal.path, "a", encoding="utf-8")
+                            with self._cond:
+                                files[journal.path] = f
+                        f.write(line)
+                    except OSError as e:
+                        _log(f"write to {journal.path} failed: {e!r}")
+                        continue
+                    touched[journal.path] = f
+                for f in touched.values():
+                    try:
+                        f.flush()
+                        os.fsync(f.fileno())
+                    except (OSError, ValueError) as e:
+                        _log(f"commit failed: {e!r}")
+            except Exception as e:
+                _log(f"batch failed: {e!r}")
+            finally:
+                # a failed batch is not retried: sync() must not wait out its timeout for it
+                with self._cond:
+                    self._committed += len(batch)
+                    self._cond.notify_all()
@@ -1,5 +1,7 @@
+import codecs
+import json
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 QUESTION_PREFIX_RE = re.compile(r"^\s*【([^】]+)】\s*")
 
@@ -55,3 +57,263 @@ def extract_questions(payload: Dict[str, Any]) -> Tuple[List[str], List[Optional
                 break
 
     return questions, categories
+
+# ---- Streaming loader ---------------------------------------------------------
+# Question banks can hold thousands of entries while a round uses a slice of them:
+# load_questions() walks the JSON object chunk by chunk, decodes only the items it
+# keeps and skips the rest without building Python objects.
+
+
+# Top-level fields the round needs besides the questions (meta + last-resort text)
+META_KEYS = ("round_id", "round_type", "session_name", "room_id")
+TEXT_KEYS = ("content", "text", "output", "question")
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+_DELIMS = _WS + ",]}"
+# a run of complete strings and anything but brackets; it stops at a bracket, at a
+# string cut by the chunk boundary, or at the end of the buffer
+_SKIP_RE = re.compile(r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*')
+
+class _StopLoading(Exception):
+    pass
+
+class _Reader:
+    """Text cursor over UTF-8 byte chunks; reads the next chunk only when a token needs it."""
+    def __init__(self, chunks: Iterable[bytes]):
+        self._it = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def more(self) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._it:
+            self.bytes_read += len(chunk)
+            text = self._utf8.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.eof = True
+        tail = self._utf8.decode(b"", final=True)
+        self.buf += tail
+        return bool(tail)
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        if self.peek() != ch:
+            raise ValueError(f"expected {ch!r} at offset {self.bytes_read}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode one complete value (keep these small: a failed attempt is retried with more data)."""
+        self.peek()
+        while True:
+            try:
+                v, end = _DECODER.raw_decode(self.buf, self.pos)
+                # a number is complete only once a delimiter follows ("4." may be "4.5e3")
+                if self.eof or not isinstance(v, (int, float)) or (end < len(self.buf) and self.buf[end] in _DELIMS):
+                    self.pos = end
+                    return v
+            except ValueError:
+                if self.eof:
+                    raise
+            if not self.more():
+                v, self.pos = _DECODER.raw_decode(self.buf, self.pos)
+                return v
+
+    def skip(self) -> None:
+        """Step over one value without decoding it."""
+        if self.peek() not in "[{":
+            self.value()
+            return
+        self._scan(0)
+
+    def skip_rest(self) -> None:
+        """Step over the rest of the array or object the cursor is in, its closing bracket included."""
+        self._scan(1)
+
+    def _scan(self, depth: int) -> None:
+        while True:
+            self.pos = _SKIP_RE.match(self.buf, self.pos).end()
+            c = self.buf[self.pos] if self.pos < len(self.buf) else '"'
+            if c == '"':
+                # the buffer ends here, or inside a string: read on
+                if not self.more():
+                    raise ValueError("truncated JSON")
+                continue
+            self.pos += 1
+            depth += 1 if c in "[{" else -1
+            if depth == 0:
+                return
+
+    def items(self):
+        """Iterate an array (cursor on '['): yields before each element, the caller consumes it."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or ']' at offset {self.bytes_read}")
+
+    def members(self):
+        """Iterate an object (cursor on '{'): yields each key, the caller consumes its value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"expected ',' or '}}' at offset {self.bytes_read}")
+
+class LoadedQuestions:
+    """What load_questions keeps: the question slice, its categories and the top-level meta fields."""
+    __slots__ = ("questions", "categories", "meta", "available", "bytes_read")
+
+    def __init__(self):
+        self.questions: List[str] = []
+        self.categories: List[Optional[str]] = []
+        self.meta: Dict[str, Any] = {}
+        # questions present in the bank as far as it was read (at least `offset + limit` when stopped early)
+        self.available = 0
+        self.bytes_read = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.meta.get(key, default)
+
+def load_questions(chunks: Iterable[bytes], offset: int = 0, limit: Optional[int] = None) -> LoadedQuestions:
+    """
+    Same selection rules as extract_questions, on a stream: "questions" if it is a
+    non-empty list, else "categorized_questions", else one of the text fields.
+    Keeps questions [offset, offset+limit); once those are in, the rest of the
+    array is stepped over undecoded, and the rest of the object is read only for
+    the meta fields not seen yet (not at all when they all came first).
+    Categories are normalized once per distinct prefix and shared between questions.
+    """
+    r = _Reader(chunks)
+    need = None if limit is None else offset + limit
+    cat_cache: Dict[str, str] = {}
+    out = LoadedQuestions()
+    flat: List[Tuple[str, Optional[str]]] = []       # from "questions"
+    grouped: List[Tuple[str, Optional[str]]] = []    # from "categorized_questions"
+    counts = {"questions": 0, "categorized_questions": 0}
+    have_questions = have_grouped = False
+
+    def category(q: str) -> Optional[str]:
+        if not q.startswith("【"):
+            return None
+        m = QUESTION_PREFIX_RE.match(q)
+        if not m:
+            return None
+        raw = m.group(1)
+        cat = cat_cache.get(raw)
+        if cat is None:
+            cat = cat_cache[raw] = raw.strip()
+        return cat
+
+    def take(target: List[Tuple[str, Optional[str]]], field: str, prefixed: bool) -> None:
+        """Consume one array element: decoded and kept while inside the slice, else stepped over."""
+        if need is not None and counts[field] >= need:
+            r.skip()
+            counts[field] += 1
+            return
+        item = r.value()
+        text, cat = "", None
+        if isinstance(item, str):
+            text = item.strip()
+            cat = category(text) if text else None
+        elif isinstance(item, dict):
+            text = (item.get("question") or item.get("text") or item.get("content") or "").strip()
+            if prefixed:
+                cat = category(text) if text else None
+            else:
+                cat = item.get("category")
+                if isinstance(cat, str):
+                    cat = cat_cache.setdefault(cat, cat)
+        if text:
+            target.append((text, cat))
+            counts[field] += 1
+
+    try:
+        for key in r.members():
+            if key == "questions" and r.peek() == "[":
+                for _ in r.items():
+                    # a non-empty "questions" wins over everything else in the object
+                    have_questions = True
+                    take(flat, "questions", prefixed=False)
+                    if need is not None and counts["questions"] >= need:
+                        if all(k in out.meta for k in META_KEYS):
+                            raise _StopLoading
+                        r.skip_rest()
+                        break
+            elif key == "categorized_questions" and not have_questions and r.peek() == "{":
+                have_grouped = True
+                for _ in r.members():
+                    if r.peek() != "[":
+                        r.skip()
+                        continue
+                    for _ in r.items():
+                        take(grouped, "categorized_questions", prefixed=True)
+            elif key in META_KEYS or key in TEXT_KEYS:
+                out.meta[key] = r.value()
+            else:
+                r.skip()
+    except _StopLoading:
+        pass
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+    if have_questions:
+        picked, out.available = flat, counts["questions"]
+    elif have_grouped:
+        picked, out.available = grouped, counts["categorized_questions"]
+    else:
+        picked = []
+        for k in TEXT_KEYS:
+            v = out.meta.get(k)
+            if isinstance(v, str) and v.strip():
+                picked = [(v.strip(), category(v.strip()))]
+                break
+        out.available = len(picked)
+    picked = picked[offset:need]
+    out.questions = [q for q, _ in picked]
+    out.categories = [c for _, c in picked]
+    out.bytes_read = r.bytes_read
+    return out
+
+def file_chunks(path: str, size: int = 64 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,177 @@
+"""
+Minimal Prometheus instrumentation (text exposition format 0.0.4), no dependency.
+
+Counters and histograms keep plain Python numbers per label set; an update is
+a dict lookup plus a short lock, cheap enough for every request. Gauges are
+callbacks evaluated at scrape time, so nothing on the hot path maintains them.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# seconds; covers sub-ms handlers up to slow cold starts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_METRICS: List["_Metric"] = []
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _METRICS.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(labels)
+            if v is None:
+                v = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            v[0][i] += 1
+            v[1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1]) for k, v in self._values.items()]
+        out = self._header()
+        for k, counts, total in items:
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = 'le="%s"' % _num(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return out
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Tuple[str, ...]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+class Gauge(_Metric):
+    """Value(s) computed at scrape time: fn returns a number, or {label values tuple: number}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, fn: Callable[[], object], labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        out = self._header()
+        if isinstance(value, dict):
+            out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in value.items()]
+        else:
+            out.append(f"{self.name} {_num(value)}")
+        return out
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines += m.render()
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class HTTPMetricsMiddleware:
+    """
+    Pure ASGI middleware: request latency per route template (bounded label
+    set), measured until the last body byte is sent, so SSE streams count fully.
+    """
+    def __init__(self, app, histogram: Histogram, skip: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.histogram = histogram
+        self.skip = set(skip)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            path: Optional[str] = getattr(route, "path", None) or "unmatched"
+            self.histogram.observe(time.perf_counter() - t0, scope["method"], path, str(status[0]))
+
+# --- round server instruments (gauges over live state are registered in dh_gateway) ---
+HTTP_SECONDS = Histogram("dh_round_http_request_duration_seconds",
+                         "HTTP request latency until the last body byte", ("method", "route", "status"))
+MINIO_SECONDS = Histogram("dh_round_minio_op_duration_seconds",
+                          "MinIO get/put duration including retries", ("op",))
+MINIO_ERRORS = Counter("dh_round_minio_errors_total", "MinIO get/put calls that failed after retries", ("op",))
+ANSWERS = Counter("dh_round_questions_answered_total", "Answers recorded by this process")
+WS_TURN_SECONDS = Histogram("dh_round_ws_turn_duration_seconds",
+                            "WebSocket turn from the client frame until the reply frame is sent")
+REPLAYS = Counter("dh_round_replayed_requests_total", "Retried answer requests served from the replay cache",
+                  ("endpoint",))
@@ -1,31 +1,207 @@
+import asyncio
 import io
 import json
-from typing import Any, Dict
+import os
+import random
+import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import certifi
+import urllib3
 from minio import Minio
-from minio.error import S3Error
+from minio.error import S3Error, ServerError
+
+from .metrics import MINIO_ERRORS, MINIO_SECONDS
+
+T = TypeVar("T")
+
+# S3 error codes worth retrying; anything else (NoSuchKey, AccessDenied, ...) fails fast
+RETRYABLE_S3_CODES = {"InternalError", "SlowDown", "ServiceUnavailable", "RequestTimeout"}
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
 
 class MinioAdapter:
-    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool, bucket: str):
-        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure)
+    """
+    MinIO access with one shared urllib3 connection pool per adapter,
+    connect/read timeouts and bounded retries with full-jitter backoff.
+    The blocking SDK calls are also exposed as coroutines (aget_json/aput_json)
+    that run on the adapter's own small executor, never on the event loop.
+    """
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, secure: bool, bucket: str,
+                 max_retries: int = None, backoff_base: float = None, backoff_max: float = None,
+                 connect_timeout: float = None, read_timeout: float = None, pool_size: int = None):
+        self.max_retries = int(os.getenv("MINIO_MAX_RETRIES", "3")) if max_retries is None else max_retries
+        self.backoff_base = _env_float("MINIO_BACKOFF_BASE", 0.2) if backoff_base is None else backoff_base
+        self.backoff_max = _env_float("MINIO_BACKOFF_MAX", 3.0) if backoff_max is None else backoff_max
+        pool_size = int(os.getenv("MINIO_POOL_SIZE", "8")) if pool_size is None else pool_size
+        http = urllib3.PoolManager(
+            timeout=urllib3.Timeout(
+                connect=_env_float("MINIO_CONNECT_TIMEOUT", 3.0) if connect_timeout is None else connect_timeout,
+                read=_env_float("MINIO_READ_TIMEOUT", 15.0) if read_timeout is None else read_timeout,
+            ),
+            maxsize=pool_size,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            retries=False,  # retries are handled by _retry so they are bounded in one place
+        )
+        self.client = Minio(endpoint, access_key=access_key, secret_key=secret_key, secure=secure, http_client=http)
         self.bucket = bucket
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="minio")
+
+    @staticmethod
+    def _retryable(e: Exception) -> bool:
+        if isinstance(e, S3Error):
+            return e.code in RETRYABLE_S3_CODES
+        return isinstance(e, (ServerError, urllib3.exceptions.HTTPError, ConnectionError, TimeoutError))
+
+    def _retry(self, what: str, fn: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not self._retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                print(f"[minio] {what} failed ({e!r}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s",
+                      file=sys.stdout, flush=True)
+                time.sleep(delay)
+                attempt += 1
 
     def get_json(self, object_name: str) -> Dict[str, Any]:
-        try:
+        def _get():
             resp = self.client.get_object(self.bucket, object_name)
-            data = resp.read()
-            resp.close()
-            resp.release_conn()
-            return json.loads(data.decode("utf-8"))
+            try:
+                buf = bytearray()
+                for chunk in resp.stream(64 * 1024):
+                    buf += chunk
+                return bytes(buf)
+            finally:
+                resp.close()
+                resp.release_conn()
+        try:
+            with MINIO_SECONDS.time("get_json"):
+                data = self._retry(f"get {object_name}", _get)
         except S3Error as e:
+            MINIO_ERRORS.inc("get_json")
             raise FileNotFoundError(f"[MinIO] get_json failed {self.bucket}/{object_name}: {e}")
+        except Exception:
+            MINIO_ERRORS.inc("get_json")
+            raise
+        return json.loads(data.decode("utf-8"))
+
+    def iter_object(self, object_name: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """
+        The object as chunks, for readers that may stop early: the response is closed
+        when the generator is exhausted or closed. Only opening the object is retried.
+        """
+        try:
+            with MINIO_SECONDS.time("get_stream"):
+                resp = self._retry(f"get {object_name}", lambda: self.client.get_object(self.bucket, object_name))
+        except S3Error as e:
+            MINIO_ERRORS.inc("get_stream")
+            raise FileNotFoundError(f"[MinIO] get failed {self.bucket}/{object_name}: {e}")
+        except Exception:
+            MINIO_ERRORS.inc("get_stream")
+            raise
+        try:
+            for chunk in resp.stream(chunk_size):
+                yield chunk
+        finally:
+            resp.close()
+            resp.release_conn()
 
     def put_json(self, object_name: str, data: Dict[str, Any]) -> None:
         payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
-        stream = io.BytesIO(payload)
-        self.client.put_object(
-            self.bucket,
-            object_name,
-            stream,
-            length=len(payload),
-            content_type="application/json",
-        )
+        self.put_bytes(object_name, payload, "application/json", op="put_json")
+
+    def put_bytes(self, object_name: str, payload: bytes, content_type: str = "application/octet-stream",
+                  op: str = "put_bytes") -> None:
+        try:
+            with MINIO_SECONDS.time(op):
+                self._retry(f"put {object_name}", lambda: self.client.put_object(
+                    self.bucket,
+                    object_name,
+                    io.BytesIO(payload),
+                    length=len(payload),
+                    content_type=content_type,
+                ))
+        except Exception:
+            MINIO_ERRORS.inc(op)
+            raise
+
+    async def aget_json(self, object_name: str) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self.get_json, object_name)
+
+    async def aput_json(self, object_name: str, data: Dict[str, Any]) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self._executor, self.put_json, object_name, data)
+
+class UploadQueue:
+    """
+    Background upload queue: handlers submit and return immediately, workers on
+    the event loop perform the uploads. submit() is thread-safe and returns a
+    Future that resolves once MinIO acknowledged the object.
+    """
+    def __init__(self, concurrency: int = None):
+        self.concurrency = int(os.getenv("UPLOAD_CONCURRENCY", "4")) if concurrency is None else concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.uploaded = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue()
+        self._workers = [self._loop.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, adapter: MinioAdapter, object_name: str, data: Dict[str, Any]) -> Future:
+        fut: Future = Future()
+        if self._loop is None:
+            # Not started (e.g. used outside the app): upload inline
+            try:
+                adapter.put_json(object_name, data)
+                self.uploaded += 1
+                fut.set_result(object_name)
+            except Exception as e:
+                self.failed += 1
+                fut.set_exception(e)
+            return fut
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (adapter, object_name, data, fut))
+        return fut
+
+    async def _worker(self) -> None:
+        while True:
+            adapter, object_name, data, fut = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await adapter.aput_json(object_name, data)
+                self.uploaded += 1
+                fut.set_result(object_name)
+            except Exception as e:
+                self.failed += 1
+                print(f"[minio] upload {object_name} failed: {e!r}", file=sys.stdout, flush=True)
+                fut.set_exception(e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def drain(self, timeout: float = 30.0) -> bool:
+        """Wait for every submitted upload to be acknowledged (or fail)."""
+        if self._queue is None:
+            return True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return {"pending": queued + self.in_flight, "uploaded": self.uploaded, "failed": self.failed}
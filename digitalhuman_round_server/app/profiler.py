@@ -0,0 +1,197 @@
+"""
+On-demand profiling of the live process, no dependency.
+
+StackSampler: the calling (worker) thread snapshots the stack of every thread
+(sys._current_frames) `hz` times a second and counts identical stacks, output
+as collapsed stacks ("thread;outer;...;inner count" per line), the input of
+flamegraph.pl, speedscope and inferno. Nothing is hooked into the profiled
+threads: the cost is the sampler's own walk over the stacks, and only while a
+profile runs.
+
+RouteProfile + RouteProfileMiddleware: cProfile around the next N requests of
+one route template. cProfile traces the event loop thread only, and everything
+that runs on it while a profiled request is in flight (other requests too).
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# (file, function) of the innermost Python frame of a thread blocked waiting, not working;
+# under uvloop an idle event loop sits in C below asyncio.run / run_until_complete
+IDLE_LEAVES = frozenset({("selectors.py", "select"), ("threading.py", "wait"),
+                         ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+                         ("socket.py", "accept"), ("thread.py", "_worker"),
+                         ("runners.py", "run"), ("base_events.py", "run_until_complete")})
+MAX_SECONDS = 300.0
+MAX_HZ = 1000.0
+
+def authorized(token: str, headers) -> bool:
+    """`Authorization: Bearer <token>` or `X-Admin-Token: <token>`, compared in constant time."""
+    if not token:
+        return False
+    got = headers.get("x-admin-token") or ""
+    auth = headers.get("authorization") or ""
+    if auth[:7].lower() == "bearer ":
+        got = auth[7:].strip()
+    return hmac.compare_digest(got.encode("utf-8"), token.encode("utf-8"))
+
+class Busy(Exception):
+    """Another profile is already running (HTTP 409)."""
+
+def _thread_name(name: str) -> str:
+    # pool threads share one root: ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0_*
+    return re.sub(r"(?<=[_-])\d+$", "*", name).replace(";", ":")
+
+class StackSampler:
+    """One profile at a time per process; run() blocks for `seconds` (call it in a thread)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = code.co_filename
+            short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+            label = f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def run(self, seconds: float, hz: float = 100.0, idle: bool = False) -> Tuple[Dict[str, int], Dict[str, float]]:
+        """
+        Sample for `seconds`; returns ({collapsed stack: count}, info). Stacks of
+        blocked threads (innermost frame in IDLE_LEAVES) are dropped unless `idle`.
+        """
+        seconds = min(max(seconds, 0.1), MAX_SECONDS)
+        interval = 1.0 / min(max(hz, 1.0), MAX_HZ)
+        if not self._lock.acquire(blocking=False):
+            raise Busy("a profile is already running")
+        try:
+            me = threading.get_ident()
+            counts: Dict[str, int] = {}
+            samples = 0
+            overhead = 0.0
+            t0 = time.perf_counter()
+            deadline = t0 + seconds
+            next_at = t0
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    code = frame.f_code
+                    if not idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(_thread_name(names.get(ident, f"thread-{ident}")))
+                    key = ";".join(reversed(stack))
+                    counts[key] = counts.get(key, 0) + 1
+                samples += 1
+                overhead += time.perf_counter() - now
+                next_at += interval
+                time.sleep(max(0.0, min(next_at, deadline) - time.perf_counter()))
+            elapsed = time.perf_counter() - t0
+            return counts, {"seconds": round(elapsed, 3), "samples": samples,
+                            "overhead": round(overhead / elapsed, 4) if elapsed else 0.0}
+        finally:
+            self._lock.release()
+
+def collapsed(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+class RouteProfile:
+    """cProfile armed for the next `requests` requests matching one route template."""
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.remaining = 0
+        self.profiled = 0
+        self._re: Optional[re.Pattern] = None
+        self._prof: Optional[cProfile.Profile] = None
+        self._active = 0
+
+    def arm(self, route: str, requests: int) -> None:
+        """Start a fresh profile; `route` is a template like /rounds/{session_id}/{round_index}/v1/chat/completions."""
+        if self._active:
+            raise Busy("a profiled request is still in flight")
+        pattern = re.sub(r"\\\{\w+\\\}", "[^/]+", re.escape(route))
+        self._re = re.compile(pattern + "$")
+        self.route, self.remaining, self.profiled = route, requests, 0
+        self._prof = cProfile.Profile()
+
+    def disarm(self) -> None:
+        self.remaining = 0
+
+    def matches(self, path: str) -> bool:
+        return self.remaining > 0 and self._re is not None and self._re.match(path) is not None
+
+    def enter(self) -> None:
+        self.remaining -= 1
+        if not self._active:
+            self._prof.enable()
+        self._active += 1
+
+    def exit(self) -> None:
+        self._active -= 1
+        if not self._active:
+            self._prof.disable()
+        self.profiled += 1
+
+    def _stats(self) -> Optional[pstats.Stats]:
+        if self._prof is None or self._active:
+            return None
+        try:
+            return pstats.Stats(self._prof)
+        except TypeError:  # nothing recorded yet
+            return None
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        st = self._stats()
+        if st is None:
+            return ""
+        out = io.StringIO()
+        st.stream = out
+        st.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def dump(self) -> bytes:
+        """The profile in the marshal format of pstats.dump_stats (snakeviz, pstats.Stats(file))."""
+        st = self._stats()
+        return marshal.dumps(st.stats) if st is not None else b""
+
+    def info(self) -> Dict[str, object]:
+        return {"route": self.route, "remaining": self.remaining, "profiled": self.profiled,
+                "in_flight": self._active}
+
+class RouteProfileMiddleware:
+    """Pure ASGI middleware: wraps requests matching the armed RouteProfile, until the last body byte."""
+    def __init__(self, app, profile: RouteProfile):
+        self.app = app
+        self.profile = profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profile.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        self.profile.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profile.exit()
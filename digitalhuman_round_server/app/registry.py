@@ -0,0 +1,342 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import threading
+import time
+
+from .minio_adapter import MinioAdapter
+from .loader import file_chunks, load_questions
+from .state import RoundState, parse_ts
+from .journal import JournalStore, RoundJournal
+from .idempotency import ReplayCache
+from .metrics import ANSWERS
+
+QUESTIONS_OBJECT_TPL = "data/questions_round_{round}_{session}.json"
+QA_COMPLETE_OBJECT_TPL = "analysis/qa_complete_{round}_{session}.json"
+
+RoundKey = Tuple[str, int]
+
+class AmbiguousRound(LookupError):
+    """Several rounds in progress: an un-prefixed request without routing headers can't be routed."""
+    def __init__(self, keys: List[RoundKey]):
+        super().__init__(f"{len(keys)} rounds in progress: " + ", ".join(f"{sid}/{idx}" for sid, idx in keys))
+        self.keys = keys
+
+@dataclass
+class MinioParams:
+    endpoint: str
+    access_key: str
+    secret_key: str
+    bucket: str
+    secure: bool = True
+
+    def cache_key(self) -> Tuple[str, str, str, bool]:
+        return (self.endpoint, self.access_key, self.bucket, self.secure)
+
+@dataclass
+class RoundSession:
+    """One interview round hosted by this process."""
+    state: RoundState
+    minio: MinioAdapter
+    upload_object_name: str
+    # Which question we last served to the client; -1 means never served yet
+    last_served_index: int = -1
+    created_at: float = field(default_factory=time.time)
+    completed_at: Optional[float] = None
+    upload_error: Optional[str] = None
+    journal: Optional[RoundJournal] = None
+    resumed: bool = False
+    # render.RenderedRound, built once the questions are known
+    rendered: Any = None
+    # results of recent answer-saving requests, replayed to retries
+    replays: ReplayCache = field(default_factory=ReplayCache)
+    # asyncio.Lock serializing the handlers' check-save-advance; set on the event loop by open_round
+    lock: Any = None
+    uploaded_at: Optional[float] = None
+    # routing name of the client bound to this round (shared mode: its VTuber instance), see /bound/{binding}
+    binding: Optional[str] = None
+    # called after every saved answer, served question, upload result and the eviction,
+    # possibly off the event loop (WebSocket turn channels watch their round here)
+    watchers: Set[Callable[[], None]] = field(default_factory=set)
+
+    @property
+    def key(self) -> RoundKey:
+        return (self.state.session_id, self.state.round_index)
+
+    def save_answer(self, question_index: int, answer_text: str) -> Dict[str, Any]:
+        """RoundState.save_answer, journaled ahead of the reply."""
+        res = self.state.save_answer(question_index, answer_text)
+        ANSWERS.inc()
+        if self.journal is not None:
+            st = self.state
+            self.journal.append({"t": "answer", "i": question_index, "a": st.answers[question_index],
+                                 "ts": st.answered_us[question_index]})
+        self.notify()
+        return res
+
+    def mark_served(self, index: int) -> None:
+        if index == self.last_served_index:
+            return
+        self.last_served_index = index
+        if self.journal is not None:
+            self.journal.append({"t": "served", "i": index})
+        self.notify()
+
+    def notify(self) -> None:
+        for watcher in tuple(self.watchers):
+            watcher()
+
+    def describe(self) -> Dict[str, Any]:
+        st = self.state
+        return {
+            "session_id": st.session_id,
+            "round_index": st.round_index,
+            "current_index": st.current_index,
+            "total_questions": st.total_questions,
+            "last_served_index": self.last_served_index,
+            "completed": st.is_completed(),
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "resumed": self.resumed,
+            "binding": self.binding,
+        }
+
+class RoundRegistry:
+    """
+    Sessions keyed by (session_id, round_index).
+    MinIO clients are shared between rounds that use the same credentials.
+    Completed rounds are kept for `completed_ttl` seconds (so late turns still get
+    the completion reply) and then dropped lazily.
+    """
+    def __init__(self, minio_factory: Callable[[MinioParams], MinioAdapter] = None,
+                 completed_ttl: float = 300.0, journals: Optional[JournalStore] = None,
+                 replay_ttl: float = 120.0, replay_max_entries: int = 64):
+        self.completed_ttl = completed_ttl
+        self.journals = journals
+        self.replay_ttl = replay_ttl
+        self.replay_max_entries = replay_max_entries
+        self._lock = threading.Lock()
+        self._sessions: Dict[RoundKey, RoundSession] = {}
+        self._latest: Optional[RoundKey] = None
+        self._clients: Dict[Tuple[str, str, str, bool], MinioAdapter] = {}
+        self.minio_factory = minio_factory or (lambda p: MinioAdapter(
+            endpoint=p.endpoint, access_key=p.access_key, secret_key=p.secret_key,
+            secure=p.secure, bucket=p.bucket,
+        ))
+
+    def minio_for(self, params: MinioParams) -> MinioAdapter:
+        ck = params.cache_key()
+        with self._lock:
+            client = self._clients.get(ck)
+            if client is None:
+                client = self.minio_factory(params)
+                self._clients[ck] = client
+            return client
+
+    def _pop_locked(self, key: RoundKey) -> Optional[RoundSession]:
+        sess = self._sessions.pop(key, None)
+        if self._latest == key:
+            self._latest = max(self._sessions, key=lambda k: self._sessions[k].created_at, default=None)
+        if sess is not None:
+            sess.notify()
+        return sess
+
+    def _sweep_locked(self) -> None:
+        now = time.time()
+        expired = [k for k, s in self._sessions.items()
+                   if s.completed_at is not None and now - s.completed_at > self.completed_ttl]
+        for k in expired:
+            self._pop_locked(k)
+
+    def get(self, session_id: str, round_index: int) -> Optional[RoundSession]:
+        with self._lock:
+            self._sweep_locked()
+            return self._sessions.get((session_id, round_index))
+
+    def default(self) -> Optional[RoundSession]:
+        """
+        The round serving the un-prefixed routes: the one in progress, else the
+        most recently created. Raises AmbiguousRound while several are in
+        progress, rather than answering the wrong interview.
+        """
+        with self._lock:
+            self._sweep_locked()
+            live = [s for s in self._sessions.values() if s.completed_at is None]
+            if len(live) > 1:
+                raise AmbiguousRound(sorted(s.key for s in live))
+            if live:
+                return live[0]
+            return self._sessions.get(self._latest) if self._latest else None
+
+    def add(self, sess: RoundSession) -> None:
+        with self._lock:
+            self._sweep_locked()
+            self._sessions[sess.key] = sess
+            self._latest = sess.key
+            if sess.binding is not None:
+                self._bind_locked(sess, sess.binding)
+
+    def _bind_locked(self, sess: RoundSession, name: str) -> None:
+        # the session's next round takes over the binding from its earlier rounds
+        for other in self._sessions.values():
+            if other is not sess and other.binding == name and other.state.session_id == sess.state.session_id:
+                other.binding = None
+        if sess.binding != name and sess.journal is not None:
+            sess.journal.append({"t": "bind", "b": name})
+        sess.binding = name
+
+    def bind(self, sess: RoundSession, name: str) -> None:
+        with self._lock:
+            self._bind_locked(sess, name)
+
+    def bound(self, name: str) -> List[RoundSession]:
+        """
+        Rounds bound to `name`: those in progress, else the latest completed one
+        (its late turns still get the completion reply). More than one means the
+        client is shared by several sessions and can't be routed.
+        """
+        with self._lock:
+            self._sweep_locked()
+            rounds = [s for s in self._sessions.values() if s.binding == name]
+        live = [s for s in rounds if s.completed_at is None]
+        if live or not rounds:
+            return live
+        return [max(rounds, key=lambda s: s.completed_at)]
+
+    def mark_completed(self, sess: RoundSession) -> None:
+        with self._lock:
+            sess.completed_at = time.time()
+
+    def evict(self, session_id: str, round_index: int) -> bool:
+        with self._lock:
+            return self._pop_locked((session_id, round_index)) is not None
+
+    def list(self) -> List[RoundSession]:
+        with self._lock:
+            self._sweep_locked()
+            return list(self._sessions.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def counts(self) -> Dict[str, int]:
+        """Hosted rounds by state: in_progress / completed (awaiting TTL eviction)."""
+        with self._lock:
+            done = sum(1 for s in self._sessions.values() if s.completed_at is not None)
+            return {"in_progress": len(self._sessions) - done, "completed": done}
+
+    def load(self, session_id: str, round_index: int, minio_params: MinioParams,
+             round_id: Optional[str] = None, session_name: Optional[str] = None,
+             room_id: Optional[str] = None, round_type: Optional[str] = None,
+             questions_file: Optional[str] = None, question_offset: int = 0,
+             max_questions: Optional[int] = None, binding: Optional[str] = None) -> RoundSession:
+        """
+        Build the round (session_id, round_index), not yet routed to: publish() it
+        once it is ready to serve. A journal left by a previous process is
+        replayed (no MinIO fetch); otherwise questions come from the local
+        handoff file when the orchestrator provided one, else from MinIO.
+        Meta fields prefer the questions JSON, falling back to the given values.
+        With question_offset / max_questions the round uses that slice of the bank.
+        `binding` routes /bound/{binding} to this round (kept in the journal).
+        """
+        minio = self.minio_for(minio_params)
+        upload_object_name = QA_COMPLETE_OBJECT_TPL.format(round=round_index, session=session_id)
+
+        records = self.journals.read(session_id, round_index) if self.journals else []
+        if records and records[0].get("t") == "open":
+            sess = self._replay(records, minio, upload_object_name)
+        else:
+            sess = RoundSession(
+                state=self._load_state(minio, session_id, round_index, round_id, session_name, room_id,
+                                       round_type, questions_file, question_offset, max_questions),
+                minio=minio,
+                upload_object_name=upload_object_name,
+            )
+            if self.journals is not None:
+                sess.journal = self.journals.open(session_id, round_index)
+                st = sess.state
+                sess.journal.append({
+                    "t": "open",
+                    "session_id": st.session_id, "round_index": st.round_index,
+                    "round_id": st.round_id, "round_type": st.round_type,
+                    "session_name": st.session_name, "room_id": st.room_id,
+                    "created_at": st.created_us,
+                    "questions": st.questions, "categories": st.categories,
+                    "qa_ids": st.qa_ids.hex(),
+                    "binding": binding,
+                })
+        if not sess.resumed:
+            sess.binding = binding
+        sess.replays = ReplayCache(self.replay_ttl, self.replay_max_entries)
+        return sess
+
+    def publish(self, sess: RoundSession, binding: Optional[str] = None) -> None:
+        """Route requests to a round from load(); `binding` as given to load()."""
+        self.add(sess)
+        if binding and binding != sess.binding:
+            self.bind(sess, binding)
+
+    @staticmethod
+    def _load_state(minio: MinioAdapter, session_id: str, round_index: int, round_id: Optional[str],
+                    session_name: Optional[str], room_id: Optional[str], round_type: Optional[str],
+                    questions_file: Optional[str] = None, question_offset: int = 0,
+                    max_questions: Optional[int] = None) -> RoundState:
+        # 1) Stream the questions JSON (orchestrator handoff file, else MinIO) and
+        #    keep the questions + categories of the slice this round uses
+        questions_object = QUESTIONS_OBJECT_TPL.format(round=round_index, session=session_id)
+        payload = None
+        if questions_file:
+            try:
+                payload = load_questions(file_chunks(questions_file), question_offset, max_questions)
+            except (OSError, ValueError):
+                payload = None
+        if payload is None:
+            try:
+                payload = load_questions(minio.iter_object(questions_object), question_offset, max_questions)
+            except ValueError as e:
+                raise RuntimeError(f"Bad questions JSON {questions_object}: {e}")
+        questions, categories = payload.questions, payload.categories
+        if not questions:
+            raise RuntimeError(f"No questions found in {questions_object}")
+
+        # 3) Build in-memory state
+        return RoundState.create(
+            session_id=session_id,
+            round_index=round_index,
+            round_id=payload.get("round_id") or round_id,
+            round_type=payload.get("round_type") or round_type or "ai_generated",
+            session_name=payload.get("session_name") or session_name,
+            room_id=payload.get("room_id") or room_id,
+            questions=questions,
+            categories=categories,
+        )
+
+    def _replay(self, records: List[Dict[str, Any]], minio: MinioAdapter, upload_object_name: str) -> RoundSession:
+        head = records[0]
+        st = RoundState.create(
+            session_id=head["session_id"],
+            round_index=int(head["round_index"]),
+            round_id=head.get("round_id"),
+            round_type=head.get("round_type") or "ai_generated",
+            session_name=head.get("session_name"),
+            room_id=head.get("room_id"),
+            questions=head["questions"],
+            categories=head["categories"],
+            # hex of the packed ids; a list of uuid strings in older journals
+            qa_ids=(bytes.fromhex(head["qa_ids"]) if isinstance(head.get("qa_ids"), str) else head.get("qa_ids")),
+        )
+        if head.get("created_at"):
+            st.created_us = parse_ts(head["created_at"])
+        sess = RoundSession(state=st, minio=minio, upload_object_name=upload_object_name, resumed=True,
+                            binding=head.get("binding"))
+        for rec in records[1:]:
+            t = rec.get("t")
+            if t == "answer" and rec.get("i") == st.current_index:
+                st.save_answer(st.current_index, rec.get("a") or "", answered_us=parse_ts(rec.get("ts")))
+            elif t == "served":
+                sess.last_served_index = int(rec["i"])
+            elif t == "bind":
+                sess.binding = rec.get("b")
+        sess.journal = self.journals.open(st.session_id, st.round_index)
+        return sess
@@ -0,0 +1,129 @@
+"""
+Pre-rendered responses of one round.
+
+The question list is fixed once RoundState.create finished, so every reply the
+round can ever send (each question + the completion message, streaming,
+non-streaming and as a WebSocket frame) is encoded once. Only `created` changes per request; it is
+spliced into the cached bytes, so the hot path does no JSON encoding.
+"""
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from .chunking import split_text, paced
+
+MODEL_NAME = "digitalhuman-round-server"
+COMPLETED_TEXT = "本轮问答已完成，感谢配合。"
+
+_CREATED_MARK = "\x00created\x00"
+_CREATED_MARK_JSON = json.dumps(_CREATED_MARK).encode("utf-8")
+
+# (head, tail): the encoded body split around the `created` value
+Template = Tuple[bytes, bytes]
+
+def _template(body: bytes) -> Template:
+    head, tail = body.split(_CREATED_MARK_JSON, 1)
+    return head, tail
+
+def _fill(t: Template, created: int) -> bytes:
+    return t[0] + str(created).encode("ascii") + t[1]
+
+def openai_body(chunk_id: str, text: str, question_number: int, total_questions: int,
+                session_id: str, round_index: int, created: Any) -> Dict[str, Any]:
+    return {
+        "id": chunk_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": MODEL_NAME,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(text), "total_tokens": len(text)},
+        # Extra helpers
+        "answer": text,
+        "question_number": question_number,
+        "total_questions": total_questions,
+        "session_id": session_id,
+        "round_index": round_index,
+    }
+
+def sse_chunk(chunk_id: str, created: Any, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "id": chunk_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": MODEL_NAME,
+        "choices": [{
+            "index": 0,
+            "delta": delta,
+            "finish_reason": finish_reason
+        }]
+    }
+
+def sse_pack(data: Dict[str, Any]) -> bytes:
+    return ("data: " + json.dumps(data, ensure_ascii=False) + "\n\n").encode("utf-8")
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+def ws_frame(kind: str, text: str, question_number: int, total_questions: int) -> str:
+    return json.dumps({"type": kind, "text": text, "question_number": question_number,
+                       "total_questions": total_questions}, ensure_ascii=False, separators=(",", ":"))
+
+class RenderedReply:
+    """One reply, ready to send in all shapes."""
+    __slots__ = ("text", "body", "role", "pieces", "stop", "frame")
+
+    def __init__(self, text: str, chunk_id: str, question_number: int, total_questions: int,
+                 session_id: str, round_index: int, completed: bool = False):
+        m = _CREATED_MARK
+        self.text = text
+        # WebSocket turn channel (dh_gateway.turn_channel): no `created`, so no template
+        self.frame = ws_frame("completed" if completed else "question", text, question_number, total_questions)
+        # same encoding FastAPI's JSONResponse uses
+        self.body = _template(json.dumps(
+            openai_body(chunk_id, text, question_number, total_questions, session_id, round_index, m),
+            ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+        ).encode("utf-8"))
+        self.role = _template(sse_pack(sse_chunk(chunk_id, m, {"role": "assistant"})))
+        # (template, characters of the piece) so per-character pacing sees the text length
+        self.pieces = [(_template(sse_pack(sse_chunk(chunk_id, m, {"content": p}))), len(p))
+                       for p in split_text(text)]
+        self.stop = _template(sse_pack(sse_chunk(chunk_id, m, {}, "stop")))
+
+    def json_bytes(self, created: int) -> bytes:
+        return _fill(self.body, created)
+
+    def sse(self, created: int) -> Generator[bytes, None, None]:
+        yield _fill(self.role, created)
+        for piece, _ in paced(self.pieces, size=lambda p: p[1]):
+            yield _fill(piece, created)
+        yield _fill(self.stop, created)
+        yield SSE_DONE
+
+class RenderedRound:
+    """Replies for question 0..n-1 plus the completion message."""
+    __slots__ = ("questions", "completed")
+
+    def __init__(self, questions: List[RenderedReply], completed: RenderedReply):
+        self.questions = questions
+        self.completed = completed
+
+    @classmethod
+    def build(cls, st, question_text: Callable[[Dict[str, Any]], str]) -> "RenderedRound":
+        n = st.total_questions
+        prefix = f"chatcmpl-{st.session_id}-{st.round_index}-"
+        questions = []
+        for i, (q, cat) in enumerate(zip(st.questions, st.categories)):
+            payload = {"question": q, "category": cat,
+                       "question_number": i + 1, "total_questions": n}
+            questions.append(RenderedReply(question_text(payload), prefix + str(i), i + 1, n,
+                                           st.session_id, st.round_index))
+        completed = RenderedReply(COMPLETED_TEXT, prefix + str(n), n, n, st.session_id, st.round_index,
+                                  completed=True)
+        return cls(questions, completed)
+
+    def reply(self, index: int) -> RenderedReply:
+        """Reply for the question at `index`, or the completion message past the end."""
+        return self.questions[index] if index < len(self.questions) else self.completed
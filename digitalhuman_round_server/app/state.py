@@ -1,62 +1,105 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
-from uuid import uuid4
-from datetime import datetime, timezone
+import marshal
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any, Sequence, Union
+from uuid import UUID
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def now_us() -> int:
+    return time.time_ns() // 1000
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
-@dataclass
-class QAPair:
-    question_index: int
-    question: str
-    category: Optional[str]
-    qa_id: str
-    answer: Optional[str] = None
-    answered_at: Optional[str] = None
-    answer_length: Optional[int] = None
-
-@dataclass
+def format_us(us: int) -> str:
+    """Microseconds since the epoch as the ISO string now_iso() would have produced."""
+    return (_EPOCH + timedelta(microseconds=us)).isoformat()
+
+def parse_ts(ts: Union[int, str, None]) -> int:
+    """Journal timestamps: microseconds (current) or ISO strings (older journals)."""
+    if ts is None or ts == "":
+        return now_us()
+    if isinstance(ts, str):
+        delta = datetime.fromisoformat(ts) - _EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return int(ts)
+
+def new_qa_ids(n: int) -> bytes:
+    """n random uuid4 values, 16 bytes each (version/variant bits applied when formatted)."""
+    return os.urandom(16 * n)
+
+def qa_ids_from(ids: Sequence[str]) -> bytes:
+    return b"".join(UUID(s).bytes for s in ids)
+
+# Snapshot: magic + format version, then a marshal'ed tuple (stdlib, C speed).
+# marshal's data format is stable across CPython 3.x for these plain types.
+SNAPSHOT_MAGIC = b"RSN"
+SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEAD = struct.Struct("<3sB")
+
 class RoundState:
-    session_id: str
-    round_index: int
-    round_id: Optional[str]
-    round_type: str
-    session_name: Optional[str]
-    room_id: Optional[str]
-
-    questions: List[str]
-    categories: List[Optional[str]]
-    total_questions: int
-    current_index: int = 0
-    qa_pairs: List[QAPair] = field(default_factory=list)
-    created_at: str = field(default_factory=now_iso)
+    """
+    One round's questions and answers in flat per-field storage:
+
+      questions        the round's question texts (the only copy)
+      categories       one entry per question, interned so rounds share them
+      qa_ids           16 random bytes per question, formatted as uuid4 on output
+      answers          answer text per question, None until answered
+      answered_us      answer time per question, microseconds since the epoch
+      created_us       round creation time, microseconds since the epoch
+
+    Ids and timestamps become strings only in build_qa_complete().
+    """
+    __slots__ = ("session_id", "round_index", "round_id", "round_type", "session_name", "room_id",
+                 "questions", "categories", "total_questions", "current_index",
+                 "qa_ids", "answers", "answered_us", "created_us")
+
+    def __init__(self, session_id: str, round_index: int, round_id: Optional[str], round_type: str,
+                 session_name: Optional[str], room_id: Optional[str],
+                 questions: List[str], categories: List[Optional[str]], qa_ids: bytes,
+                 current_index: int = 0, answers: Optional[List[Optional[str]]] = None,
+                 answered_us: Optional[array] = None, created_us: Optional[int] = None):
+        n = len(questions)
+        self.session_id = session_id
+        self.round_index = round_index
+        self.round_id = round_id
+        self.round_type = round_type
+        self.session_name = session_name
+        self.room_id = room_id
+        self.questions = questions
+        self.categories = categories
+        self.total_questions = n
+        self.current_index = current_index
+        self.qa_ids = qa_ids
+        self.answers = answers if answers is not None else [None] * n
+        self.answered_us = answered_us if answered_us is not None else array("q", bytes(8 * n))
+        self.created_us = created_us if created_us is not None else now_us()
 
     @classmethod
     def create(cls, session_id: str, round_index: int, round_id: Optional[str],
                round_type: str, session_name: Optional[str], room_id: Optional[str],
-               questions: List[str], categories: List[Optional[str]]) -> "RoundState":
-        qa_pairs: List[QAPair] = []
-        for i, q in enumerate(questions):
-            qa_pairs.append(QAPair(
-                question_index=i,
-                question=q,
-                category=(categories[i] if i < len(categories) else None),
-                qa_id=str(uuid4()),
-            ))
-        return cls(
-            session_id=session_id,
-            round_index=round_index,
-            round_id=round_id,
-            round_type=round_type,
-            session_name=session_name,
-            room_id=room_id,
-            questions=questions,
-            categories=categories,
-            total_questions=len(questions),
-            qa_pairs=qa_pairs,
-        )
+               questions: List[str], categories: List[Optional[str]],
+               qa_ids: Union[bytes, Sequence[str], None] = None) -> "RoundState":
+        n = len(questions)
+        cats = [(sys.intern(c) if isinstance(c, str) else c) for c in categories[:n]]
+        cats += [None] * (n - len(cats))
+        if qa_ids is None or len(qa_ids) == 0:
+            ids = new_qa_ids(n)
+        elif isinstance(qa_ids, bytes):
+            ids = qa_ids
+        else:
+            ids = qa_ids_from(qa_ids)
+        return cls(session_id, round_index, round_id, round_type, session_name, room_id,
+                   list(questions), cats, ids)
+
+    def qa_id(self, index: int) -> str:
+        return str(UUID(bytes=self.qa_ids[16 * index:16 * index + 16], version=4))
 
     def is_completed(self) -> bool:
         return self.current_index >= self.total_questions
@@ -64,34 +107,44 @@ class RoundState:
     def current_question_payload(self):
         if self.is_completed():
             return None
-        q = self.qa_pairs[self.current_index]
+        i = self.current_index
         return {
-            "question": q.question,
-            "category": q.category,
-            "question_number": self.current_index + 1,
+            "question": self.questions[i],
+            "category": self.categories[i],
+            "question_number": i + 1,
             "total_questions": self.total_questions,
         }
 
-    def save_answer(self, question_index: int, answer_text: str) -> Dict[str, Any]:
+    def save_answer(self, question_index: int, answer_text: str,
+                    answered_us: Optional[int] = None) -> Dict[str, Any]:
         if self.is_completed():
             raise ValueError("Round already completed.")
         if question_index != self.current_index:
             raise ValueError(f"Out-of-order answer: expected {self.current_index}, got {question_index}")
-        qa = self.qa_pairs[self.current_index]
-        qa.answer = (answer_text or "").strip()
-        qa.answered_at = now_iso()
-        qa.answer_length = len(qa.answer)
+        i = self.current_index
+        self.answers[i] = (answer_text or "").strip()
+        self.answered_us[i] = answered_us if answered_us is not None else now_us()
         self.current_index += 1
         return {
-            "qa_id": qa.qa_id,
-            "question_index": qa.question_index,
-            "answered_at": qa.answered_at,
+            "question_index": i,
+            "answered_us": self.answered_us[i],
             "is_round_completed": self.is_completed(),
         }
 
     def build_qa_complete(self) -> Dict[str, Any]:
         if not self.is_completed():
             raise RuntimeError("Cannot build qa_complete before finishing all answers.")
+        qa_pairs = []
+        for i, (q, cat, a) in enumerate(zip(self.questions, self.categories, self.answers)):
+            qa_pairs.append({
+                "question_index": i,
+                "category": cat,
+                "question": q,
+                "answer": a,
+                "answered_at": format_us(self.answered_us[i]) if a is not None else None,
+                "answer_length": len(a) if a is not None else None,
+                "qa_id": self.qa_id(i),
+            })
         return {
             "round_info": {
                 "round_id": self.round_id,
@@ -105,17 +158,31 @@ class RoundState:
                 "session_name": self.session_name,
                 "room_id": self.room_id,
             },
-            "qa_pairs": [
-                {
-                    "question_index": qa.question_index,
-                    "category": qa.category,
-                    "question": qa.question,
-                    "answer": qa.answer,
-                    "answered_at": qa.answered_at,
-                    "answer_length": qa.answer_length,
-                    "qa_id": qa.qa_id,
-                } for qa in self.qa_pairs
-            ],
+            "qa_pairs": qa_pairs,
             "analysis_ready": True,
             "metadata": {},
         }
+
+    # ---- binary snapshot ----
+    def snapshot(self) -> bytes:
+        """The full state as bytes; restore() rebuilds an equal RoundState."""
+        return _SNAPSHOT_HEAD.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION) + marshal.dumps((
+            self.session_id, self.round_index, self.round_id, self.round_type, self.session_name, self.room_id,
+            self.questions, self.categories, self.qa_ids, self.current_index, self.answers,
+            self.answered_us.tobytes(), self.created_us,
+        ), 4)
+
+    @classmethod
+    def restore(cls, data: bytes) -> "RoundState":
+        """Inverse of snapshot(); only for snapshots this server wrote (marshal is not a safe parser)."""
+        magic, version = _SNAPSHOT_HEAD.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"not a round snapshot (magic={magic!r}, version={version})")
+        (session_id, round_index, round_id, round_type, session_name, room_id,
+         questions, categories, qa_ids, current_index, answers, answered, created_us) = \
+            marshal.loads(data[_SNAPSHOT_HEAD.size:])
+        answered_us = array("q")
+        answered_us.frombytes(answered)
+        return cls(session_id, round_index, round_id, round_type, session_name, room_id,
+                   questions, [(sys.intern(c) if c is not None else None) for c in categories], qa_ids,
+                   current_index, answers, answered_us, created_us)
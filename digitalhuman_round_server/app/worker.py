@@ -0,0 +1,38 @@
+"""
+Pre-forked round server worker.
+
+Started by the orchestrator's warm pool before any round is known:
+the heavy imports are paid up front, then the worker blocks on stdin
+for one JSON line of env overrides (SESSION_ID, ROUND_INDEX, MINIO_*, PORT, ...)
+and serves that round exactly like `uvicorn app.app:app` would.
+"""
+import json
+import os
+import sys
+
+# Heavy imports done while idle in the pool
+import fastapi  # noqa: F401
+import pydantic  # noqa: F401
+import minio  # noqa: F401
+import uvicorn
+
+READY_MARKER = "[round-worker] ready"
+
+def main() -> None:
+    print(READY_MARKER, f"pid={os.getpid()}", flush=True)
+    line = sys.stdin.readline()
+    if not line.strip():
+        # Pool shrank or the orchestrator went away before assigning us
+        sys.exit(0)
+    params = json.loads(line)
+    os.environ.update({k: str(v) for k, v in params.items() if v is not None})
+    print("[round-worker] assigned",
+          f"session={os.environ.get('SESSION_ID')} round={os.environ.get('ROUND_INDEX')}", flush=True)
+
+    # Settings are read at import time, so the app is imported only after assignment
+    from .app import app
+    from .config import settings
+    uvicorn.run(app, host=settings.HOST, port=int(os.environ.get("PORT", settings.PORT)))
+
+if __name__ == "__main__":
+    main()
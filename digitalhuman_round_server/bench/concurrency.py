@@ -0,0 +1,196 @@
+"""
+Parallel turns against one round server: state consistency, then throughput.
+
+    python -m bench.concurrency --rounds 20 --questions 6 --dup 4 --levels 1 4 16 64
+
+Consistency: every chat turn of a round is sent --dup times at once (a client
+retrying after a timeout), and /dh/answer_simple gets --dup distinct answers
+at once. Afterwards the uploaded qa_complete of each round must hold each chat
+answer exactly once, in order, and every simple answer exactly once, with no
+request failing. Repeat rounds answer every question twice in a row with the
+same text ("不知道"), one request at a time through /dh/answer_simple and
+/dh/answer without a question_index; each answer must be saved, none taken for
+a retry. Exits non-zero otherwise.
+
+Throughput: --levels workers each run whole rounds (POST /rounds, then one
+answer_simple and one chat turn per question), requests per second per level.
+Expect it flat, not rising with the workers: the server is one process on one
+event loop, and a turn is a few hundred microseconds of Python under the GIL,
+so once the loop is busy extra workers only queue. The round locks are held
+for the check-save-advance alone, so contention must not pull throughput down
+either: every level has to keep --min-ratio of the best level's rate. More
+throughput takes more round server processes, not more clients.
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from bench.fake_minio import DirMinio, seed_questions
+from bench.load import Client, Recorder, spawn_server, stop_server, wait_ready, wait_uploads
+from bench.server import free_port
+from app.registry import QA_COMPLETE_OBJECT_TPL
+
+def burst(port: int, rec: Recorder, calls: List[tuple]) -> List[bytes]:
+    """Send all calls at the same moment, one connection each."""
+    gate = threading.Barrier(len(calls))
+
+    def one(call):
+        c = Client(port, rec)
+        try:
+            gate.wait()
+            return c.call(*call)
+        finally:
+            c.close()
+    with ThreadPoolExecutor(len(calls)) as ex:
+        return list(ex.map(one, calls))
+
+def chat_round(port: int, rec: Recorder, sid: str, n: int, dup: int) -> List[str]:
+    prefix = f"/rounds/{sid}/0"
+    burst(port, rec, [("POST /rounds", "POST", "/rounds", {"session_id": sid, "round_index": 0})] * dup)
+    history = [{"role": "user", "content": "你好"}]
+    answers = []
+    for turn in range(n + 1):
+        if turn:
+            answers.append(f"{sid} 第{turn}题的回答")
+            history.append({"role": "user", "content": answers[-1]})
+        body = {"messages": history, "stream": False}
+        replies = {json.loads(r)["choices"][0]["message"]["content"] if r else None
+                   for r in burst(port, rec, [("chat", "POST", prefix + "/v1/chat/completions", body)] * dup)}
+        if len(replies) != 1 or None in replies:
+            rec.error("chat diverged")
+        history.append({"role": "assistant", "content": replies.pop()})
+    return answers
+
+def simple_round(port: int, rec: Recorder, sid: str, n: int, dup: int) -> List[str]:
+    prefix = f"/rounds/{sid}/0"
+    Client(port, rec).call("POST /rounds", "POST", "/rounds", {"session_id": sid, "round_index": 0})
+    answers = [f"{sid} answer {i}" for i in range(n)]
+    for i in range(0, n, dup):
+        burst(port, rec, [("answer_simple", "POST", prefix + "/dh/answer_simple", {"answer_text": a})
+                          for a in answers[i:i + dup]])
+    return answers
+
+def repeat_round(port: int, rec: Recorder, sid: str, n: int) -> List[str]:
+    prefix = f"/rounds/{sid}/0"
+    c = Client(port, rec)
+    c.call("POST /rounds", "POST", "/rounds", {"session_id": sid, "round_index": 0})
+    answers = [("不知道", "没有")[i // 2 % 2] for i in range(n)]
+    for i, a in enumerate(answers):
+        path = "/dh/answer_simple" if i % 2 else "/dh/answer"
+        c.call(path.rsplit("/", 1)[1], "POST", prefix + path, {"answer_text": a})
+    c.close()
+    return answers
+
+def check(minio: DirMinio, sid: str, sent: List[str], ordered: bool) -> List[str]:
+    try:
+        with open(minio._path(QA_COMPLETE_OBJECT_TPL.format(round=0, session=sid)), "r", encoding="utf-8") as f:
+            got = [qa["answer"] for qa in json.load(f)["qa_pairs"]]
+    except FileNotFoundError:
+        return [f"{sid}: never completed, sent {sent}"]
+    if (got if ordered else sorted(got)) != (sent if ordered else sorted(sent)):
+        return [f"{sid}: saved {got}, sent {sent}"]
+    return []
+
+def full_round(client: Client, sid: str, n: int) -> None:
+    prefix = f"/rounds/{sid}/0"
+    client.call("POST /rounds", "POST", "/rounds", {"session_id": sid, "round_index": 0})
+    history = [{"role": "user", "content": "你好"}]
+    for i in range(n):
+        client.call("answer_simple", "POST", prefix + "/dh/answer_simple", {"answer_text": f"answer {i}"})
+        history.append({"role": "user", "content": f"第{i}题的回答"})
+        client.call("chat", "POST", prefix + "/v1/chat/completions", {"messages": history})
+
+def throughput(port: int, minio: DirMinio, level: int, rounds: int, n: int) -> Dict[str, float]:
+    rec = Recorder()
+    sids = [f"tp{level}-{i}" for i in range(rounds)]
+    for sid in sids:
+        seed_questions(minio, sid, 0, [f"q{i}" for i in range(2 * n)])
+    todo = iter(sids)
+    lock = threading.Lock()
+
+    def worker():
+        c = Client(port, rec)
+        while True:
+            with lock:
+                sid = next(todo, None)
+            if sid is None:
+                break
+            full_round(c, sid, n)
+        c.close()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(level)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    return {"rps": rec.requests / wall, "errors": sum(rec.errors.values())}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=20, help="rounds per check / per throughput level")
+    ap.add_argument("--questions", type=int, default=6)
+    ap.add_argument("--dup", type=int, default=4, help="parallel copies of each turn")
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--min-ratio", type=float, default=0.6,
+                    help="lowest req/s of any level as a fraction of the best level")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-concurrency-")
+    minio = DirMinio(tmp)
+    port = free_port()
+    proc = spawn_server(port, tmp, 0.0)
+    try:
+        wait_ready(port)
+        rec = Recorder()
+        scaling: List[str] = []
+        chat_sids = [f"chat-{i}" for i in range(args.rounds)]
+        simple_sids = [f"simple-{i}" for i in range(args.rounds)]
+        repeat_sids = [f"repeat-{i}" for i in range(args.rounds)]
+        for sid in chat_sids + simple_sids + repeat_sids:
+            seed_questions(minio, sid, 0, [f"{sid} q{i}" for i in range(args.questions)])
+        with ThreadPoolExecutor(8) as ex:
+            chats = ex.map(lambda s: chat_round(port, rec, s, args.questions, args.dup), chat_sids)
+            simples = ex.map(lambda s: simple_round(port, rec, s, args.questions, args.dup), simple_sids)
+            sent = dict(zip(chat_sids, chats))
+            repeats = ex.map(lambda s: repeat_round(port, rec, s, args.questions), repeat_sids)
+            sent.update(zip(simple_sids, simples))
+            sent.update(zip(repeat_sids, repeats))
+        uploaded = wait_uploads(minio, chat_sids + simple_sids + repeat_sids, 30)
+        problems = [p for sid in chat_sids + repeat_sids for p in check(minio, sid, sent[sid], ordered=True)]
+        problems += [p for sid in simple_sids for p in check(minio, sid, sent[sid], ordered=False)]
+        print(f"consistency: {len(chat_sids)} chat rounds x{args.dup} duplicate turns, "
+              f"{len(simple_sids)} answer_simple rounds x{args.dup} parallel answers, "
+              f"{len(repeat_sids)} rounds of repeated answers, {rec.requests} requests, "
+              f"errors={rec.errors or 0}, uploaded {uploaded}/{3 * args.rounds}, "
+              f"{'OK' if not problems and not rec.errors else 'INCONSISTENT'}")
+        for p in problems[:10]:
+            print("  " + p)
+
+        print(f"{'workers':>8} {'req/s':>9} {'errors':>7}")
+        rates = []
+        for level in args.levels:
+            r = throughput(port, minio, level, max(args.rounds, level), args.questions)
+            print(f"{level:>8} {r['rps']:>9.0f} {r['errors']:>7.0f}")
+            rates.append(r["rps"])
+            if r["errors"]:
+                scaling.append(f"{level} workers: {r['errors']:.0f} failed requests")
+        if min(rates) < args.min_ratio * max(rates):
+            scaling.append(f"throughput fell to {min(rates) / max(rates):.2f} of the best level "
+                        f"(--min-ratio {args.min_ratio})")
+        for p in scaling:
+            print("  " + p)
+    finally:
+        stop_server(proc)
+        shutil.rmtree(tmp, ignore_errors=True)
+    if problems or rec.errors or scaling:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+In-memory / local-directory stand-ins for app.minio_adapter.MinioAdapter.
+Same get_json/iter_object/put_json/put_bytes/aget_json/aput_json surface, no network.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+class MemoryMinio:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.objects: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+        self.gets = 0
+        self.puts = 0
+
+    def get_json(self, object_name: str) -> Dict[str, Any]:
+        with self.lock:
+            self.gets += 1
+            data = self.objects.get(object_name)
+        if data is None:
+            raise FileNotFoundError(f"[MinIO] get_json failed memory/{object_name}")
+        return json.loads(data.decode("utf-8"))
+
+    def iter_object(self, object_name: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with self.lock:
+            self.gets += 1
+            data = self.objects.get(object_name)
+        if data is None:
+            raise FileNotFoundError(f"[MinIO] get failed memory/{object_name}")
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+
+    def put_json(self, object_name: str, data: Dict[str, Any]) -> None:
+        self.put_bytes(object_name, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def put_bytes(self, object_name: str, payload: bytes, content_type: str = "application/octet-stream") -> None:
+        with self.lock:
+            self.puts += 1
+            self.objects[object_name] = payload
+
+    async def aget_json(self, object_name: str) -> Dict[str, Any]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.get_json(object_name)
+
+    async def aput_json(self, object_name: str, data: Dict[str, Any]) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.put_json(object_name, data)
+
+class DirMinio(MemoryMinio):
+    """Objects as files under `root` (object names map to relative paths)."""
+    def __init__(self, root: str, latency_ms: float = 0.0):
+        super().__init__(latency_ms)
+        self.root = root
+
+    def _path(self, object_name: str) -> str:
+        return os.path.join(self.root, *object_name.split("/"))
+
+    def get_json(self, object_name: str) -> Dict[str, Any]:
+        self.gets += 1
+        try:
+            with open(self._path(object_name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"[MinIO] get_json failed {self.root}/{object_name}")
+
+    def iter_object(self, object_name: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        self.gets += 1
+        try:
+            f = open(self._path(object_name), "rb")
+        except FileNotFoundError:
+            raise FileNotFoundError(f"[MinIO] get failed {self.root}/{object_name}")
+        with f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def put_json(self, object_name: str, data: Dict[str, Any]) -> None:
+        self.puts += 1
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def put_bytes(self, object_name: str, payload: bytes, content_type: str = "application/octet-stream") -> None:
+        self.puts += 1
+        path = self._path(object_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(payload)
+
+def seed_questions(minio: MemoryMinio, session_id: str, round_index: int, questions,
+                   meta: Optional[Dict[str, Any]] = None) -> str:
+    name = f"data/questions_round_{round_index}_{session_id}.json"
+    minio.put_json(name, dict(meta or {}, questions=list(questions)))
+    return name
@@ -0,0 +1,328 @@
+"""
+End-to-end load benchmark: complete interview rounds against a round server
+backed by a fake MinIO (local directory, no network).
+
+    python -m bench.load --rounds 200 --concurrency 16 --questions 8 --stream mixed \
+        --out results/load.json [--compare results/baseline.json]
+
+The server runs in its own process (`python -m bench.server`) so client threads
+don't share its GIL. Each simulated round does what the VTuber does: POST
+/rounds, GET healthz, then one chat turn per question plus the closing turn,
+resending the growing history every time. Reported per endpoint:
+p50/p95/p99/mean/max in ms; overall requests per second; startup-to-ready
+(process spawn until GET / answers) over --startup-runs cold starts.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from bench.fake_minio import DirMinio, seed_questions
+from bench.server import free_port
+from app.registry import QA_COMPLETE_OBJECT_TPL
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_ms: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_ms:
+        return 0.0
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100.0 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[k]
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    s = sorted(samples)
+    return {
+        "count": len(s),
+        "p50": round(percentile(s, 50), 3),
+        "p95": round(percentile(s, 95), 3),
+        "p99": round(percentile(s, 99), 3),
+        "mean": round(sum(s) / len(s), 3) if s else 0.0,
+        "max": round(s[-1], 3) if s else 0.0,
+    }
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.requests = 0
+
+    def add(self, name: str, ms: float) -> None:
+        with self.lock:
+            self.samples.setdefault(name, []).append(ms)
+
+    def request(self) -> None:
+        with self.lock:
+            self.requests += 1
+
+    def error(self, name: str) -> None:
+        with self.lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+# ---------- server process ----------
+
+def spawn_server(port: int, minio_dir: str, latency_ms: float) -> subprocess.Popen:
+    env = dict(os.environ, ROUND_SERVER_MODE="multi", JOURNAL_DIR="", EXPORT_DIR="")
+    return subprocess.Popen(
+        [sys.executable, "-m", "bench.server", "--port", str(port),
+         "--minio-dir", minio_dir, "--latency-ms", str(latency_ms)],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+
+def wait_ready(port: int, timeout: float = 30.0) -> float:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return time.perf_counter() - t0
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"round server on :{port} not ready after {timeout}s")
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+# ---------- client ----------
+
+class Client:
+    """One keep-alive connection per worker thread."""
+    def __init__(self, port: int, rec: Recorder):
+        self.port = port
+        self.rec = rec
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+
+    def _send(self, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            return self.conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            # server closed the keep-alive connection; retry once on a fresh one
+            self.conn.close()
+            self.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+            self.conn.request(method, path, body=payload, headers=headers)
+            return self.conn.getresponse()
+
+    def call(self, name: str, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Optional[bytes]:
+        t0 = time.perf_counter()
+        resp = self._send(method, path, body)
+        data = resp.read()
+        ms = (time.perf_counter() - t0) * 1000
+        self.rec.request()
+        if resp.status >= 400:
+            self.rec.error(name)
+            return None
+        self.rec.add(name, ms)
+        return data
+
+    def stream(self, path: str, body: Dict[str, Any]) -> str:
+        """POST a streaming chat turn; records time to first content delta and to [DONE]."""
+        t0 = time.perf_counter()
+        resp = self._send("POST", path, body)
+        self.rec.request()
+        if resp.status >= 400:
+            resp.read()
+            self.rec.error("chat stream")
+            return ""
+        first, parts = None, []
+        while True:
+            line = resp.readline()
+            if not line:
+                break
+            if not line.startswith(b"data: "):
+                continue
+            data = line[6:].strip()
+            if data == b"[DONE]":
+                break
+            delta = json.loads(data)["choices"][0]["delta"]
+            if "content" in delta:
+                if first is None:
+                    first = (time.perf_counter() - t0) * 1000
+                parts.append(delta["content"])
+        # drain the chunked terminator so the connection can be reused
+        resp.read()
+        self.rec.add("chat stream", (time.perf_counter() - t0) * 1000)
+        if first is not None:
+            self.rec.add("chat stream ttfc", first)
+        return "".join(parts)
+
+    def close(self) -> None:
+        self.conn.close()
+
+def run_round(client: Client, sid: str, n_questions: int, stream: bool) -> None:
+    prefix = f"/rounds/{sid}/0"
+    if client.call("POST /rounds", "POST", "/rounds", {"session_id": sid, "round_index": 0}) is None:
+        return
+    client.call("GET healthz", "GET", prefix + "/healthz")
+    history = [{"role": "system", "content": "你是一名面试官。"}]
+    for turn in range(n_questions + 1):
+        history.append({"role": "user", "content": "你好" if turn == 0 else f"这是第{turn}题的回答。" * 6})
+        body = {"model": "bench", "messages": history, "stream": stream}
+        if stream:
+            reply = client.stream(prefix + "/v1/chat/completions", body)
+        else:
+            data = client.call("chat json", "POST", prefix + "/v1/chat/completions", body)
+            reply = json.loads(data)["choices"][0]["message"]["content"] if data else ""
+        history.append({"role": "assistant", "content": reply})
+
+def question_bank(n: int) -> List[Dict[str, Any]]:
+    return [{"question": f"第{i + 1}题：请结合你的项目经历，谈谈你如何保证系统在高并发下的稳定性？"
+                         "遇到过哪些瓶颈，又是如何定位和优化的？",
+             "category": "基础题" if i % 2 else "追问"} for i in range(n)]
+
+def wait_uploads(minio: DirMinio, sids: List[str], timeout: float) -> int:
+    deadline = time.time() + timeout
+    pending = set(sids)
+    while pending and time.time() < deadline:
+        pending = {s for s in pending
+                   if not os.path.exists(minio._path(QA_COMPLETE_OBJECT_TPL.format(round=0, session=s)))}
+        if pending:
+            time.sleep(0.05)
+    return len(sids) - len(pending)
+
+# ---------- report ----------
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nvs {baseline_path}:")
+    for name, cur in current["endpoints"].items():
+        old = base.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        cells = []
+        for key in ("p50", "p95", "p99"):
+            delta = (cur[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{key} {old[key]:.2f}->{cur[key]:.2f}ms ({delta:+.0f}%)")
+        print(f"  {name:18s} " + "  ".join(cells))
+    if base.get("rps"):
+        print(f"  {'rps':18s} {base['rps']:.1f} -> {current['rps']:.1f} "
+              f"({(current['rps'] - base['rps']) / base['rps'] * 100:+.0f}%)")
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=100, help="total rounds to simulate")
+    ap.add_argument("--concurrency", type=int, default=8, help="rounds in flight at once")
+    ap.add_argument("--questions", type=int, default=8, help="questions per round")
+    ap.add_argument("--stream", choices=("json", "stream", "mixed"), default="mixed",
+                    help="chat turns non-streaming, streaming, or alternating per round")
+    ap.add_argument("--minio-latency-ms", type=float, default=0.0)
+    ap.add_argument("--startup-runs", type=int, default=3)
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="previous results JSON to diff against")
+    args = ap.parse_args()
+
+    minio_dir = tempfile.mkdtemp(prefix="dh-bench-minio-")
+    minio = DirMinio(minio_dir)
+    rec = Recorder()
+    startups: List[float] = []
+    proc = None
+    try:
+        for i in range(max(1, args.startup_runs)):
+            if proc is not None:
+                stop_server(proc)
+            port = free_port()
+            proc = spawn_server(port, minio_dir, args.minio_latency_ms)
+            startups.append(wait_ready(port) * 1000)
+
+        run_id = f"{int(time.time())}-{os.getpid()}"
+        sids = [f"bench-{run_id}-{i}" for i in range(args.rounds)]
+        bank = question_bank(args.questions)
+        for sid in sids:
+            seed_questions(minio, sid, 0, bank, {"session_name": "bench"})
+
+        next_round = iter(range(args.rounds))
+        take_lock = threading.Lock()
+
+        def worker():
+            client = Client(port, rec)
+            try:
+                while True:
+                    with take_lock:
+                        i = next(next_round, None)
+                    if i is None:
+                        return
+                    stream = args.stream == "stream" or (args.stream == "mixed" and i % 2 == 1)
+                    try:
+                        run_round(client, sids[i], args.questions, stream)
+                    except (OSError, ValueError, KeyError, http.client.HTTPException) as e:
+                        rec.error(f"round: {type(e).__name__}")
+                        client.close()
+                        client = Client(port, rec)
+            finally:
+                client.close()
+
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        uploaded = wait_uploads(minio, sids, timeout=30)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        shutil.rmtree(minio_dir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_rev": git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "startup_to_ready_ms": summarize(startups),
+        "endpoints": {name: summarize(s) for name, s in sorted(rec.samples.items())},
+        "errors": rec.errors,
+        "requests": rec.requests,
+        "duration_sec": round(elapsed, 3),
+        "rps": round(rec.requests / elapsed, 1) if elapsed else 0.0,
+        "rounds_uploaded": uploaded,
+        "rounds": args.rounds,
+    }
+
+    st = results["startup_to_ready_ms"]
+    print(f"startup-to-ready  p50={st['p50']:.1f}ms max={st['max']:.1f}ms ({st['count']} cold starts)")
+    print(f"{'endpoint':18s} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for name, s in results["endpoints"].items():
+        print(f"{name:18s} {s['count']:>6} {s['p50']:>8.2f} {s['p95']:>8.2f} {s['p99']:>8.2f} {s['max']:>8.2f}")
+    print(f"{rec.requests} requests in {elapsed:.2f}s = {results['rps']:.1f} rps, "
+          f"errors={sum(rec.errors.values())}, uploaded {uploaded}/{args.rounds} rounds")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"results -> {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
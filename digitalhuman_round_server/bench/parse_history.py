@@ -0,0 +1,58 @@
+"""
+Per-turn request parsing cost vs. history length.
+
+    python -m bench.parse_history --sizes 10 50 100 200 500
+
+"validated" is the old path (ChatCompletionsRequest + _extract_user_text),
+"fast" is fastparse.parse_chat_body on the raw body. "round" sums every turn
+of a round whose history grows to that size, i.e. the total parsing work.
+"""
+import argparse
+import json
+import timeit
+
+from bench import server  # noqa: F401  (env defaults before importing app)
+from app.dh_gateway import ChatCompletionsRequest, _extract_user_text
+from app.fastparse import parse_chat_body
+
+def make_body(n: int) -> bytes:
+    msgs = [{"role": "system", "content": "你是一名面试官，请按顺序提问。"}]
+    for i in range(1, n):
+        if i % 2:
+            msgs.append({"role": "user", "content": [{"type": "text", "text": f"这是第{i}轮的回答，" * 8}]})
+        else:
+            msgs.append({"role": "assistant", "content": f"第{i}个问题：请谈谈你对分布式系统一致性的理解。"})
+    msgs.append({"role": "user", "content": "最后一条回答"})
+    return json.dumps({"model": "qwen-turbo", "messages": msgs, "stream": True,
+                       "temperature": 1.0}, ensure_ascii=False).encode("utf-8")
+
+def validated(body: bytes) -> str:
+    return _extract_user_text(ChatCompletionsRequest.model_validate_json(body))
+
+def fast(body: bytes) -> str:
+    return parse_chat_body(body).user_text
+
+def per_call_us(fn, body: bytes, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(body), number=number, repeat=5)) / number * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100, 200, 500])
+    ap.add_argument("--number", type=int, default=200)
+    args = ap.parse_args()
+
+    print(f"{'msgs':>5} {'bytes':>8} {'validated us':>13} {'fast us':>9} {'speedup':>8} "
+          f"{'round validated ms':>19} {'round fast ms':>14}")
+    for n in args.sizes:
+        body = make_body(n)
+        assert validated(body) == fast(body)
+        v = per_call_us(validated, body, args.number)
+        f = per_call_us(fast, body, args.number)
+        # one request per user turn, history growing by two messages each turn
+        turns = [make_body(k) for k in range(2, n + 1, 2)]
+        rv = sum(per_call_us(validated, b, 5) for b in turns) / 1000
+        rf = sum(per_call_us(fast, b, 5) for b in turns) / 1000
+        print(f"{n:>5} {len(body):>8} {v:>13.1f} {f:>9.1f} {v / f:>7.1f}x {rv:>19.2f} {rf:>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Question-bank loading cost vs. bank size.
+
+    python -m bench.question_bank --sizes 1000 5000 20000 --limit 10
+
+"full json" is the old path (json.loads + extract_questions on the whole object),
+"stream" is loader.load_questions over 64 KB chunks, "slice" streams only the
+first --limit questions a round actually asks ("read KB": how much of the bank it
+consumed before stopping). Peak is the tracemalloc high-water mark on top of the
+raw bytes (which both paths hold in the benchmark). "questions" banks keep the
+round meta after the array, so the slice still scans the rest of the bank for
+it (undecoded: about the time of the full parse, a fraction of its memory);
+"meta first" banks put it before, so the slice stops after its questions.
+Exits non-zero if the slice loses a meta field, peaks higher than the full parse
+of a flat bank, or reads the whole of a meta-first bank or isn't faster there.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from app.loader import META_KEYS, extract_questions, load_questions
+
+CATS = ["基础知识", "项目经验", "系统设计", "算法", "行为面试"]
+
+FORMS = ("questions", "meta first", "categorized")
+
+def make_bank(n: int, form: str) -> bytes:
+    qs = [f"【{CATS[i % len(CATS)]}】第{i}题：请结合你做过的项目，谈谈你对分布式系统一致性与可用性取舍的理解。"
+          for i in range(n)]
+    meta = {"round_id": "r-1", "round_type": "ai_generated", "session_name": "后端工程师面试", "room_id": "room-1",
+            "job_title": "后端工程师", "generated_at": "2026-01-01T00:00:00Z"}
+    if form == "categorized":
+        body = {"categorized_questions": {c: qs[k::len(CATS)] for k, c in enumerate(CATS)}}
+    elif form == "meta first":
+        body = dict(meta, questions=qs)
+    else:
+        body = {"questions": qs}
+    body.update(meta)
+    return json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+def chunks(data: bytes, size: int = 64 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def measure(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak / 1024
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'form':>12} {'questions':>9} {'KB':>7} {'full json ms':>13} {'peak KB':>8} "
+          f"{'stream ms':>10} {'peak KB':>8} {'slice ms':>9} {'peak KB':>8} {'read KB':>8}")
+    problems = []
+    for form in FORMS:
+        for n in args.sizes:
+            data = make_bank(n, form)
+            payload = json.loads(data)
+            qs, _ = extract_questions(payload)
+            assert load_questions(chunks(data)).questions == qs
+            head = load_questions(chunks(data), limit=args.limit)
+            assert head.questions == qs[:args.limit]
+            lost = [k for k in META_KEYS if head.get(k) != payload.get(k)]
+            if lost:
+                problems.append(f"{form}, {n} questions: the slice lost {lost}")
+            full = measure(lambda: extract_questions(json.loads(data)), args.repeat)
+            stream = measure(lambda: load_questions(chunks(data)), args.repeat)
+            sliced = measure(lambda: load_questions(chunks(data), limit=args.limit), args.repeat)
+            print(f"{form:>12} {n:>9} {len(data) / 1024:>7.0f} {full[0]:>13.2f} {full[1]:>8.0f} "
+                  f"{stream[0]:>10.2f} {stream[1]:>8.0f} {sliced[0]:>9.2f} {sliced[1]:>8.0f} "
+                  f"{head.bytes_read / 1024:>8.0f}")
+            # a categorized bank has no early stop: a later non-empty "questions" would win
+            if form != "categorized" and n > args.limit:
+                if sliced[1] >= full[1]:
+                    problems.append(f"{form}, {n} questions: the slice peaked at {sliced[1]:.0f} KB, "
+                                    f"full json {full[1]:.0f} KB")
+                if form == "meta first" and head.bytes_read >= len(data):
+                    problems.append(f"{n} questions: the slice read the whole bank ({len(data)} bytes)")
+                if form == "meta first" and sliced[0] >= full[0]:
+                    problems.append(f"{n} questions: the slice took {sliced[0]:.2f} ms, full json {full[0]:.2f} ms")
+    for p in problems:
+        print("  " + p)
+    if problems:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
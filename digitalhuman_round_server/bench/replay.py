@@ -0,0 +1,269 @@
+"""
+Timed replay of captured round traffic (CAPTURE_DIR, see app/capture.py).
+
+    python -m bench.replay capture/ --speed 10 --copies 4 [--target http://127.0.0.1:8011] \
+        [--out results/replay.json]
+
+Every trace is one round; each copy of it replays on its own connection under a
+fresh session id, all of them at once. Gaps are divided by --speed: a request
+that followed its predecessor's response waits for the replayed response plus
+the recorded think time; a request that overlapped another one (a retry racing
+its original) follows that one after the recorded gap, on a second connection. Rounds
+start at their recorded offsets from the earliest trace (--start together: all
+at t=0). The round is created from the questions in the trace (a questions file
+per round, so no MinIO fetch); traces of single-mode servers get a POST /rounds.
+
+Without --target a bench server is spawned on a temporary fake MinIO. A --target
+must be a server on this host (it reads the question files) whose uploads don't
+matter. Reported per endpoint: replayed vs recorded latency percentiles, and
+every response whose status or digest differs from the recorded one. Exits
+non-zero on differences.
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from bench.load import spawn_server, stop_server, summarize, wait_ready
+from bench.server import free_port
+from app.capture import COMPARED, response_digest
+
+# the replay creates whole rounds under its own session ids, routed by prefix
+_DROPPED_CREATE_FIELDS = ("question_offset", "max_questions", "binding")
+
+class Trace:
+    def __init__(self, path: str):
+        self.path = path
+        self.questions: Optional[List[Dict[str, Any]]] = None
+        reqs = []
+        with open(path, "r", encoding="utf-8") as f:
+            for n, line in enumerate(f):
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    break  # torn last line
+                if n == 0:
+                    self.session_id, self.round_index, self.start = rec["session_id"], rec["round_index"], rec["start"]
+                elif rec.get("t") == "round":
+                    self.questions = rec["questions"]
+                elif rec.get("t") == "req":
+                    reqs.append(rec)
+        self.reqs = sorted(reqs, key=lambda r: r["i"])
+        # chat histories back from their deltas
+        history: Dict[int, List[Any]] = {}
+        for r in self.reqs:
+            b = r.get("b")
+            if isinstance(b, dict) and isinstance(b.get("messages"), list):
+                messages = history.get(r.get("ki"), [])[:r.get("k", 0)] + b["messages"]
+                history[r["i"]] = messages
+                r["b"] = dict(b, messages=messages)
+
+class Result:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.replayed: Dict[str, List[float]] = {}
+        self.recorded: Dict[str, List[float]] = {}
+        self.diffs: List[str] = []
+        self.requests = 0
+        self.compared = 0
+        self.max_lag_ms = 0.0
+
+    def add(self, name: str, ms: float, recorded_ms: float, lag_ms: float, diff: Optional[str], compared: bool):
+        with self.lock:
+            self.replayed.setdefault(name, []).append(ms)
+            self.recorded.setdefault(name, []).append(recorded_ms)
+            self.requests += 1
+            self.compared += compared
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if diff is not None:
+                self.diffs.append(diff)
+
+class Replayer:
+    """One copy of one trace against the server."""
+    def __init__(self, trace: Trace, copy: int, host: str, port: int, qdir: str, speed: float, res: Result):
+        self.trace = trace
+        self.sid = f"rp{copy}-{trace.session_id}"
+        self.prefix = f"/rounds/{self.sid}/{trace.round_index}"
+        self.host, self.port = host, port
+        self.speed = speed
+        self.res = res
+        self.qfile = os.path.join(qdir, f"{copy}-{os.path.basename(trace.path)}.json")
+        with open(self.qfile, "w", encoding="utf-8") as f:
+            json.dump({"questions": trace.questions}, f, ensure_ascii=False)
+
+    def _request(self, conn: http.client.HTTPConnection, rec: Dict[str, Any]):
+        suffix = rec["p"]
+        headers = {k: v for k, v in rec.get("h", {}).items() if not k.startswith("x-dh-")}
+        body = rec.get("b")
+        if suffix == "/rounds":
+            path = "/rounds"
+            body = {k: v for k, v in (body or {}).items() if k not in _DROPPED_CREATE_FIELDS}
+            body.update(session_id=self.sid, questions_file=self.qfile)
+        else:
+            path = self.prefix + suffix
+        payload = None
+        if body is not None:
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif "bt" in rec:
+            payload = rec["bt"].encode("utf-8")
+        try:
+            conn.request(rec["m"], path, body=payload, headers=headers)
+            resp = conn.getresponse()
+        except (OSError, http.client.HTTPException):
+            conn.close()  # keep-alive closed by the server: once more on a fresh connection
+            conn.request(rec["m"], path, body=payload, headers=headers)
+            resp = conn.getresponse()
+        return resp.status, resp.read()
+
+    def send(self, conn: http.client.HTTPConnection, rec: Dict[str, Any], due: float, racer: bool) -> None:
+        lag = max(0.0, time.perf_counter() - due) * 1000
+        t0 = time.perf_counter()
+        try:
+            status, data = self._request(conn, rec)
+        except (OSError, http.client.HTTPException) as e:
+            status, data = 0, repr(e).encode("utf-8")
+        ms = (time.perf_counter() - t0) * 1000
+        if racer:
+            conn.close()
+        else:
+            self.done_at = time.perf_counter()
+        name = rec["p"] or "DELETE round"
+        if isinstance(rec.get("b"), dict) and rec["b"].get("stream"):
+            name += " stream"
+        compared = "s" in rec
+        diff = None
+        if compared and status != rec["s"]:
+            diff = f"{self.trace.path} #{rec['i']} {rec['m']} {name}: status {status}, recorded {rec['s']}"
+        elif "r" in rec and rec["p"] in COMPARED and response_digest(data, self.sid, self.trace.session_id) != rec["r"]:
+            diff = f"{self.trace.path} #{rec['i']} {rec['m']} {name}: response differs ({data[:120]!r})"
+        self.res.add(name, ms, rec.get("rt", 0.0), lag, diff, compared)
+
+    def run(self, t_start: float) -> None:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        reqs = self.trace.reqs
+        if not any(r["p"] == "/rounds" for r in reqs):
+            reqs = [{"i": -1, "at": 0.0, "m": "POST", "p": "/rounds", "b": {"round_index": self.trace.round_index}}] + reqs
+        inflight: List[threading.Thread] = []
+        prev: Optional[Dict[str, Any]] = None  # the last request sent on `conn`
+        prev_sent = self.done_at = t_start
+        for rec in reqs:
+            due = t_start + rec["at"] / 1000 / self.speed
+            racer = bool(rec.get("c")) and prev is not None
+            if racer:
+                # arrived while `prev` was in flight: same gap after it, on a connection of its own
+                due = max(due, prev_sent + (rec["at"] - prev["at"]) / 1000 / self.speed)
+                c = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            else:
+                for t in inflight:
+                    t.join()
+                inflight = []
+                if prev is not None:
+                    # the client's think time after the response it waited for
+                    think = max(0.0, rec["at"] - prev["at"] - prev.get("rt", 0.0)) / 1000 / self.speed
+                    due = max(due, self.done_at + think)
+                c = conn
+            time.sleep(max(0.0, due - time.perf_counter()))
+            t = threading.Thread(target=self.send, args=(c, rec, due, racer))
+            t.start()
+            inflight.append(t)
+            if not racer:
+                prev, prev_sent = rec, time.perf_counter()
+        for t in inflight:
+            t.join()
+        conn.close()
+
+def load_traces(paths: List[str]) -> List[Trace]:
+    files: List[str] = []
+    for p in paths:
+        files += sorted(glob.glob(os.path.join(p, "*.trace.jsonl"))) if os.path.isdir(p) else [p]
+    traces = []
+    for path in files:
+        tr = Trace(path)
+        if tr.questions is None:
+            print(f"skipped {path}: no round record (captured before its round opened)")
+            continue
+        traces.append(tr)
+    return traces
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("traces", nargs="+", help="trace files or capture directories")
+    ap.add_argument("--speed", type=float, default=1.0, help="divide recorded gaps by this (1 to 100)")
+    ap.add_argument("--copies", type=int, default=1, help="concurrent copies of every trace")
+    ap.add_argument("--start", choices=("recorded", "together"), default="recorded",
+                    help="rounds start at their recorded offsets, or all at once")
+    ap.add_argument("--target", default=None, help="round server URL on this host (default: spawn a bench server)")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    args = ap.parse_args()
+
+    traces = load_traces(args.traces)
+    if not traces:
+        sys.exit("no replayable traces")
+    tmp = tempfile.mkdtemp(prefix="dh-replay-")
+    proc = None
+    try:
+        if args.target:
+            u = urlparse(args.target)
+            host, port = u.hostname, u.port or 80
+        else:
+            host, port = "127.0.0.1", free_port()
+            proc = spawn_server(port, tmp, 0.0)
+            wait_ready(port)
+        res = Result()
+        first = min(tr.start for tr in traces)
+        replayers = [(Replayer(tr, k, host, port, tmp, args.speed, res),
+                      (tr.start - first) / args.speed if args.start == "recorded" else 0.0)
+                     for tr in traces for k in range(args.copies)]
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=r.run, args=(t0 + offset,)) for r, offset in replayers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            stop_server(proc)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    results = {
+        "args": vars(args),
+        "traces": len(traces),
+        "requests": res.requests,
+        "duration_sec": round(elapsed, 3),
+        "rps": round(res.requests / elapsed, 1) if elapsed else 0.0,
+        "max_send_lag_ms": round(res.max_lag_ms, 1),
+        "endpoints": {name: {"replayed": summarize(res.replayed[name]), "recorded": summarize(res.recorded[name])}
+                      for name in sorted(res.replayed)},
+        "differences": len(res.diffs),
+        "compared": res.compared,
+    }
+    print(f"{len(traces)} traces x{args.copies} at {args.speed:g}x: {res.requests} requests in {elapsed:.2f}s "
+          f"= {results['rps']:.1f} rps, max send lag {res.max_lag_ms:.0f}ms")
+    print(f"{'endpoint':28s} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}   recorded {'p50':>8} {'p95':>8} (ms)")
+    for name, e in results["endpoints"].items():
+        r, o = e["replayed"], e["recorded"]
+        print(f"{name:28s} {r['count']:>6} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f}            "
+              f"{o['p50']:>8.2f} {o['p95']:>8.2f}")
+    print(f"{res.compared} responses compared, {len(res.diffs)} differ from the recording")
+    for d in res.diffs[:20]:
+        print("  " + d)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(dict(results, diffs=res.diffs), f, ensure_ascii=False, indent=2)
+        print(f"results -> {args.out}")
+    if res.diffs:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
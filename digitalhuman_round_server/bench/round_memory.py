@@ -0,0 +1,108 @@
+"""
+Memory per 1,000 hosted rounds, and snapshot/restore cost of one round.
+
+    python -m bench.round_memory --rounds 1000 --questions 20
+
+"dataclass" is the previous layout (a QAPair dataclass per question holding the
+question/category again, a uuid4 string and an ISO timestamp string per pair),
+"compact" is state.RoundState. Both are measured half answered, from the same
+loaded question lists, so only what the state itself adds is counted.
+"""
+import argparse
+import timeit
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional
+from uuid import uuid4
+
+from app.state import RoundState
+
+CATS = ["基础知识", "项目经验", "系统设计", "算法", "行为面试"]
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+@dataclass
+class OldQAPair:
+    question_index: int
+    question: str
+    category: Optional[str]
+    qa_id: str
+    answer: Optional[str] = None
+    answered_at: Optional[str] = None
+    answer_length: Optional[int] = None
+
+@dataclass
+class OldRoundState:
+    session_id: str
+    round_index: int
+    round_id: Optional[str]
+    round_type: str
+    session_name: Optional[str]
+    room_id: Optional[str]
+    questions: List[str]
+    categories: List[Optional[str]]
+    total_questions: int
+    current_index: int = 0
+    qa_pairs: List[OldQAPair] = field(default_factory=list)
+    created_at: str = field(default_factory=now_iso)
+
+def old_round(i: int, questions, categories) -> OldRoundState:
+    # previous RoundState.create + save_answer, as it was
+    pairs = [OldQAPair(k, q, categories[k], str(uuid4())) for k, q in enumerate(questions)]
+    st = OldRoundState(f"sess-{i}", 1, f"r-{i}", "ai_generated", "面试", "room", questions, categories,
+                       len(questions), qa_pairs=pairs)
+    for k in range(len(questions) // 2):
+        a = f"回答{k}".strip()
+        pairs[k].answer, pairs[k].answered_at, pairs[k].answer_length = a, now_iso(), len(a)
+        st.current_index += 1
+    return st
+
+def new_round(i: int, questions, categories) -> RoundState:
+    st = RoundState.create(f"sess-{i}", 1, f"r-{i}", "ai_generated", "面试", "room", questions, categories)
+    for k in range(len(questions) // 2):
+        st.save_answer(k, f"回答{k}")
+    return st
+
+def banks(rounds: int, n: int):
+    # what the loader hands over: fresh strings per round (categories decoded per bank)
+    out = []
+    for i in range(rounds):
+        qs = [f"【{CATS[k % len(CATS)]}】第{i}-{k}题：请谈谈你对分布式系统一致性的理解。" for k in range(n)]
+        cats = ["".join(CATS[k % len(CATS)]) for k in range(n)]
+        out.append((qs, cats))
+    return out
+
+def footprint(build, data) -> float:
+    tracemalloc.start()
+    keep = [build(i, qs, cats) for i, (qs, cats) in enumerate(data)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return size / 1024
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=1000)
+    ap.add_argument("--questions", type=int, nargs="+", default=[10, 20, 50])
+    ap.add_argument("--number", type=int, default=2000)
+    args = ap.parse_args()
+
+    print(f"{'questions':>9} {'dataclass KB':>13} {'compact KB':>11} {'saved':>6} "
+          f"{'snapshot B':>11} {'snapshot us':>12} {'restore us':>11}")
+    for n in args.questions:
+        data = banks(args.rounds, n)
+        old = footprint(old_round, data)
+        new = footprint(new_round, data)
+        st = new_round(0, *data[0])
+        blob = st.snapshot()
+        back = RoundState.restore(blob)
+        assert all(getattr(back, k) == getattr(st, k) for k in RoundState.__slots__)
+        snap = min(timeit.repeat(st.snapshot, number=args.number, repeat=5)) / args.number * 1e6
+        rest = min(timeit.repeat(lambda: RoundState.restore(blob), number=args.number, repeat=5)) / args.number * 1e6
+        print(f"{n:>9} {old:>13.0f} {new:>11.0f} {1 - new / old:>6.0%} "
+              f"{len(blob):>11} {snap:>12.1f} {rest:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Start the round server in-process (multi mode, fake MinIO) on a free port.
+Must be imported before anything imports `app`, because settings read the env at import.
+"""
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+os.environ.setdefault("ROUND_SERVER_MODE", "multi")
+os.environ.setdefault("JOURNAL_DIR", "")
+os.environ.setdefault("EXPORT_DIR", "")
+# Placeholders so POST /rounds passes the credential check; the fake adapter ignores them
+for _k in ("MINIO_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY", "MINIO_BUCKET"):
+    os.environ.setdefault(_k, "bench")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class BenchServer:
+    def __init__(self, minio, port: Optional[int] = None, log_level: str = "warning"):
+        import uvicorn
+        from app import dh_gateway
+        from app.app import app
+
+        self.minio = minio
+        self.port = port or free_port()
+        self.base = f"http://127.0.0.1:{self.port}"
+        dh_gateway.REGISTRY.minio_factory = lambda params: minio
+        dh_gateway.log = lambda *a, **k: None  # keep benchmark output clean
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port,
+                                                    log_level=log_level, access_log=False))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.ready_sec: Optional[float] = None
+
+    def start(self, timeout: float = 20.0) -> "BenchServer":
+        t0 = time.perf_counter()
+        self.thread.start()
+        while time.perf_counter() - t0 < timeout:
+            if self.server.started:
+                self.ready_sec = time.perf_counter() - t0
+                return self
+            time.sleep(0.005)
+        raise RuntimeError("round server did not start")
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+def main():
+    """Run a bench server in its own process: `python -m bench.server --minio-dir DIR`."""
+    import argparse
+    from bench.fake_minio import DirMinio, MemoryMinio
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=None)
+    ap.add_argument("--minio-dir", default=None, help="serve objects from this directory (default: in memory)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="simulated MinIO round-trip")
+    args = ap.parse_args()
+    minio = DirMinio(args.minio_dir, args.latency_ms) if args.minio_dir else MemoryMinio(args.latency_ms)
+    srv = BenchServer(minio, port=args.port).start()
+    print(f"[bench-server] ready on {srv.base} in {srv.ready_sec * 1000:.1f}ms", flush=True)
+    try:
+        srv.thread.join()
+    except KeyboardInterrupt:
+        srv.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Time-to-first-chunk of /v1/chat/completions streaming, per chunking strategy.
+
+    python -m bench.sse_ttfc --pacing-per-char 40 --runs 20
+
+TTFC is measured from sending the request to receiving the first content delta,
+"total" up to [DONE]. The VTuber can start TTS once it holds a full sentence:
+with "single" that is the whole question, with sentence/clause it is the first
+piece. Pacing only delays the pieces after the first, so TTFC stays flat.
+"""
+import argparse
+import http.client
+import json
+import statistics
+import time
+
+from bench.server import BenchServer
+from bench.fake_minio import MemoryMinio, seed_questions
+
+QUESTION = ("【基础题】请先简单介绍一下你最近负责的项目，包括背景、目标和你的角色。"
+            "在这个项目中，你遇到的最大技术难点是什么？你是如何定位并解决的？"
+            "如果重新做一次，你会在架构上做哪些调整，为什么？")
+
+def stream_once(port: int, path: str, text: str):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    body = json.dumps({"stream": True, "messages": [{"role": "user", "content": text}]})
+    t0 = time.perf_counter()
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    resp = conn.getresponse()
+    first, pieces = None, 0
+    while True:
+        line = resp.fp.readline()
+        if not line:
+            break
+        if not line.startswith(b"data: "):
+            continue
+        data = line[6:].strip()
+        if data == b"[DONE]":
+            break
+        delta = json.loads(data)["choices"][0]["delta"]
+        if "content" in delta:
+            pieces += 1
+            if first is None:
+                first = time.perf_counter() - t0
+    total = time.perf_counter() - t0
+    conn.close()
+    return first, total, pieces
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--pacing-ms", type=float, default=0.0)
+    ap.add_argument("--pacing-per-char", type=float, default=0.0)
+    args = ap.parse_args()
+
+    from app import chunking
+    chunking.SSE_PACING_MS = args.pacing_ms
+    chunking.SSE_PACING_MS_PER_CHAR = args.pacing_per_char
+
+    minio = MemoryMinio()
+    srv = BenchServer(minio).start()
+    try:
+        for strategy in chunking.STRATEGIES:
+            chunking.SSE_CHUNKING = strategy
+            firsts, totals, npieces = [], [], 0
+            for run in range(args.runs):
+                sid = f"ttfc-{strategy}-{run}"
+                seed_questions(minio, sid, 0, [QUESTION])
+                conn = http.client.HTTPConnection("127.0.0.1", srv.port)
+                conn.request("POST", "/rounds", body=json.dumps({"session_id": sid, "round_index": 0}),
+                             headers={"Content-Type": "application/json"})
+                conn.getresponse().read(); conn.close()
+                first, total, npieces = stream_once(srv.port, f"/rounds/{sid}/0/v1/chat/completions", "你好")
+                firsts.append(first * 1000); totals.append(total * 1000)
+            print(f"{strategy:9s} pieces={npieces:2d} "
+                  f"ttfc p50={statistics.median(firsts):7.2f}ms max={max(firsts):7.2f}ms  "
+                  f"total p50={statistics.median(totals):7.2f}ms")
+    finally:
+        srv.stop()
+
+if __name__ == "__main__":
+    main()
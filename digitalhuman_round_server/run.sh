@@ -1,4 +1,8 @@
 #!/usr/bin/env bash
 set -euo pipefail
 source .venv/bin/activate
+if [ "${ROUND_SERVER_WORKER:-0}" = "1" ]; then
+  # Warm pool worker: waits on stdin for its round parameters
+  exec python -m app.worker
+fi
 exec uvicorn app.app:app --host 0.0.0.0 --port "${PORT:-8011}"